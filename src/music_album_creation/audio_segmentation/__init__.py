@@ -1,4 +1,18 @@
-from .album_segmentation import AudioSegmenter
+from .album_segmentation import AudioSegmenter, SegmentedTrack
+from .cache import SegmentationCache
 from .data import SegmentationInformation, Timestamp, TracksInformation
+from .loudness import LoudnessMeter
+from .planning import SegmentationPlan
+from .profiles import OutputProfile
 
-__all__ = ['AudioSegmenter', 'TracksInformation', 'Timestamp', 'SegmentationInformation']
+__all__ = [
+    'AudioSegmenter',
+    'LoudnessMeter',
+    'OutputProfile',
+    'SegmentationCache',
+    'SegmentationPlan',
+    'SegmentedTrack',
+    'TracksInformation',
+    'Timestamp',
+    'SegmentationInformation',
+]
@@ -1,24 +1,129 @@
+import asyncio
+import itertools
 import logging
+import mmap
 import os
+import re
 import tempfile
+import threading
 import time
-from typing import List, Optional
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence, Tuple
 
-from music_album_creation.ffmpeg import FFMPEG
+import attr
+
+from music_album_creation.caching import file_fingerprint
+from music_album_creation.ffmpeg import FFMPEG, FFProbe
+from music_album_creation.ffmpeg.capabilities import Capabilities, get_capabilities
+from music_album_creation.ffmpeg.scheduler import CPU, IO
+from music_album_creation.ffprobe_client import FFProbeClient
 
 from .data import SegmentationInformation
+from .loudness import EBUR128_ARGS
+from .manifest import IncrementalSegmentation, ManifestEntry, SegmentationManifest
+from .planning import (
+    END_TOLERANCE,
+    PlannedTrack,
+    SegmentationPlan,
+    calibration_factor,
+    estimate,
+)
+from .profiles import OutputProfile
+from .progress import PROGRESS_ARGS, ProgressParser
+from .seek_index import SeekIndex
 
 logger = logging.getLogger(__name__)
 
 
-ffmpeg = FFMPEG(os.environ.get('MUSIC_FFMPEG', 'ffmpeg'))
+FFMPEG_BINARY = os.environ.get('MUSIC_FFMPEG', 'ffmpeg')
+ffmpeg = FFMPEG(FFMPEG_BINARY)
+ffprobe_client = FFProbeClient(FFProbe(os.environ.get('MUSIC_FFPROBE', 'ffprobe')))
 
 EXT = 'mp3'
 
+# file extension (thus container) of tracks cut with stream copy, per source audio codec
+COPY_EXTENSIONS = {
+    'opus': 'opus',
+    'vorbis': 'ogg',
+    'aac': 'm4a',
+    'alac': 'm4a',
+    'mp3': 'mp3',
+    'flac': 'flac',
+}
+# fallback, per source container, for audio codecs missing from COPY_EXTENSIONS; matroska goes
+# to .mka, since webm only holds opus and vorbis audio (which COPY_EXTENSIONS covers)
+COPY_CONTAINER_EXTENSIONS = {
+    'matroska,webm': 'mka',
+    'mov,mp4,m4a,3gp,3g2,mj2': 'm4a',
+    'ogg': 'ogg',
+}
+
+# Supported strategies of seeking to the start of each track:
+#  - 'output': decode (and discard) everything before the track start; slow but sample accurate
+#  - 'input': let the demuxer jump to the track start; fast, cost does not grow with the offset
+#  - 'hybrid': fast input seek up to a few seconds before the track start, then fine output seek
+#  - 'auto': 'input' ('hybrid' when stream copying) for long albums, 'output' otherwise
+SEEK_STRATEGIES = ('auto', 'input', 'output', 'hybrid')
+
+# albums with a track starting later than this (in seconds) are considered 'long'
+LONG_ALBUM_SECONDS = 15 * 60
+
+# seconds to decode before the track start, when using the 'hybrid' seek strategy
+HYBRID_SEEK_MARGIN = 5
+
+# containers of raw (headerless) audio streams, that can be read starting at any packet's byte
+# offset; when a seek index is used, tracks are cut out of them by seeking to byte offsets
+BYTE_SEEKABLE_FORMATS = ('mp3', 'aac')
+
+# the time (output duration) in the stats line ffmpeg writes on stderr, ie 'time=00:03:25.41'
+_STATS_TIME = re.compile(r'time=\s*(\d+):(\d{2}):(\d{2}(?:\.\d+)?)')
+
+# raw PCM format of the scratch file, used when decoding the album only once
+PCM_FORMAT = 's16le'
+PCM_SAMPLE_WIDTH = 2  # bytes
+
+
+@attr.s(frozen=True)
+class SegmentedTrack(object):
+    """A created track: its file, the span of the album it holds (in seconds) and its size.
+
+    Instances can be used wherever a path is expected; ie open(track), os.path.basename(track).
+    """
+
+    path: str = attr.ib()
+    start: float = attr.ib()
+    end: float = attr.ib()
+    duration: float = attr.ib()
+    size: int = attr.ib()
+
+    def __fspath__(self):
+        return self.path
+
+    def __str__(self):
+        return self.path
+
 
 class AudioSegmenter(object):
-    def __init__(self, target_directory=tempfile.gettempdir()):
+    def __init__(
+        self,
+        target_directory=tempfile.gettempdir(),
+        seek='auto',
+        stream_copy=False,
+        seek_index=False,
+        cache=None,
+    ):
+        if seek not in SEEK_STRATEGIES:
+            raise ValueError(
+                "Seek strategy '{}' is not one of [{}]".format(
+                    seek, ', '.join(SEEK_STRATEGIES)
+                )
+            )
         self._dir = target_directory
+        self._seek = seek
+        self._stream_copy = stream_copy
+        self._seek_index = seek_index
+        self._cache = cache
 
     @property
     def target_directory(self):
@@ -29,48 +134,597 @@ class AudioSegmenter(object):
     def target_directory(self, directory_path):
         self._dir = directory_path
 
-    def _trans(self, track_info):
-        """Create (file) name of output track."""
-        return [os.path.join(self._dir, f'{track_info[0]}.{EXT}')] + track_info[1:]
+    @property
+    def seek(self):
+        """The strategy of seeking to the start of each track; one of SEEK_STRATEGIES"""
+        return self._seek
 
-    def segment(self, album_file, data, sleep_seconds=0):
+    def _seek_strategy(self, data) -> str:
+        """Resolve the seek strategy to use for segmenting the album described by 'data'."""
+        if self._seek != 'auto':
+            return self._seek
+        if LONG_ALBUM_SECONDS <= float(list(data[-1])[1]):
+            # without decoding, input seeking lands on the demuxer's (coarse) seek points
+            return 'hybrid' if self._stream_copy else 'input'
+        return 'output'
+
+    @property
+    def stream_copy(self):
+        """Whether tracks are cut losslessly, keeping the codec (and container) of the album"""
+        return self._stream_copy
+
+    @property
+    def seek_index(self):
+        """Whether cut points are snapped to packet boundaries, found in the album's seek index"""
+        return self._seek_index
+
+    @property
+    def capabilities(self) -> Capabilities:
+        """The version, encoders and muxers of the ffmpeg binary (probed once, then cached)"""
+        return get_capabilities(ffmpeg)
+
+    @property
+    def cache(self):
+        """The SegmentationCache where created tracks are looked up and stored; None for no caching"""
+        return self._cache
+
+    def _cache_keys(self, album_file, tracks, options):
+        """Compute the cache key of each track file; empty if no cache is used."""
+        if self._cache is None:
+            return {}
+        album_hash = self._cache.album_hash(album_file)
+        return {
+            track_file: self._cache.key(
+                album_hash, start, end[0] if end else None, self._settings(track_file, options)
+            )
+            for track_file, start, *end in tracks
+        }
+
+    def _settings(self, track_file, options) -> List[str]:
+        """Get the settings that, along with its span, determine the content of a track file."""
+        return [
+            os.path.splitext(track_file)[1],
+            *self._encoding_args(track_file)[:-1],
+            options['seek'],
+        ]
+
+    def _plan(self, album_file, data):
+        """Resolve the track files and cut points, and the options to seek to the cut points.
+
+        :return: the [track_file, start, (end)] entries and the keyword arguments for '_segment'
+        :rtype: tuple
         """
-        :param album_file:
-        :param data:
-        :param supress_stdout:
-        :param supress_stderr:
-        :param float sleep_seconds:
-        :return:
+        seek = self._seek_strategy(data)
+        ext = self._extension(album_file)
+        tracks = [self._trans(list(x), ext) for x in data]
+        if not self._seek_index:
+            return tracks, {'seek': seek}
+
+        # move cut points onto packet boundaries, where stream copy can cut exactly
+        index = SeekIndex.build(album_file, ffprobe_client)
+        tracks = [
+            [track_file, *[_seconds(index.snap(float(x))) for x in span]]
+            for track_file, *span in tracks
+        ]
+        if (
+            seek != 'output'
+            and ffprobe_client.get_stream_info(str(album_file))['format']['format_name']
+            in BYTE_SEEKABLE_FORMATS
+        ):
+            return tracks, {'seek': 'bytes', 'seek_index': index}
+        return tracks, {'seek': seek}
+
+    def _extension(self, album_file) -> str:
+        """Get the file extension of the tracks to create out of the album file.
+
+        When re-encoding, tracks are always mp3 files. When stream copying, the extension is
+        chosen to match the album's audio codec (ie opus audio goes to an .opus file), as
+        reported by ffprobe.
         """
-        exit_code = 0
-        i = 0
-        track_files: List[str] = []
-        while exit_code == 0 and i < len(data) - 1:
-            time.sleep(sleep_seconds)
+        if not self._stream_copy:
+            return EXT
+        stream_info = ffprobe_client.get_stream_info(str(album_file))
+        for stream in stream_info['streams']:
+            if stream.get('codec_name') in COPY_EXTENSIONS:
+                return COPY_EXTENSIONS[stream['codec_name']]
+        return COPY_CONTAINER_EXTENSIONS.get(stream_info['format']['format_name'], 'mka')
+
+    @property
+    def _work_kind(self) -> str:
+        """The kind of work (see ffmpeg.scheduler) cutting tracks is; copying is I/O-bound"""
+        return IO if self._stream_copy else CPU
+
+    def _check_loudness(self, loudness):
+        if loudness is not None and self._stream_copy:
+            raise ValueError("Cannot measure loudness when stream copying tracks")
+
+    def _encoding_args(self, track_file) -> List[str]:
+        """Create the ffmpeg output options that encode (or copy) the audio into the track file."""
+        if self._stream_copy:
+            return ['-vn', '-c:a', 'copy', str(track_file)]
+        return ['-f', 'mp3', str(track_file)]
+
+    def _trans(self, track_info, ext=EXT):
+        """Create (file) name of output track."""
+        return [os.path.join(self._dir, f'{track_info[0]}.{ext}')] + track_info[1:]
+
+    def segment(
+        self,
+        album_file,
+        data,
+        sleep_seconds=0,
+        workers=None,
+        progress=None,
+        loudness=None,
+        peaks=False,
+    ):
+        """Segment the album into tracks, running one ffmpeg process per track.
+
+        Tracks are independent of each other, so up to 'workers' ffmpeg processes run at the
+        same time. The longest tracks are scheduled first (the last track, of unknown
+        duration, being considered the longest), to minimise the total wall time.
+
+        If a track fails to be created, the tracks not yet started are cancelled and an
+        FfmpegCommandError is raised, reporting the failed ffmpeg command and its stderr.
+
+        :param str album_file: path to the album audio file
+        :param SegmentationInformation data: per track name, start (and end) timestamps
+        :param float sleep_seconds: seconds to wait before each track, when using 1 worker
+        :param int workers: max number of concurrent ffmpeg processes; defaults to the CPU count
+        :param callable progress: if given, called with a ProgressEvent (see the 'progress'
+            module) each time ffmpeg reports progress on a track; possibly from several threads
+        :param LoudnessMeter loudness: if given, the loudness of each track is measured while
+            creating it (so cached tracks are created again, instead of materialised)
+        :param bool peaks: whether to also write the waveform peaks of each track in a sidecar
+            file (see waveform.peaks_file), computed from the PCM the ffmpeg creating the track
+            decodes (so cached tracks are created again); requires numpy
+        :return: the created tracks (SegmentedTrack), in the same order as in 'data'
+        :rtype: list
+        """
+        self._check_loudness(loudness)
+        if peaks:
+            from .waveform import peaks_file, write_peaks
+
+            sample_rate, channels = _pcm_format(
+                ffprobe_client.get_stream_info(str(album_file))
+            )
+        tracks, options = self._plan(album_file, data)
+        workers = workers or os.cpu_count() or 1
+        progress_parsers = self._progress_parsers(album_file, tracks, progress)
+        cache_keys = self._cache_keys(album_file, tracks, options)
+        # tracks found in the cache are materialised, instead of created
+        pending_tracks = []
+        for track_info in tracks:
+            track_file = track_info[0]
+            if (
+                loudness is not None
+                or peaks
+                or not (cache_keys and self._cache.get(cache_keys[track_file], track_file))
+            ):
+                pending_tracks.append(track_info)
+            elif track_file in progress_parsers:  # report cached tracks as created in full
+                progress_parsers[track_file].complete()
+
+        # the last track ends where the album ends; its duration is known once it is created
+        last_track_duration = {}
+
+        def create_track(track_info, pcm_output=None):
+            progress_parser = progress_parsers.get(track_info[0])
             result = self._segment(
                 album_file,
-                *self._trans(list(data[i])),
+                *track_info,
+                progress=progress_parser,
+                measure_loudness=loudness is not None,
+                pcm_output=pcm_output,
+                **options,
             )
-            if result.exit_code != 0:
-                logger.error("Fmmpeg exit code: %s", result.exit_code)
-                logger.error("Ffmpeg st out: %s", result.stdout)
-                logger.error("Fmmpeg stderr: %s", result.stderr)
-                raise FfmpegCommandError("Command '{}' failed".format(' '.join(self._args)))
-            track_files.append(list(data[i])[1])
-            i += 1
-        result = self._segment(
-            album_file,
-            *self._trans(list(data[-1])),
+            if len(track_info) == 2:
+                last_track_duration[track_info[0]] = _stats_duration(result.stderr) or (
+                    progress_parser and progress_parser.processed
+                )
+            if loudness is not None:
+                loudness.add(track_info[0], result.stderr)
+            if cache_keys:
+                self._cache.put(cache_keys[track_info[0]], track_info[0])
+
+        def segment_track(track_info):
+            if not peaks:
+                return create_track(track_info)
+            # the same ffmpeg process writes the track's PCM to a scratch file, to compute the
+            # peaks from
+            with _pcm_scratch_file(self._dir) as (file_descriptor, pcm_file):
+                create_track(track_info, pcm_output=(pcm_file, sample_rate, channels))
+                with _pcm_buffer(file_descriptor) as pcm:
+                    write_peaks(pcm, peaks_file(track_info[0]), sample_rate, channels)
+
+        if workers == 1:
+            for track_info in pending_tracks:
+                time.sleep(sleep_seconds)
+                segment_track(track_info)
+        else:
+            _run_in_pool(segment_track, _longest_first(pending_tracks), workers)
+        if cache_keys:
+            self._cache.evict()
+        # with 'stream_copy' the extension is known from the album's audio codec; otherwise
+        # tracks are re-encoded to mp3
+        return self._results(album_file, tracks, last_track_duration)
+
+    def dry_run(
+        self, album_file, data, loudness=False, progress=False, factor=None
+    ) -> SegmentationPlan:
+        """Plan the segmentation of the album (see 'segment') without creating any track.
+
+        The album is probed (never decoded) to check the tracks' spans against its duration
+        and to find its bitrate. Each track gets the exact ffmpeg command 'segment' would run
+        and an estimate of its CPU seconds and size (see planning.estimate).
+
+        :param str album_file: path to the album audio file
+        :param SegmentationInformation data: per track name, start (and end) timestamps
+        :param bool loudness: whether the commands should measure loudness (see 'segment')
+        :param bool progress: whether the commands should report progress (see 'segment')
+        :param float factor: CPU seconds per second of encoded audio; measured on this host
+            (once, then cached) by default
+        :return: the planned tracks, in the same order as in 'data', and any problems found
+        :rtype: SegmentationPlan
+        """
+        self._check_loudness(loudness or None)
+        tracks, options = self._plan(album_file, data)
+        format_info = ffprobe_client.get_stream_info(str(album_file))['format']
+        album_duration = float(format_info['duration'])
+        source_bitrate = float(
+            format_info.get('bit_rate') or os.path.getsize(album_file) * 8 / album_duration
+        )
+        if factor is None and not self._stream_copy:
+            factor = calibration_factor(ffmpeg, FFMPEG_BINARY)
+
+        planned_tracks, problems = [], []
+        for track_info in tracks:
+            track_file, start, *end = track_info
+            start = float(start)
+            end = float(end[0]) if end else album_duration
+            if album_duration <= start:
+                problems.append(
+                    "Track '{}' starts at {:.3f} seconds, after the album ends ({:.3f})".format(
+                        os.path.basename(track_file), start, album_duration
+                    )
+                )
+            elif album_duration + END_TOLERANCE < end:
+                problems.append(
+                    "Track '{}' ends at {:.3f} seconds, after the album ends ({:.3f})".format(
+                        os.path.basename(track_file), end, album_duration
+                    )
+                )
+            duration = max(0.0, min(end, album_duration) - start)
+            cpu_seconds, output_bytes = estimate(
+                duration,
+                _skipped_seconds(start, options['seek']),
+                source_bitrate,
+                None if self._stream_copy else EXT,
+                factor,
+            )
+            planned_tracks.append(
+                PlannedTrack(
+                    track_file,
+                    start,
+                    end,
+                    round(duration, 3),
+                    (
+                        FFMPEG_BINARY,
+                        *self._segment_args(
+                            album_file,
+                            *track_info,
+                            progress=progress,
+                            measure_loudness=loudness,
+                            **options,
+                        ),
+                    ),
+                    cpu_seconds,
+                    output_bytes,
+                )
+            )
+        return SegmentationPlan(str(album_file), album_duration, planned_tracks, problems)
+
+    def segment_incremental(self, album_file, data, workers=None):
+        """Segment the album into tracks, re-creating only the tracks that changed.
+
+        A manifest of the created tracks is kept in the target directory. When the album is
+        segmented again (ie after fixing a typo in a timestamp), tracks with unchanged name,
+        span and settings are reused; if only their numbering changed, they are renamed.
+        The rest of the tracks are cut again, and obsolete tracks of the previous
+        segmentation are removed.
+
+        :param str album_file: path to the album audio file
+        :param SegmentationInformation data: per track name, start (and end) timestamps
+        :param int workers: max number of concurrent ffmpeg processes; defaults to the CPU count
+        :return: the tracks (SegmentedTrack, in album order) and what was reused, renamed and
+            regenerated
+        :rtype: IncrementalSegmentation
+        """
+        tracks, options = self._plan(album_file, data)
+        entries = [
+            ManifestEntry(
+                os.path.basename(track_file),
+                start,
+                end[0] if end else None,
+                self._settings(track_file, options),
+            )
+            for track_file, start, *end in tracks
+        ]
+        album = file_fingerprint(str(album_file))
+        previous = SegmentationManifest.load(self._dir)
+        if previous is None or previous.album != album:
+            previous = SegmentationManifest(album)
+        reused, renamed, regenerated, obsolete = previous.match(entries, self._dir)
+
+        wanted_files = {x.file for x in entries}
+        removed = [x.file for x in obsolete if x.file not in wanted_files]
+        for track_file in removed:
+            os.remove(os.path.join(self._dir, track_file))
+        # rename in two steps, so that a track can take a name given up by another track
+        staged = []
+        for old, new in renamed:
+            temp_file = os.path.join(self._dir, '.{}.renaming'.format(new.file))
+            os.replace(os.path.join(self._dir, old.file), temp_file)
+            staged.append((temp_file, new.file))
+        for temp_file, track_file in staged:
+            os.replace(temp_file, os.path.join(self._dir, track_file))
+        # if cutting fails, the manifest still describes the reused and renamed tracks
+        SegmentationManifest(album, reused + [new for _, new in renamed]).save(self._dir)
+
+        regenerated_files = {x.file for x in regenerated}
+        # the last track ends where the album ends; its duration is known once it is created
+        last_track_duration = {}
+
+        def segment_track(track_info):
+            result = self._segment(album_file, *track_info, **options)
+            if len(track_info) == 2:
+                last_track_duration[track_info[0]] = _stats_duration(result.stderr)
+
+        _run_in_pool(
+            segment_track,
+            _longest_first([x for x in tracks if os.path.basename(x[0]) in regenerated_files]),
+            workers or os.cpu_count() or 1,
+        )
+        SegmentationManifest(album, entries).save(self._dir)
+        return IncrementalSegmentation(
+            self._results(album_file, tracks, last_track_duration),
+            reused=[x.file for x in reused],
+            renamed=[(old.file, new.file) for old, new in renamed],
+            regenerated=[x.file for x in regenerated],
+            removed=removed,
         )
-        if result.exit_code != 0:
-            logger.error("Fmmpeg exit code: %s", result.exit_code)
-            logger.error("Ffmpeg st out: %s", result.stdout)
-            logger.error("Fmmpeg stderr: %s", result.stderr)
-            raise FfmpegCommandError("Command '{}' failed".format(' '.join(self._args)))
-        # TODO: remove the need to hard-code extension. should know from download module
-        # if we download youtube video as mp4 audio, then each track should probably be mp4 too
-        # if we download youtube video as mp3 audio, then each track should probably be mp3 too
-        return [os.path.join(self._dir, f'{list(x)[0]}.{EXT}') for x in data]
+
+    @staticmethod
+    def _results(album_file, tracks, durations) -> List[SegmentedTrack]:
+        """Describe the created tracks, given the durations of those not known from the plan.
+
+        Tracks missing both an end and a duration (ie the last track, materialised from the
+        cache) are taken to end where the album ends, which is probed once.
+        """
+        results = []
+        for track_file, start, *end in tracks:
+            start = float(start)
+            if end:
+                duration = float(end[0]) - start
+            else:
+                duration = durations.get(track_file) or _album_duration(album_file) - start
+            results.append(
+                SegmentedTrack(
+                    track_file,
+                    start,
+                    round(start + duration, 3),
+                    round(duration, 3),
+                    os.path.getsize(track_file),
+                )
+            )
+        return results
+
+    @staticmethod
+    def _progress_parsers(album_file, tracks, callback):
+        """Create a parser of ffmpeg's progress lines per track file, reporting to 'callback'."""
+        if callback is None:
+            return {}
+        # the duration of the last track is only known with respect to the album's duration
+        album_duration = _album_duration(album_file)
+        return {
+            track_file: ProgressParser(
+                i,
+                track_file,
+                _span_duration(start, *end) if end else album_duration - float(start),
+                callback,
+            )
+            for i, (track_file, start, *end) in enumerate(tracks)
+        }
+
+    async def segment_async(self, album_file, data, concurrency=None):
+        """Segment the album into tracks, without blocking the event loop.
+
+        Asynchronous counterpart of 'segment': each track is cut by an ffmpeg process spawned
+        with asyncio, while a semaphore bounds the number of concurrently running processes.
+        Cancelling the coroutine terminates the ffmpeg processes still running.
+
+        :param str album_file: path to the album audio file
+        :param SegmentationInformation data: per track name, start (and end) timestamps
+        :param int concurrency: max number of concurrent ffmpeg processes; defaults to the CPU count
+        :return: the created tracks (SegmentedTrack), in the same order as in 'data'
+        :rtype: list
+        """
+        loop = asyncio.get_running_loop()
+        # probing the album (with 'stream_copy' or 'seek_index') is a blocking call
+        tracks, options = await loop.run_in_executor(None, self._plan, album_file, data)
+        semaphore = asyncio.Semaphore(concurrency or os.cpu_count() or 1)
+        last_track_duration = {}
+
+        async def segment_track(track_info):
+            async with semaphore:
+                result = await self._segment_async(album_file, *track_info, **options)
+            if len(track_info) == 2:
+                last_track_duration[track_info[0]] = _stats_duration(result.stderr)
+
+        tasks = [asyncio.ensure_future(segment_track(x)) for x in _longest_first(tracks)]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            # on failure (or cancellation) do not leave any ffmpeg process running
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        # the last track's duration, if missing from the ffmpeg stats, is probed (blocking)
+        return await loop.run_in_executor(
+            None, self._results, album_file, tracks, last_track_duration
+        )
+
+    def segment_decode_once(self, album_file, data, workers=None, loudness=None, peaks=False):
+        """Segment the album into tracks, decoding the album only once.
+
+        The album is first decoded into a raw PCM scratch file (in the target directory).
+        Then each track is encoded by its own ffmpeg process, fed (through stdin) with the
+        track's sample range, which is read directly by byte offset from the memory-mapped
+        scratch file. No demuxing or seeking is involved in cutting, so boundaries are
+        sample accurate, and the N encoders run in parallel (up to 'workers' at a time).
+
+        The scratch file is removed when segmentation finishes, whether it succeeds or not.
+
+        :param str album_file: path to the album audio file
+        :param SegmentationInformation data: per track name, start (and end) timestamps
+        :param int workers: max number of concurrent ffmpeg encoders; defaults to the CPU count
+        :param LoudnessMeter loudness: if given, the loudness of each track is measured by its
+            encoder, on the same PCM samples
+        :param bool peaks: whether to also write the waveform peaks of each track, computed
+            from its PCM samples, in a sidecar file (see waveform.peaks_file); requires numpy
+        :return: the created tracks (SegmentedTrack), in the same order as in 'data'
+        :rtype: list
+        """
+        if self._stream_copy:
+            raise ValueError("Decoding the album once is pointless when stream copying tracks")
+        self._check_loudness(loudness)
+        if peaks:
+            from .waveform import peaks_file, write_peaks
+        tracks = [self._trans(list(x), EXT) for x in data]
+        sample_rate, channels = _pcm_format(ffprobe_client.get_stream_info(str(album_file)))
+        frame_size = PCM_SAMPLE_WIDTH * channels  # bytes per (multi-channel) sample
+        # the last track ends where the album ends; its duration is that of its samples
+        last_track_duration = {}
+
+        with _pcm_scratch_file(self._dir) as (file_descriptor, pcm_file):
+            args = [
+                '-y',
+                '-i',
+                str(album_file),
+                '-vn',
+                *_pcm_args(sample_rate, channels),
+                pcm_file,
+            ]
+            logger.info("Decoding album: ffmpeg '{}'".format(' '.join(args)))
+            _check_ffmpeg_result(args, ffmpeg(*args, stage='decode'))
+
+            with _pcm_buffer(file_descriptor) as pcm:
+
+                def encode(track_info):
+                    track_file, start, *end = track_info
+                    first_byte = round(float(start) * sample_rate) * frame_size
+                    last_byte = (
+                        round(float(end[0]) * sample_rate) * frame_size if end else None
+                    )
+                    args = [
+                        '-y',
+                        *_pcm_args(sample_rate, channels),
+                        '-i',
+                        'pipe:0',
+                        *(EBUR128_ARGS if loudness is not None else ()),
+                        *self._encoding_args(track_file),
+                    ]
+                    logger.info("Encoding track: ffmpeg '{}'".format(' '.join(args)))
+                    # released on leaving, even if referenced by a traceback, so that the
+                    # scratch file can be unmapped
+                    with pcm[first_byte:last_byte] as track_pcm:
+                        if not end:
+                            last_track_duration[track_file] = (
+                                len(track_pcm) // frame_size / sample_rate
+                            )
+                        result = ffmpeg(*args, input=track_pcm, stage='encode')
+                        _check_ffmpeg_result(args, result)
+                        if loudness is not None:
+                            loudness.add(track_file, result.stderr)
+                        if peaks:
+                            write_peaks(
+                                track_pcm, peaks_file(track_file), sample_rate, channels
+                            )
+
+                _run_in_pool(encode, _longest_first(tracks), workers or os.cpu_count() or 1)
+        return self._results(album_file, tracks, last_track_duration)
+
+    def segment_single_pass(self, album_file, data):
+        """Segment the album into tracks, using a single ffmpeg process for all of them.
+
+        Instead of starting one ffmpeg process per track (see 'segment'), a single ffmpeg
+        invocation is made, with one mapped output per track. This way the album file is
+        opened, demuxed and decoded only once, regardless of the number of tracks.
+
+        :param str album_file: path to the album audio file
+        :param SegmentationInformation data: per track name, start (and end) timestamps
+        :return: the created tracks (SegmentedTrack), in the same order as in 'data'
+        :rtype: list
+        """
+        ext = self._extension(album_file)
+        tracks = [self._trans(list(x), ext) for x in data]
+        args: List[str] = ['-y', '-i', str(album_file)]
+        for track_file, start, *end in tracks:
+            args.extend(self._output_args(track_file, start, end[0] if end else None))
+        logger.info("Segmenting (single pass): ffmpeg '{}'".format(' '.join(args)))
+        _check_ffmpeg_result(args, ffmpeg(*args, stage='segment', kind=self._work_kind))
+        # the stats of a multi-output ffmpeg do not tell the last track's duration apart
+        return self._results(album_file, tracks, {})
+
+    def segment_profiles(
+        self, album_file, data, profiles: Sequence[OutputProfile]
+    ) -> Dict[OutputProfile, List[SegmentedTrack]]:
+        """Segment the album into tracks, encoding every track in each of the output profiles.
+
+        A single ffmpeg process decodes the album once and feeds the decoded audio to one
+        output per track and profile, so producing more formats costs only their encoding.
+        Tracks of each profile are written in their own subdirectory of the target directory,
+        named after the profile.
+
+        :param str album_file: path to the album audio file
+        :param SegmentationInformation data: per track name, start (and end) timestamps
+        :param profiles: the formats to encode the tracks in; profile names must be unique
+        :return: the created tracks (SegmentedTrack) per profile, in the same order as 'data'
+        :rtype: dict
+        """
+        if not profiles:
+            raise ValueError("At least one output profile is required")
+        if len({profile.name for profile in profiles}) != len(profiles):
+            raise ValueError("Output profiles must have unique names")
+        capabilities = self.capabilities
+        for profile in profiles:
+            if not capabilities.has_encoder(profile.codec):
+                raise ValueError(
+                    "Output profile '{}': ffmpeg {} has no '{}' audio encoder".format(
+                        profile.name, capabilities.version, profile.codec
+                    )
+                )
+        args: List[str] = ['-y', '-i', str(album_file)]
+        tracks = {}
+        for profile in profiles:
+            directory = os.path.join(self._dir, profile.name)
+            os.makedirs(directory, exist_ok=True)
+            tracks[profile] = []
+            for track_name, start, *end in data:
+                track_file = os.path.join(directory, f'{track_name}.{profile.container}')
+                args.extend(
+                    self._output_args(
+                        track_file,
+                        start,
+                        end[0] if end else None,
+                        encoding_args=profile.encoding_args(track_file),
+                    )
+                )
+                tracks[profile].append([track_file, start, *end])
+        logger.info("Segmenting (multiple profiles): ffmpeg '{}'".format(' '.join(args)))
+        _check_ffmpeg_result(args, ffmpeg(*args, stage='segment'))
+        return {x: self._results(album_file, y, {}) for x, y in tracks.items()}
 
     def segment_from_file(
         self,
@@ -104,6 +758,27 @@ class AudioSegmenter(object):
         )
 
     def _segment(self, *args, **kwargs):
+        progress = kwargs.get('progress')
+        args = self._segment_args(*args, **kwargs)
+        logger.info("Segmenting: ffmpeg '{}'".format(' '.join(args)))
+        if progress is None:
+            result = ffmpeg(*args, stage='segment', kind=self._work_kind)
+        else:
+            result = ffmpeg.stream(
+                *args, on_stdout_line=progress, stage='segment', kind=self._work_kind
+            )
+        _check_ffmpeg_result(args, result)
+        return result
+
+    async def _segment_async(self, *args, **kwargs):
+        args = self._segment_args(*args, **kwargs)
+        logger.info("Segmenting: ffmpeg '{}'".format(' '.join(args)))
+        result = await ffmpeg.call_async(*args, stage='segment', kind=self._work_kind)
+        _check_ffmpeg_result(args, result)
+        return result
+
+    def _segment_args(self, *args, **kwargs):
+        """Create the ffmpeg CLI arguments that cut a single track out of the album."""
         album_file = args[0]
         track_file = args[1]
         start = args[2]  # starting timestamp
@@ -113,16 +788,32 @@ class AudioSegmenter(object):
         # and in that case the client code need to supply 3 arguments (not 4)
         if 3 < len(args):
             end = args[3]
+        seek = kwargs.get('seek', 'output')
+        seek_index = kwargs.get('seek_index')
+        # progress is reported (as key=value lines) on stdout, instead of the stats line
+        progress_args = PROGRESS_ARGS if kwargs.get('progress') else ()
+        loudness_args = EBUR128_ARGS if kwargs.get('measure_loudness') else ()
+        span_args = self._span_args(album_file, start, end, seek=seek, seek_index=seek_index)
+        # the decoded PCM of the span (if requested) is an extra output, written first; the
+        # output options of the span (those after the input) apply to each output separately
+        pcm_output_args: Tuple[str, ...] = ()
+        if kwargs.get('pcm_output'):
+            pcm_file, sample_rate, channels = kwargs['pcm_output']
+            pcm_output_args = (
+                '-vn',
+                *_pcm_args(sample_rate, channels),
+                pcm_file,
+                *span_args[span_args.index('-i') + 2 :],
+            )
 
         # args = ['ffmpeg', '-y', '-i', '-acodec', 'copy', '-ss']
         # self._args = args[:3] + ['{}'.format(album_file)] + args[3:] + [start] + (lambda: ['-to', str(end)] if end else [])() + ['{}'.format(track_file)]
         # COPY web stream as it is (no custom encododing)
         # so cannot change the file extension to store
         # output extension is better kept to be guessed by ffmpeg from the input file
-        self._args = (
+        args = (
+            *progress_args,
             '-y',
-            '-i',
-            str(album_file),  # youtube downloaded audio steam (ie local mp4 file)
             # '-acodec',
             # 'copy',
             # 'AAC',
@@ -132,12 +823,10 @@ class AudioSegmenter(object):
             # '9',  # max quality
             # '-ab',
             # '133k',
-            '-ss',
-            start,
-            *list((lambda: ['-to', str(end)] if end else [])()),
-            '-f',
-            'mp3',
-            str(track_file),
+            *span_args,
+            *pcm_output_args,
+            *loudness_args,
+            *self._encoding_args(track_file),
         )
         # self._args = (
         #     '-y',
@@ -150,9 +839,177 @@ class AudioSegmenter(object):
         #     *list((lambda: ['-to', str(end)] if end else [])()),
         #     str(track_file).replace('mp4', 'mp3'),
         # )
-        logger.info("Segmenting: ffmpeg '{}'".format(' '.join(self._args)))
-        return ffmpeg(
-            *self._args,
+        return args
+
+    @staticmethod
+    def _span_args(album_file, start, end=None, seek='output', seek_index=None) -> List[str]:
+        """Create the ffmpeg input and seeking options that select the [start, end) span of the album.
+
+        With 'input' seeking, the '-ss' option is placed before '-i' so that the demuxer jumps
+        directly to the start timestamp; timestamps are then reset, so the span is delimited
+        by its duration ('-t') instead of its end timestamp ('-to'). The same holds for
+        'bytes' seeking, where reading starts at the byte offset of the start packet, as
+        found in the seek index.
+        """
+        duration = ['-t', _seconds(float(end) - float(start))] if end else []
+        if seek == 'bytes':
+            return [
+                '-skip_initial_bytes',
+                str(seek_index.position(float(start))),
+                '-i',
+                str(album_file),
+                *duration,
+            ]
+        if seek == 'input':
+            return ['-ss', str(start), '-i', str(album_file), *duration]
+        if seek == 'hybrid':
+            coarse_start = max(0.0, float(start) - HYBRID_SEEK_MARGIN)
+            return [
+                '-ss',
+                _seconds(coarse_start),
+                '-i',
+                str(album_file),
+                '-ss',
+                _seconds(float(start) - coarse_start),
+                *duration,
+            ]
+        return ['-i', str(album_file), '-ss', str(start), *(['-to', str(end)] if end else [])]
+
+    def _output_args(self, track_file, start, end=None, encoding_args=None) -> List[str]:
+        """Create the ffmpeg output options that write the [start, end) span to a track file."""
+        return [
+            '-ss',
+            str(start),
+            *list((lambda: ['-to', str(end)] if end else [])()),
+            *(encoding_args or self._encoding_args(track_file)),
+        ]
+
+
+def _pcm_format(stream_info) -> Tuple[int, int]:
+    """Get the sample rate and number of channels of the (first) audio stream of a file."""
+    audio_stream = next(x for x in stream_info['streams'] if 'sample_rate' in x)
+    return int(audio_stream['sample_rate']), int(audio_stream['channels'])
+
+
+def _pcm_args(sample_rate, channels) -> List[str]:
+    """Create the ffmpeg options describing raw (headerless) PCM audio."""
+    return ['-f', PCM_FORMAT, '-ar', str(sample_rate), '-ac', str(channels)]
+
+
+@contextmanager
+def _pcm_scratch_file(directory):
+    """Create a (hidden) PCM scratch file, removed on leaving; provide its descriptor and path."""
+    file_descriptor, pcm_file = tempfile.mkstemp(prefix='.', suffix='.pcm', dir=directory)
+    try:
+        yield file_descriptor, pcm_file
+    finally:
+        os.close(file_descriptor)
+        os.remove(pcm_file)
+
+
+@contextmanager
+def _pcm_buffer(file_descriptor):
+    """Provide a read-only buffer of the PCM scratch file, memory-mapped where supported."""
+    try:
+        buffer = mmap.mmap(file_descriptor, 0, access=mmap.ACCESS_READ)
+    except (ValueError, OSError):  # ie empty file, or mmap unsupported for the file system
+        with open(file_descriptor, 'rb', closefd=False) as pcm_file:
+            yield memoryview(pcm_file.read())
+        return
+    try:
+        with memoryview(buffer) as view:
+            yield view
+    finally:
+        try:
+            buffer.close()
+        except BufferError as error:  # ie slices still referenced; never mask an exception
+            logger.warning("Could not unmap the PCM scratch file: %s", error)
+
+
+def _album_duration(album_file) -> float:
+    """Probe the duration (in seconds) of the album file."""
+    return float(ffprobe_client.get_stream_info(str(album_file))['format']['duration'])
+
+
+def _skipped_seconds(start: float, seek: str) -> float:
+    """Get the seconds of audio decoded (and discarded) before the track start, when seeking."""
+    if seek == 'output':
+        return start
+    if seek == 'hybrid':
+        return min(start, HYBRID_SEEK_MARGIN)
+    return 0.0
+
+
+def _stats_duration(ffmpeg_stderr: str) -> Optional[float]:
+    """Read the duration of the output from the (last) stats line of ffmpeg; None if missing."""
+    times = _STATS_TIME.findall(ffmpeg_stderr or '')
+    if not times:
+        return None
+    hours, minutes, seconds = times[-1]
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+def _seconds(value: float) -> str:
+    """Format a number of seconds as an ffmpeg time duration, with millisecond precision."""
+    return '{:.3f}'.format(value)
+
+
+def _run_in_pool(function, jobs, workers):
+    """Call 'function' once per job, using a pool of 'workers' threads.
+
+    Jobs are started in the given order. On the first job raising an exception, the jobs not
+    yet started are cancelled and the exception is re-raised (once running jobs finish); if
+    more jobs fail meanwhile, the exception raised is that of the job that failed first.
+    """
+    failure_order: Dict[int, int] = {}  # per index of a failed job, the order it failed in
+    failures = itertools.count()
+    lock = threading.Lock()
+
+    def run(index, job):
+        try:
+            return function(job)
+        except BaseException:
+            with lock:
+                failure_order[index] = next(failures)
+            raise
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(run, i, job) for i, job in enumerate(jobs)]
+        _, not_done = wait(futures, return_when=FIRST_EXCEPTION)
+        for future in not_done:
+            future.cancel()
+        # the futures themselves tell which jobs failed (done callbacks may not have run yet)
+        failed = [
+            i
+            for i, future in enumerate(futures)
+            if future.done() and not future.cancelled() and future.exception() is not None
+        ]
+        if failed:
+            raise futures[min(failed, key=lambda i: failure_order[i])].exception()
+
+
+def _longest_first(tracks):
+    """Order the [track_file, start, (end)] entries by decreasing duration."""
+    return sorted(tracks, key=lambda x: _span_duration(*x[1:]), reverse=True)
+
+
+def _span_duration(start, end=None) -> float:
+    """Get the duration of the [start, end) span; infinite if the span extends to the album end."""
+    if end is None:
+        return float('inf')
+    return float(end) - float(start)
+
+
+def _check_ffmpeg_result(args, result):
+    """Raise an FfmpegCommandError if the ffmpeg process exited with a non-zero code."""
+    if result.exit_code != 0:
+        logger.error("Fmmpeg exit code: %s", result.exit_code)
+        logger.error("Ffmpeg st out: %s", result.stdout)
+        logger.error("Fmmpeg stderr: %s", result.stderr)
+        raise FfmpegCommandError(
+            "Command '{}' failed with exit code {}:\n{}".format(
+                ' '.join(args), result.exit_code, result.stderr
+            )
         )
 
 
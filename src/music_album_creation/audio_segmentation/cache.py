@@ -0,0 +1,137 @@
+"""Content-addressed cache of created tracks, to skip re-encoding on repeated segmentations."""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import uuid
+from typing import Iterable
+
+from music_album_creation.caching import cache_directory, file_fingerprint
+
+__all__ = ['SegmentationCache']
+
+
+logger = logging.getLogger(__name__)
+
+# default upper bound of the total size of the cached tracks
+DEFAULT_MAX_BYTES = 2 * 1024**3
+
+# bytes read at a time, when hashing album files
+CHUNK_SIZE = 1024**2
+
+
+class SegmentationCache(object):
+    """Store created tracks, keyed by what determines their content.
+
+    A track's content is fully determined by the album file's content, the track's span (start
+    and end) within the album and the settings used to cut it (ie codec options). The sha256 of
+    these is the track's key in the cache, so a repeated segmentation of the same album (even
+    downloaded again, to a different path) finds its tracks in the cache.
+
+    Tracks are stored and materialised with hardlinks when possible (falling back to copies),
+    so stored and materialised files must not be modified in place. The total size of the cache is kept
+    below 'max_bytes', by evicting the least recently used tracks.
+    """
+
+    def __init__(self, directory=None, max_bytes=DEFAULT_MAX_BYTES):
+        self._dir = directory or cache_directory('tracks')
+        self._hashes_dir = os.path.join(self._dir, 'album-hashes')
+        os.makedirs(self._hashes_dir, exist_ok=True)
+        self.max_bytes = max_bytes
+
+    @property
+    def directory(self):
+        return self._dir
+
+    def album_hash(self, album_file) -> str:
+        """Get the sha256 of the album file's content.
+
+        Hashes are remembered (keyed by path, size and mtime), so an album file is read only
+        the first time it is segmented.
+        """
+        hash_file = os.path.join(self._hashes_dir, file_fingerprint(str(album_file)))
+        try:
+            with open(hash_file, 'r') as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            pass
+        sha256 = hashlib.sha256()
+        with open(album_file, 'rb') as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                sha256.update(chunk)
+        _write_atomically(hash_file, sha256.hexdigest().encode('utf-8'))
+        return sha256.hexdigest()
+
+    @staticmethod
+    def key(album_hash: str, start, end, settings: Iterable[str]) -> str:
+        """Compute the cache key of the track spanning [start, end) of the album."""
+        return hashlib.sha256(
+            json.dumps(
+                [
+                    album_hash,
+                    '{:.3f}'.format(float(start)),
+                    None if end is None else '{:.3f}'.format(float(end)),
+                    list(settings),
+                ]
+            ).encode('utf-8')
+        ).hexdigest()
+
+    def _path(self, key) -> str:
+        return os.path.join(self._dir, key)
+
+    def get(self, key, track_file) -> bool:
+        """Materialise the cached track (if any) as 'track_file'; return whether it was cached."""
+        cached_file = self._path(key)
+        try:
+            os.utime(cached_file)  # mark as recently used
+        except FileNotFoundError:
+            return False
+        if os.path.lexists(track_file):
+            os.remove(track_file)
+        try:
+            os.link(cached_file, track_file)
+        except OSError:  # ie different file systems, or hardlinks unsupported
+            shutil.copyfile(cached_file, track_file)
+        logger.info("Track '%s' found in cache", track_file)
+        return True
+
+    def put(self, key, track_file):
+        """Store the track file in the cache, as a hardlink (or a copy, across file systems)."""
+        temp_file = os.path.join(self._dir, '.{}.{}'.format(key, uuid.uuid4().hex))
+        try:
+            try:
+                os.link(track_file, temp_file)
+            except OSError:  # ie different file systems, or hardlinks unsupported
+                shutil.copyfile(track_file, temp_file)
+            os.replace(temp_file, self._path(key))
+        except BaseException:
+            if os.path.lexists(temp_file):
+                os.remove(temp_file)
+            raise
+
+    def evict(self):
+        """Remove the least recently used tracks, until the cache fits in 'max_bytes'."""
+        entries = []
+        for entry in os.scandir(self._dir):
+            if entry.is_file() and not entry.name.startswith('.'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total_bytes = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total_bytes -= size
+
+
+def _write_atomically(file_path, content: bytes):
+    file_descriptor, temp_file = tempfile.mkstemp(dir=os.path.dirname(file_path), prefix='.')
+    with open(file_descriptor, 'wb') as f:
+        f.write(content)
+    os.replace(temp_file, file_path)
@@ -98,12 +98,58 @@ class SegmentationInformation(object):
             segmentation_information(to_timestamps_info(list(tracks_information)))
         )
 
+    @classmethod
+    def from_boundaries(cls, boundaries, track_names=None):
+        """Create from the times (in seconds) at which each track, after the first, starts.
+
+        :param list boundaries: track start times, in seconds; the first track starts at 0
+        :param list track_names: optional names of the tracks (len(boundaries) + 1 of them);
+            tracks are named 'Track 1', 'Track 2', etc by default
+        """
+        starts = [0.0] + sorted(float(x) for x in boundaries)
+        if track_names is None:
+            track_names = ['Track {}'.format(i) for i in range(1, len(starts) + 1)]
+        if len(track_names) != len(starts):
+            raise ValueError(
+                "Expected {} track names for {} boundaries, got {}".format(
+                    len(starts), len(boundaries), len(track_names)
+                )
+            )
+        spans = [[start, end] for start, end in zip(starts, starts[1:])] + [[starts[-1]]]
+        return SegmentationInformation(
+            [
+                ['{:02d} - {}'.format(i, name)] + ['{:.3f}'.format(x) for x in span]
+                for i, (name, span) in enumerate(zip(track_names, spans), 1)
+            ]
+        )
+
     @classmethod
     def from_multiline(cls, string, hhmmss_type):
         return cls.from_tracks_information(
             TracksInformation.from_multiline(string), hhmmss_type
         )
 
+    @classmethod
+    def from_chapters(cls, chapters):
+        """Create from the chapters of an album file, as given by FFProbeClient.get_chapters.
+
+        Chapter titles become track names (untitled chapters are named 'Track 1', etc) and
+        chapter start/end times become the track boundaries, with millisecond precision.
+
+        :param list chapters: (title, start, end) tuples, with times in seconds
+        """
+        if not chapters:
+            raise ValueError("Cannot segment an album without chapters")
+        tracks_info = []
+        for i, (title, start, end) in enumerate(sorted(chapters, key=lambda x: x[1]), 1):
+            name = (title or '').strip().replace('/', '-') or 'Track {}'.format(i)
+            tracks_info.append(
+                ['{:02d} - {}'.format(i, name), '{:.3f}'.format(start), '{:.3f}'.format(end)]
+            )
+        # last track ends where the album ends
+        tracks_info[-1] = tracks_info[-1][:2]
+        return SegmentationInformation(tracks_info)
+
     def __len__(self):
         return len(self.tracks_info)
 
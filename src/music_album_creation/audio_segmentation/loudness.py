@@ -0,0 +1,104 @@
+"""Measure the loudness (EBU R128) of tracks, while ffmpeg creates them."""
+
+import math
+import re
+import threading
+from typing import Dict, List, Optional
+
+import attr
+
+__all__ = ['Loudness', 'LoudnessMeter']
+
+
+# ffmpeg options that measure the integrated loudness and true peak of the audio being encoded,
+# leaving the audio as it is; the loudness of each (400 ms) gating block is logged every 100 ms,
+# along with the summary, so that the blocks of all the tracks gate the album's loudness
+EBUR128_ARGS = ('-af', 'ebur128=peak=true:framelog=info')
+
+# loudness (LUFS) that ReplayGain 2.0 gains bring tracks to
+REPLAYGAIN_REFERENCE = -18.0
+
+_INTEGRATED = re.compile(r'Integrated loudness:\s*I:\s*(\S+) LUFS')
+_TRUE_PEAK = re.compile(r'True peak:\s*Peak:\s*(\S+) dBFS')
+_MOMENTARY = re.compile(r' M:\s*(\S+)')
+
+# gates of the integrated loudness (ITU-R BS.1770): blocks quieter than the absolute gate, or
+# by more than the relative gate (LU) than the loudness of the blocks passing the absolute gate
+ABSOLUTE_GATE = -70.0
+RELATIVE_GATE = -10.0
+
+
+@attr.s(frozen=True)
+class Loudness(object):
+    """Integrated loudness (in LUFS) and true peak (linear, 1.0 being full scale) of audio."""
+
+    integrated: float = attr.ib()
+    peak: float = attr.ib()
+
+    @property
+    def gain(self) -> float:
+        """ReplayGain gain (in dB), bringing the audio to the reference loudness"""
+        return REPLAYGAIN_REFERENCE - self.integrated
+
+    @classmethod
+    def from_ebur128(cls, ffmpeg_stderr: str) -> 'Loudness':
+        """Read the summary the ffmpeg 'ebur128' filter logs, when the audio ends."""
+        integrated = _INTEGRATED.findall(ffmpeg_stderr)
+        peak = _TRUE_PEAK.findall(ffmpeg_stderr)
+        if not (integrated and peak):
+            raise ValueError("No ebur128 loudness summary found in the ffmpeg output")
+        return cls(float(integrated[-1]), 10 ** (float(peak[-1]) / 20))
+
+
+class LoudnessMeter(object):
+    """Collect the loudness of the tracks of an album, as measured while creating them.
+
+    Pass an instance to AudioSegmenter.segment (or segment_decode_once) as 'loudness'; tracks
+    may be measured from several threads at a time.
+    """
+
+    def __init__(self):
+        self._tracks: Dict[str, Loudness] = {}
+        self._blocks: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, track_file, ffmpeg_stderr: str):
+        """Record the loudness of the track, given the stderr of the ffmpeg that created it."""
+        loudness = Loudness.from_ebur128(ffmpeg_stderr)
+        blocks = [float(x) for x in _MOMENTARY.findall(ffmpeg_stderr)]
+        with self._lock:
+            self._tracks[str(track_file)] = loudness
+            self._blocks[str(track_file)] = blocks
+
+    @property
+    def tracks(self) -> Dict[str, Loudness]:
+        """Loudness per track file"""
+        with self._lock:
+            return dict(self._tracks)
+
+    def album(self) -> Optional[Loudness]:
+        """Get the loudness of the album (all tracks measured); None if none measured.
+
+        The album's integrated loudness is gated over the blocks of all the tracks, as if the
+        album was measured in one go, and its peak is the highest track peak.
+        """
+        with self._lock:
+            tracks = dict(self._tracks)
+            blocks = [x for track_blocks in self._blocks.values() for x in track_blocks]
+        if not tracks:
+            return None
+        return Loudness(_gated_loudness(blocks), max(x.peak for x in tracks.values()))
+
+
+def _gated_loudness(blocks: List[float]) -> float:
+    """Get the integrated loudness (LUFS) of audio, given the loudness of its gating blocks."""
+    gated = [x for x in blocks if x > ABSOLUTE_GATE]
+    if not gated:
+        return ABSOLUTE_GATE
+    relative_gate = _mean_loudness(gated) + RELATIVE_GATE
+    return round(_mean_loudness([x for x in gated if x > relative_gate]), 2)
+
+
+def _mean_loudness(blocks: List[float]) -> float:
+    # the loudness of a block is -0.691 + 10 * log10(mean square), so the -0.691 cancels out
+    return 10 * math.log10(sum(10 ** (x / 10) for x in blocks) / len(blocks))
@@ -0,0 +1,114 @@
+"""Remember how the tracks in a directory were created, to re-segment only what changed."""
+
+import json
+import os
+import re
+import tempfile
+from typing import List, Optional, Tuple
+
+import attr
+
+__all__ = ['ManifestEntry', 'SegmentationManifest', 'IncrementalSegmentation']
+
+
+# name of the manifest file, stored in the directory of the tracks it describes
+MANIFEST_FILE = '.segmentation.json'
+
+# the numbering prefix of track names, ie '01 - ' in '01 - Know your enemy'
+_TRACK_NUMBER = re.compile(r'^\d+\s*-\s*')
+
+
+@attr.s(frozen=True)
+class ManifestEntry(object):
+    """A track file and what it was created from: a span of the album and the cut settings."""
+
+    file = attr.ib()
+    start = attr.ib()
+    end = attr.ib()
+    settings = attr.ib(converter=tuple)
+
+    @property
+    def title(self) -> str:
+        """The track name, without numbering and extension"""
+        return _TRACK_NUMBER.sub('', os.path.splitext(self.file)[0])
+
+    @property
+    def key(self) -> Tuple:
+        """What determines the track file's content, along with its title"""
+        return self.title, self.start, self.end, self.settings
+
+
+@attr.s
+class SegmentationManifest(object):
+    """The tracks created (in a directory) out of an album file, during the last segmentation."""
+
+    album = attr.ib()
+    entries: List[ManifestEntry] = attr.ib(factory=list)
+
+    @classmethod
+    def load(cls, directory) -> Optional['SegmentationManifest']:
+        """Read the manifest of the directory; None if missing or unreadable."""
+        try:
+            with open(os.path.join(directory, MANIFEST_FILE), 'r') as f:
+                data = json.load(f)
+            return cls(data['album'], [ManifestEntry(**x) for x in data['entries']])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def save(self, directory):
+        """Write the manifest in the directory, atomically replacing any previous one."""
+        file_descriptor, temp_file = tempfile.mkstemp(dir=directory, prefix='.')
+        with open(file_descriptor, 'w') as f:
+            json.dump(
+                {
+                    'album': self.album,
+                    'entries': [
+                        dict(attr.asdict(x), settings=list(x.settings)) for x in self.entries
+                    ],
+                },
+                f,
+                indent=2,
+            )
+        os.replace(temp_file, os.path.join(directory, MANIFEST_FILE))
+
+    def match(self, entries: List[ManifestEntry], directory):
+        """Match the wanted entries against the (still existing) previously created tracks.
+
+        A previous track matches a wanted one if they share title, span and settings; its file
+        can then be reused as it is, or renamed if only the numbering of the tracks changed.
+
+        :return: the reused entries, (previous, wanted) entry pairs to rename, the entries to
+            (re)create, and the previous entries that match no wanted one
+        :rtype: tuple
+        """
+        available = {}
+        for entry in self.entries:
+            if os.path.isfile(os.path.join(directory, entry.file)):
+                available.setdefault(entry.key, entry)
+        reused, renamed, regenerated = [], [], []
+        for entry in entries:
+            previous = available.pop(entry.key, None)
+            if previous is None:
+                regenerated.append(entry)
+            elif previous.file == entry.file:
+                reused.append(entry)
+            else:
+                renamed.append((previous, entry))
+        return reused, renamed, regenerated, list(available.values())
+
+
+@attr.s(frozen=True)
+class IncrementalSegmentation(object):
+    """Result of an incremental segmentation: the tracks and how each one was obtained.
+
+    'tracks' lists all the tracks (SegmentedTrack), in album order. The other attributes list track
+    file names: 'reused' ones were left untouched, 'renamed' are (old, new) name pairs of
+    tracks whose numbering changed, 'regenerated' ones were cut again and 'removed' ones
+    were obsolete tracks of the previous segmentation.
+    """
+
+    tracks = attr.ib()
+    reused = attr.ib(factory=list)
+    renamed = attr.ib(factory=list)
+    regenerated = attr.ib(factory=list)
+    removed = attr.ib(factory=list)
@@ -0,0 +1,192 @@
+"""Plan a segmentation without running it: the ffmpeg commands and what they would cost."""
+
+import logging
+import os
+import shlex
+import shutil
+import tempfile
+from typing import List, Optional, Tuple
+
+import attr
+
+from music_album_creation.caching import cache_directory, file_fingerprint
+
+__all__ = ['PlannedTrack', 'SegmentationPlan', 'calibration_factor']
+
+
+logger = logging.getLogger(__name__)
+
+
+# bitrate (bits/s) of re-encoded tracks; ffmpeg's default for mp3 (libmp3lame) output
+OUTPUT_BITRATES = {'mp3': 128000}
+
+# seconds of audio encoded to measure the calibration factor of the host
+CALIBRATION_SECONDS = 20
+
+# tracks may end this many seconds after the probed album end (ie rounded timestamps)
+END_TOLERANCE = 1.0
+
+# ffmpeg options encoding generated audio to mp3, discarding the output (no file is written)
+_CALIBRATION_ARGS = (
+    '-f',
+    'lavfi',
+    '-i',
+    'sine=frequency=440:sample_rate=44100:duration={}'.format(CALIBRATION_SECONDS),
+    '-ac',
+    '2',
+    '-c:a',
+    'libmp3lame',
+    '-f',
+    'null',
+    '-',
+)
+
+
+@attr.s(frozen=True)
+class PlannedTrack(object):
+    """A track to create: its file, span (in seconds), ffmpeg command and estimated cost."""
+
+    path: str = attr.ib()
+    start: float = attr.ib()
+    end: float = attr.ib()
+    duration: float = attr.ib()
+    command: Tuple[str, ...] = attr.ib(converter=tuple)
+    cpu_seconds: float = attr.ib()
+    output_bytes: int = attr.ib()
+
+    @property
+    def command_line(self) -> str:
+        """The ffmpeg command, quoted as to be pasted in a shell"""
+        return ' '.join(shlex.quote(x) for x in self.command)
+
+
+@attr.s(frozen=True)
+class SegmentationPlan(object):
+    """The tracks a segmentation would create and the problems found in the tracks' spans.
+
+    A plan with problems is not valid: running it would create tracks that are empty or cut
+    short, because they extend past the end of the album.
+    """
+
+    album_file: str = attr.ib()
+    album_duration: float = attr.ib()
+    tracks: List[PlannedTrack] = attr.ib()
+    problems: List[str] = attr.ib(factory=list)
+
+    @property
+    def valid(self) -> bool:
+        return not self.problems
+
+    @property
+    def cpu_seconds(self) -> float:
+        """Estimated CPU time of creating all tracks"""
+        return sum(x.cpu_seconds for x in self.tracks)
+
+    @property
+    def output_bytes(self) -> int:
+        """Estimated size of all created tracks"""
+        return sum(x.output_bytes for x in self.tracks)
+
+    def report(self) -> str:
+        """Describe the plan: per track its span, estimated cost and ffmpeg command."""
+        lines = [
+            "Album: {} ({:.3f} seconds)".format(self.album_file, self.album_duration),
+        ]
+        for track in self.tracks:
+            lines.extend(
+                [
+                    " {} [{:.3f} - {:.3f}] {:.3f}s, ~{:.1f} CPU seconds, ~{:.2f} MB".format(
+                        os.path.basename(track.path),
+                        track.start,
+                        track.end,
+                        track.duration,
+                        track.cpu_seconds,
+                        track.output_bytes / 1e6,
+                    ),
+                    "   {}".format(track.command_line),
+                ]
+            )
+        lines.append(
+            "Total: {} tracks, ~{:.1f} CPU seconds, ~{:.2f} MB".format(
+                len(self.tracks), self.cpu_seconds, self.output_bytes / 1e6
+            )
+        )
+        lines.extend("Problem: {}".format(x) for x in self.problems)
+        return '\n'.join(lines)
+
+
+def estimate(
+    duration: float,
+    skipped: float,
+    source_bitrate: float,
+    codec: Optional[str],
+    factor: float,
+) -> Tuple[float, int]:
+    """Estimate the CPU seconds and output bytes of creating a track.
+
+    Re-encoded tracks cost 'factor' CPU seconds per second of audio, counting the audio
+    decoded and discarded before the track start ('skipped' seconds, ie when output seeking)
+    at the same rate, which makes the estimate an upper bound. Stream copied tracks ('codec'
+    None) take the bitrate of the source and (next to) no CPU time.
+
+    :param float source_bitrate: bitrate (bits/s) of the album file
+    :param str codec: the codec tracks are encoded with (see OUTPUT_BITRATES); None for copy
+    :param float factor: CPU seconds per second of encoded audio (see calibration_factor)
+    :return: the CPU seconds and output bytes
+    :rtype: tuple
+    """
+    if codec is None:
+        return 0.0, int(source_bitrate * duration / 8)
+    return factor * (duration + skipped), int(OUTPUT_BITRATES[codec] * duration / 8)
+
+
+def calibration_factor(ffmpeg, ffmpeg_binary: str) -> float:
+    """Get the CPU seconds this host takes to encode a second of audio to mp3.
+
+    The factor is measured by encoding a few seconds of generated audio (discarding the
+    output) and cached on disk, keyed by the ffmpeg binary's path, size and modification
+    time, so that it is measured again only when ffmpeg is replaced.
+
+    :param ffmpeg: the ffmpeg proxy (see music_album_creation.ffmpeg.FFMPEG) to measure
+    :param str ffmpeg_binary: name or path of the ffmpeg binary the proxy runs
+    """
+    binary_path = shutil.which(ffmpeg_binary) or ffmpeg_binary
+    factor_file = os.path.join(
+        cache_directory('calibration'),
+        '{}.factor'.format(
+            file_fingerprint(binary_path) if os.path.isfile(binary_path) else 'default'
+        ),
+    )
+    try:
+        with open(factor_file, 'r') as f:
+            return float(f.read())
+    except (OSError, ValueError):
+        pass
+    factor = _measure(ffmpeg) / CALIBRATION_SECONDS
+    logger.info("Calibrated encoding cost: %.4f CPU seconds per audio second", factor)
+    file_descriptor, temp_file = tempfile.mkstemp(dir=os.path.dirname(factor_file))
+    try:
+        with open(file_descriptor, 'w') as f:
+            f.write(repr(factor))
+        os.replace(temp_file, factor_file)
+    except BaseException:
+        os.remove(temp_file)
+        raise
+    return factor
+
+
+def _measure(ffmpeg) -> float:
+    """Run the calibration encoding; return its CPU time (wall time, where not available).
+
+    Only the resources of the calibration process count, as measured on reaping it, so that
+    other processes (ie of a concurrent segmentation) do not skew the factor.
+    """
+    result = ffmpeg(*_CALIBRATION_ARGS, stage='calibrate')
+    if result.exit_code != 0:
+        raise RuntimeError(
+            "Calibration of the encoding cost failed:\n{}".format(result.stderr)
+        )
+    usage = result.usage
+    if usage.user_time is None:  # ie on Windows
+        return usage.wall_time
+    return usage.user_time + (usage.system_time or 0.0)
@@ -0,0 +1,27 @@
+"""Output profiles: the audio formats tracks can be encoded in."""
+
+from typing import List, Optional
+
+import attr
+
+__all__ = ['OutputProfile']
+
+
+@attr.s(frozen=True)
+class OutputProfile(object):
+    """An audio format to encode tracks in: codec (ffmpeg encoder), bitrate and container.
+
+    The container is given as the tracks' file extension (ffmpeg picks the muxer from it).
+    Tracks of each profile are written in a subdirectory called after the profile's 'name',
+    which defaults to the container; ie OutputProfile('libopus', '128k', 'opus').
+    """
+
+    codec: str = attr.ib()
+    bitrate: Optional[str] = attr.ib(default=None)
+    container: str = attr.ib(default='mp3')
+    name: str = attr.ib(default=attr.Factory(lambda self: self.container, takes_self=True))
+
+    def encoding_args(self, track_file) -> List[str]:
+        """Create the ffmpeg output options that encode (only) the audio into the track file."""
+        bitrate = ['-b:a', self.bitrate] if self.bitrate else []
+        return ['-vn', '-c:a', self.codec, *bitrate, track_file]
@@ -0,0 +1,105 @@
+"""Report the progress of segmentation, as ffmpeg writes it with the '-progress' option."""
+
+from typing import Callable, Optional
+
+import attr
+
+__all__ = ['ProgressEvent', 'ProgressParser']
+
+
+# ffmpeg options that make it write 'key=value' progress lines on stdout (and no stats on stderr)
+PROGRESS_ARGS = ('-progress', 'pipe:1', '-nostats')
+
+
+@attr.s(frozen=True)
+class ProgressEvent(object):
+    """Progress made on creating a track, as last reported by ffmpeg.
+
+    Times are in seconds of audio; 'duration' (thus 'eta') is None when the track's duration is
+    unknown. 'speed' is the processing speed, in seconds of audio per second of wall time.
+    """
+
+    track_index = attr.ib()
+    track_file = attr.ib()
+    processed = attr.ib()
+    duration = attr.ib(default=None)
+    speed = attr.ib(default=None)
+    done = attr.ib(default=False)
+
+    @property
+    def eta(self) -> Optional[float]:
+        """Estimated seconds (of wall time) left until the track is created"""
+        if self.done:
+            return 0.0
+        if self.duration is None or not self.speed:
+            return None
+        return max(0.0, self.duration - self.processed) / self.speed
+
+
+class ProgressParser(object):
+    """Turn the progress lines ffmpeg writes for a track into ProgressEvents.
+
+    Feed the ffmpeg stdout lines, one at a time, by calling the instance; an event is passed to
+    the callback at the end of each progress block (ie on each 'progress=...' line). Only the
+    values of the current block are kept in memory.
+    """
+
+    def __init__(
+        self,
+        track_index: int,
+        track_file: str,
+        duration: Optional[float],
+        callback: Callable[[ProgressEvent], None],
+    ):
+        self.track_index = track_index
+        self.track_file = track_file
+        self.duration = duration
+        self.callback = callback
+        self.processed = 0.0  # seconds of audio processed, as last reported
+        self._block: dict = {}
+
+    def __call__(self, line: str):
+        key, _, value = line.strip().partition('=')
+        if key != 'progress':
+            self._block[key] = value.strip()
+            return
+        self.processed = self._processed()
+        self.callback(
+            ProgressEvent(
+                self.track_index,
+                self.track_file,
+                self.processed,
+                duration=self.duration,
+                speed=self._speed(),
+                done=value == 'end',
+            )
+        )
+        self._block = {}
+
+    def complete(self):
+        """Report the track as created in full; ie when materialised from a cache, by no ffmpeg."""
+        self.processed = self.duration or self.processed
+        self.callback(
+            ProgressEvent(
+                self.track_index,
+                self.track_file,
+                self.processed,
+                duration=self.duration,
+                done=True,
+            )
+        )
+
+    def _processed(self) -> float:
+        # despite its name, 'out_time_ms' is in microseconds, same as 'out_time_us'
+        for key in ('out_time_us', 'out_time_ms'):
+            try:
+                return max(0.0, int(self._block[key]) / 1e6)
+            except (KeyError, ValueError):
+                pass
+        return 0.0
+
+    def _speed(self) -> Optional[float]:
+        try:
+            return float(self._block.get('speed', '').rstrip('x'))
+        except ValueError:  # ie 'N/A'
+            return None
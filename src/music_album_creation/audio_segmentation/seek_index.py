@@ -0,0 +1,107 @@
+"""Index of an album file's packets, to choose exact cut points without re-probing."""
+
+import logging
+import os
+import struct
+import tempfile
+from array import array
+from bisect import bisect_right
+from typing import Iterable, Tuple
+
+from music_album_creation.caching import cache_directory, file_fingerprint
+
+__all__ = ['SeekIndex']
+
+
+logger = logging.getLogger(__name__)
+
+# header of the index files: magic bytes followed by the number of packets
+_HEADER = struct.Struct('<8sQ')
+_MAGIC = b'MACSEEK1'
+
+
+class SeekIndex(object):
+    """Timestamps and byte positions of the key packets of an album file's audio stream.
+
+    Packets are kept in two compact arrays (8 bytes per timestamp and per position), sorted
+    by timestamp, so that the packet nearest to a cut point is found with a binary search.
+    """
+
+    def __init__(self, timestamps: array, positions: array):
+        self._timestamps = timestamps
+        self._positions = positions
+
+    @classmethod
+    def from_packets(cls, packets: Iterable[Tuple[float, int]]) -> 'SeekIndex':
+        timestamps, positions = array('d'), array('q')
+        for timestamp, position in sorted(packets):
+            timestamps.append(timestamp)
+            positions.append(position)
+        return cls(timestamps, positions)
+
+    @classmethod
+    def build(cls, album_file, ffprobe_client) -> 'SeekIndex':
+        """Get the index of the album file, probing the file only if it is not cached.
+
+        Indexes are cached on disk, keyed by the album file's path, size and modification
+        time, so that a modified (or replaced) album file gets re-indexed.
+        """
+        index_file = os.path.join(
+            cache_directory('seek-index'), '{}.idx'.format(file_fingerprint(str(album_file)))
+        )
+        if os.path.isfile(index_file):
+            try:
+                return cls.load(index_file)
+            except (OSError, ValueError, EOFError) as error:
+                logger.warning("Ignoring corrupt seek index '%s': %s", index_file, error)
+        index = cls.from_packets(ffprobe_client.get_packets(str(album_file)))
+        index.save(index_file)
+        return index
+
+    @classmethod
+    def load(cls, index_file) -> 'SeekIndex':
+        with open(index_file, 'rb') as f:
+            magic, nb_packets = _HEADER.unpack(f.read(_HEADER.size))
+            if magic != _MAGIC:
+                raise ValueError("Not a seek index file: '{}'".format(index_file))
+            timestamps, positions = array('d'), array('q')
+            timestamps.fromfile(f, nb_packets)
+            positions.fromfile(f, nb_packets)
+        return cls(timestamps, positions)
+
+    def save(self, index_file):
+        """Write the index to a file, atomically replacing any previous one."""
+        file_descriptor, temp_file = tempfile.mkstemp(dir=os.path.dirname(index_file))
+        try:
+            with open(file_descriptor, 'wb') as f:
+                f.write(_HEADER.pack(_MAGIC, len(self)))
+                self._timestamps.tofile(f)
+                self._positions.tofile(f)
+            os.replace(temp_file, index_file)
+        except BaseException:
+            os.remove(temp_file)
+            raise
+
+    def __len__(self):
+        return len(self._timestamps)
+
+    def _nearest(self, seconds: float) -> int:
+        """Get the array index of the packet with the timestamp nearest to 'seconds'."""
+        if not self._timestamps:
+            raise ValueError("Cannot seek in an empty index")
+        i = bisect_right(self._timestamps, seconds)
+        if i == 0:
+            return 0
+        if i == len(self._timestamps):
+            return i - 1
+        if seconds - self._timestamps[i - 1] <= self._timestamps[i] - seconds:
+            return i - 1
+        return i
+
+    def snap(self, seconds: float) -> float:
+        """Get the timestamp of the packet nearest to 'seconds' (never before the album start)."""
+        return max(0.0, self._timestamps[self._nearest(seconds)])
+
+    def position(self, seconds: float) -> int:
+        """Get the byte offset of the packet nearest to 'seconds'."""
+        return self._positions[self._nearest(seconds)]
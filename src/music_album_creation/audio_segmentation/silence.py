@@ -0,0 +1,264 @@
+"""Find track boundaries at the silences of an album, analysing its decoded audio.
+
+Boundaries are either proposed at the long silences of the whole album, or refined by moving
+given ones (ie from a tracklist) to the quietest point near them.
+
+Requires numpy (ie pip install music-album-creation[analysis]).
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+import attr
+import numpy as np
+
+from .album_segmentation import _check_ffmpeg_result, _seconds, ffmpeg
+from .data import SegmentationInformation
+
+__all__ = [
+    'SilenceDetector',
+    'detect_boundaries',
+    'segmentation_from_silence',
+    'BoundaryAdjustment',
+    'snap_to_silence',
+]
+
+
+logger = logging.getLogger(__name__)
+
+# rate (Hz) the (mono) audio is decoded at for analysis; plenty for telling silence apart
+ANALYSIS_SAMPLE_RATE = 8000
+
+# bytes of decoded audio analysed at a time
+BLOCK_SIZE = 64 * 1024
+
+# full scale amplitude of signed 16 bit samples
+_FULL_SCALE = 32768.0
+
+
+class SilenceDetector(object):
+    """Find the silences of a stream of mono, signed 16 bit (little-endian) PCM audio.
+
+    Feed the audio in blocks of any size; each block is split in windows of 'window' seconds
+    and a window is silent if its RMS level is at most 'threshold_db' (dBFS). Runs of silent
+    windows lasting at least 'min_silence' seconds are the silences. Only the current run and
+    a partial window are kept between blocks, so memory does not grow with the album length.
+
+    Silences at the very start or end of the audio are not between tracks, so they propose no
+    boundary.
+    """
+
+    def __init__(
+        self,
+        threshold_db: float = -50.0,
+        min_silence: float = 2.0,
+        window: float = 0.05,
+        sample_rate: int = ANALYSIS_SAMPLE_RATE,
+    ):
+        self.threshold_db = threshold_db
+        self.min_silence = min_silence
+        self.sample_rate = sample_rate
+        self._window_samples = max(1, int(round(window * sample_rate)))
+        self._threshold = _FULL_SCALE * 10 ** (threshold_db / 20.0)
+        self._pending = b''
+        self._windows = 0  # number of windows analysed so far
+        self._silence_start: Optional[int] = None  # first window of the current silent run
+        self.silences: List[Tuple[float, float]] = []
+
+    @property
+    def window(self) -> float:
+        """Seconds of audio per analysed window"""
+        return self._window_samples / self.sample_rate
+
+    def feed(self, block: bytes):
+        """Analyse the next block of audio."""
+        data = self._pending + block
+        window_bytes = 2 * self._window_samples
+        usable = len(data) - len(data) % window_bytes
+        self._pending = data[usable:]
+        if not usable:
+            return
+        samples = np.frombuffer(data, dtype='<i2', count=usable // 2)
+        silent = _window_rms(samples, self._window_samples) <= self._threshold
+        # windows where the audio turns silent or audible, relative to the previous window
+        previous = np.concatenate(([self._silence_start is not None], silent[:-1]))
+        for i in np.flatnonzero(silent != previous).tolist():
+            if silent[i]:
+                self._silence_start = self._windows + i
+            else:
+                self._end_silence(self._windows + i)
+        self._windows += int(len(silent))
+
+    def _end_silence(self, window_index: int):
+        start, self._silence_start = self._silence_start, None
+        if start == 0:  # leading silence
+            return
+        if (window_index - start) * self.window >= self.min_silence:
+            self.silences.append((start * self.window, window_index * self.window))
+
+    def finish(self) -> List[float]:
+        """Signal the end of the audio and get the proposed boundaries, in seconds.
+
+        A boundary is proposed in the middle of each silence (a trailing silence is ignored).
+        """
+        self._pending = b''
+        self._silence_start = None
+        return [round((start + end) / 2, 3) for start, end in self.silences]
+
+
+def detect_boundaries(album_file, **detector_settings) -> List[float]:
+    """Decode the album (streaming) and propose track boundaries at its long silences.
+
+    :param album_file: path of the album file
+    :param detector_settings: passed to SilenceDetector; ie 'threshold_db', 'min_silence'
+    :return: the times (in seconds) at which each track, after the first, starts
+    :rtype: list
+    """
+    detector = SilenceDetector(**detector_settings)
+    args = ('-i', str(album_file), *_analysis_args(detector.sample_rate))
+    result = ffmpeg.stream(
+        *args, on_stdout_chunk=detector.feed, chunk_size=BLOCK_SIZE, stage='silence'
+    )
+    _check_ffmpeg_result(args, result)
+    boundaries = detector.finish()
+    logger.info("Detected %s silences in '%s': %s", len(boundaries), album_file, boundaries)
+    return boundaries
+
+
+def segmentation_from_silence(
+    album_file, track_names=None, **detector_settings
+) -> SegmentationInformation:
+    """Segment the album at its long silences; ready to pass to AudioSegmenter.segment.
+
+    :param album_file: path of the album file
+    :param list track_names: optional names of the tracks; must match the number of detected
+        tracks. Tracks are named 'Track 1', 'Track 2', etc by default
+    :rtype: SegmentationInformation
+    """
+    return SegmentationInformation.from_boundaries(
+        detect_boundaries(album_file, **detector_settings), track_names=track_names
+    )
+
+
+@attr.s(frozen=True)
+class BoundaryAdjustment(object):
+    """A track's start, as given and as moved to the quietest point near it (in seconds)."""
+
+    track = attr.ib()
+    original = attr.ib()
+    adjusted = attr.ib()
+
+    @property
+    def offset(self) -> float:
+        """Seconds the track start moved by; negative if it moved earlier"""
+        return round(self.adjusted - self.original, 3)
+
+
+def snap_to_silence(
+    album_file,
+    segmentation,
+    tolerance: float = 3.0,
+    workers: Optional[int] = None,
+    window: float = 0.02,
+    sample_rate: int = ANALYSIS_SAMPLE_RATE,
+    threshold_db: float = -50.0,
+    min_drop_db: float = 10.0,
+) -> Tuple[SegmentationInformation, List[BoundaryAdjustment]]:
+    """Move each boundary between tracks to the quietest point within 'tolerance' seconds.
+
+    Meant to fix imprecise tracklists (ie whole seconds, or a few seconds off), so that tracks
+    neither start with the tail of the previous one nor get their start clipped. Only the
+    audio around each boundary is decoded, in parallel (with a pool of 'workers' threads).
+    The search range of a boundary never reaches past the middle of a neighbouring track, so
+    boundaries keep their order.
+
+    A boundary only moves if the quietest point is silent (its RMS level is at most
+    'threshold_db' dBFS) or at least 'min_drop_db' dB quieter than the audio at the boundary;
+    so that boundaries within continuous audio (ie accurate ones, in gapless albums) stay put.
+
+    :param album_file: path of the album file
+    :param segmentation: the tracks information, ie a SegmentationInformation
+    :param float tolerance: maximum number of seconds to move a boundary by
+    :return: the refined tracks information and the adjustment of each boundary
+    :rtype: tuple
+    """
+    tracks = [list(x) for x in segmentation]
+    starts = [float(x[1]) for x in tracks]
+
+    def search_range(i):
+        lower = max(starts[i] - tolerance, (starts[i - 1] + starts[i]) / 2)
+        if i + 1 < len(starts):
+            return lower, min(starts[i] + tolerance, (starts[i] + starts[i + 1]) / 2)
+        return lower, starts[i] + tolerance
+
+    def refine(i):
+        return _quietest_point(
+            album_file,
+            starts[i],
+            *search_range(i),
+            window,
+            sample_rate,
+            threshold=_FULL_SCALE * 10 ** (threshold_db / 20.0),
+            min_drop=10 ** (min_drop_db / 20.0),
+        )
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        refined = [starts[0]] + list(executor.map(refine, range(1, len(starts))))
+
+    adjustments = []
+    for i in range(1, len(tracks)):
+        tracks[i][1] = tracks[i - 1][2] = _seconds(refined[i])
+        adjustments.append(BoundaryAdjustment(tracks[i][0], starts[i], refined[i]))
+        if refined[i] != starts[i]:
+            logger.info(
+                "Moved start of '%s' from %s to %s", tracks[i][0], starts[i], refined[i]
+            )
+    return SegmentationInformation(tracks), adjustments
+
+
+def _quietest_point(
+    album_file, boundary, lower, upper, window, sample_rate, threshold, min_drop
+) -> float:
+    """Find the quietest window within [lower, upper) of the album; nearest to 'boundary'.
+
+    The 'boundary' itself is returned, unless the quietest window is silent (its RMS level is
+    at most 'threshold') or quieter than the window at the boundary by a 'min_drop' ratio.
+    """
+    args = (
+        '-ss',
+        _seconds(lower),
+        '-t',
+        _seconds(upper - lower),
+        '-i',
+        str(album_file),
+        *_analysis_args(sample_rate),
+    )
+    audio = bytearray()
+    result = ffmpeg.stream(
+        *args, on_stdout_chunk=audio.extend, chunk_size=BLOCK_SIZE, stage='silence'
+    )
+    _check_ffmpeg_result(args, result)
+    window_samples = max(1, int(round(window * sample_rate)))
+    nb_windows = len(audio) // (2 * window_samples)
+    if not nb_windows:  # ie boundary past the end of the album
+        return boundary
+    samples = np.frombuffer(audio, dtype='<i2', count=nb_windows * window_samples)
+    rms = _window_rms(samples, window_samples)
+    centers = lower + (np.arange(nb_windows) + 0.5) * window_samples / sample_rate
+    quietest = np.flatnonzero(rms <= rms.min())
+    at_boundary = rms[min(np.searchsorted(centers, boundary), nb_windows - 1)]
+    if rms.min() > threshold and rms.min() * min_drop > at_boundary:
+        return boundary  # no silence (or clearly quieter point) near the boundary
+    return round(float(centers[quietest[np.argmin(np.abs(centers[quietest] - boundary))]]), 3)
+
+
+def _analysis_args(sample_rate) -> List[str]:
+    """Output arguments decoding the audio to mono PCM on stdout, for analysis."""
+    return ['-vn', '-ac', '1', '-ar', str(sample_rate), '-f', 's16le', 'pipe:1']
+
+
+def _window_rms(samples, window_samples):
+    """Compute the RMS level of each (whole) window of the 16 bit samples."""
+    windows = samples.astype(np.float64).reshape(-1, window_samples)
+    return np.sqrt(np.mean(np.square(windows), axis=1))
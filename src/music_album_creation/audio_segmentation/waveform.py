@@ -0,0 +1,78 @@
+"""Waveform peaks of tracks: the min and max sample of each bucket of samples, for drawing.
+
+Requires numpy (ie pip install music-album-creation[analysis]).
+"""
+
+import os
+import struct
+import tempfile
+from typing import Tuple
+
+import numpy as np
+
+__all__ = ['write_peaks', 'read_peaks', 'peaks_file']
+
+
+# samples (per channel) summarised by each min/max pair
+PEAKS_BUCKET = 256
+
+# buckets computed at a time, bounding memory regardless of the track duration
+BLOCK_BUCKETS = 4096
+
+# header of the peaks files: magic bytes, sample rate, bucket size, number of buckets
+_HEADER = struct.Struct('<8sIIQ')
+_MAGIC = b'MACPEAK1'
+
+
+def peaks_file(track_file) -> str:
+    """Get the path of the peaks file (sidecar) of a track file."""
+    return os.path.splitext(str(track_file))[0] + '.peaks'
+
+
+def write_peaks(pcm, file_path, sample_rate, channels, bucket=PEAKS_BUCKET):
+    """Write the waveform peaks of signed 16 bit (little-endian) PCM audio to a file.
+
+    Each bucket of 'bucket' consecutive samples (of all channels) is summarised by its min and
+    max sample, stored as int16 pairs after a small header. Buckets are computed a block at a
+    time, by reshaping the samples (no copy of the audio is made), and written as they come.
+
+    :param pcm: buffer of the PCM audio (ie a memoryview of a memory-mapped file)
+    :param str file_path: path of the peaks file; atomically replaced if it exists
+    """
+    samples = np.frombuffer(pcm, dtype='<i2')
+    samples = samples[: len(samples) - len(samples) % channels]
+    bucket_size = bucket * channels
+    block_size = BLOCK_BUCKETS * bucket_size
+    file_descriptor, temp_file = tempfile.mkstemp(
+        dir=os.path.dirname(os.path.abspath(file_path)), prefix='.'
+    )
+    try:
+        with open(file_descriptor, 'wb') as f:
+            f.write(_HEADER.pack(_MAGIC, sample_rate, bucket, -(-len(samples) // bucket_size)))
+            for i in range(0, len(samples), block_size):
+                block = samples[i : i + block_size]
+                whole = len(block) - len(block) % bucket_size
+                buckets = [block[:whole].reshape(-1, bucket_size)] if whole else []
+                if whole < len(block):  # last, partial bucket
+                    buckets.append(block[whole:].reshape(1, -1))
+                for x in buckets:
+                    np.stack((x.min(axis=1), x.max(axis=1)), axis=1).astype('<i2').tofile(f)
+        os.replace(temp_file, file_path)
+    except BaseException:
+        os.remove(temp_file)
+        raise
+
+
+def read_peaks(file_path) -> Tuple[int, int, np.ndarray]:
+    """Read a peaks file.
+
+    :return: the sample rate, the bucket size and the (min, max) pair of each bucket, as an
+        int16 array of shape (number of buckets, 2)
+    :rtype: tuple
+    """
+    with open(file_path, 'rb') as f:
+        magic, sample_rate, bucket, nb_buckets = _HEADER.unpack(f.read(_HEADER.size))
+        if magic != _MAGIC:
+            raise ValueError("Not a peaks file: '{}'".format(file_path))
+        peaks = np.fromfile(f, dtype='<i2', count=2 * nb_buckets).reshape(-1, 2)
+    return sample_rate, bucket, peaks
@@ -0,0 +1,36 @@
+"""Locate the on-disk caches of the application and key cached entries by file."""
+
+import hashlib
+import os
+
+__all__ = ['cache_directory', 'file_fingerprint']
+
+
+def cache_directory(*sub_directories: str) -> str:
+    """Get (creating it if needed) a directory inside the application's cache.
+
+    The cache lives in the directory pointed to by the MUSIC_CACHE_DIR environment variable,
+    if set, otherwise in a 'music-album-creation' directory in the user's cache directory
+    (ie ~/.cache/music-album-creation on Linux).
+    """
+    root = os.environ.get('MUSIC_CACHE_DIR') or os.path.join(
+        os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'),
+        'music-album-creation',
+    )
+    directory = os.path.join(root, *sub_directories)
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def file_fingerprint(file_path: str) -> str:
+    """Compute a key that changes whenever the file is replaced or modified.
+
+    The key is derived from the file's (real) path, size and modification time, so it is
+    computed without reading the file's content.
+    """
+    stat = os.stat(file_path)
+    return hashlib.sha256(
+        '{}:{}:{}'.format(os.path.realpath(file_path), stat.st_size, stat.st_mtime_ns).encode(
+            'utf-8'
+        )
+    ).hexdigest()
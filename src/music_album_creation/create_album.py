@@ -1,19 +1,25 @@
 #!/usr/bin/env python3
 
+import contextlib
 import glob
+import json
 import logging
 import os
 import shutil
 import sys
+import threading
 import time
 from time import sleep
 
 import click
+from tqdm import tqdm
 
 from music_album_creation.ffprobe_client import FFProbeClient
 
 from .audio_segmentation import (
     AudioSegmenter,
+    LoudnessMeter,
+    SegmentationCache,
     SegmentationInformation,
     TracksInformation,
 )
@@ -26,7 +32,15 @@ from .downloading import (
     TokenParameterNotInVideoInfoError,
     UnavailableVideoError,
 )
-from .ffmpeg import FFProbe
+from .ffmpeg import FFMPEG, FFProbe
+from .ffmpeg.capabilities import UnusableFFmpegError
+from .library import (
+    StagedAlbum,
+    copy_and_hash,
+    hash_file,
+    read_checksums,
+    write_checksums,
+)
 from .metadata import MetadataDealer
 from .music_master import MusicMaster
 
@@ -91,7 +105,62 @@ def music_lib_directory(verbose=True):
     help="If given, then value shall be used as the TPE2 tag: 'Band/orchestra/accompaniment'.  In the music player 'clementine' it corresponds to the 'Album artist' column",
 )
 @click.option('--video_url', '-u', help='the youtube video url')
-def main(tracks_info, track_name, track_number, artist, album_artist, video_url):
+@click.option(
+    '--cache/--no-cache',
+    default=True,
+    show_default=True,
+    help='Whether to reuse tracks created by previous runs on the same album (and tracks information), instead of segmenting again',
+)
+@click.option(
+    '--snap-to-silence',
+    type=float,
+    default=0,
+    show_default=True,
+    help='Move each track start to the quietest point within this many seconds of its timestamp (0 to disable). Requires numpy',
+)
+@click.option(
+    '--replaygain/--no-replaygain',
+    default=False,
+    show_default=True,
+    help='Whether to measure the loudness of the tracks while segmenting and write it as ReplayGain tags. Cached tracks are created again, to be measured',
+)
+@click.option(
+    '--staged/--no-staged',
+    default=False,
+    show_default=True,
+    help='Whether to write the tracks straight into a hidden directory of the music library and publish the album with a single rename, instead of copying the tracks into the library',
+)
+@click.option(
+    '--dry-run',
+    is_flag=True,
+    help='Print the ffmpeg commands that would segment the album, along with their estimated CPU time and output size, and exit without creating any track',
+)
+@click.option(
+    '--cost-report',
+    type=click.File('w'),
+    help="File to write the resources (wall time, CPU time, peak memory) used by ffmpeg and ffprobe to, per stage, as JSON ('-' for stdout)",
+)
+@click.option(
+    '--progress/--no-progress',
+    default=lambda: sys.stderr.isatty(),
+    show_default='if stderr is a terminal',
+    help='Whether to render the progress of segmenting the album as a progress bar (on stderr)',
+)
+def main(
+    tracks_info,
+    track_name,
+    track_number,
+    artist,
+    album_artist,
+    video_url,
+    cache,
+    snap_to_silence,
+    replaygain,
+    staged,
+    dry_run,
+    cost_report,
+    progress,
+):
     music_dir = music_lib_directory(verbose=True)
     print("Music library: {}".format(music_dir))
     logger.error("Music library: {}".format(str(music_dir)))
@@ -107,137 +176,282 @@ def main(tracks_info, track_name, track_number, artist, album_artist, video_url)
     ## Init
     music_master = MusicMaster(music_dir)
     # Segments Audio files into tracks and stores them in the system's temp dir (ie /tmp on Debian)
-    audio_segmenter = AudioSegmenter()
-
-    ## DOWNLOAD
-    while 1:
-        try:
-            album_file = music_master.url2mp3(
-                video_url, suppress_certificate_validation=False, force_download=False
-            )
-            break
-        except TokenParameterNotInVideoInfoError as e:
-            print(e, '\n')
-            if inout.update_and_retry_dialog()['update-youtube-dl']:
-                music_master.update_youtube()
-            else:
-                print("Exiting ..")
-                sys.exit(1)
-        except (InvalidUrlError, UnavailableVideoError) as e:
-            print(e, '\n')
-            video_url = inout.input_youtube_url_dialog()
-            print('\n')
-    print('\n')
-
-    print("Album file: {}".format(album_file))
-
-    ### RECEIVE TRACKS INFORMATION
-    if tracks_info:
-        tracks_info = TracksInformation.from_multiline(tracks_info.read().strip())
-    else:  # Interactive track type input
-        sleep(0.5)
-        tracks_info = TracksInformation.from_multiline(
-            inout.interactive_track_info_input_dialog().strip()
-        )
-        print()
-
-    # Ask user if the input represents song timestamps (withing the whole playtime) OR
-    # if the input represents song durations (that sum up to the total playtime)
-    answer = inout.track_information_type_dialog()
-
-    segmentation_info = SegmentationInformation.from_tracks_information(
-        tracks_info, hhmmss_type=answer.lower()
-    )
-
-    # SEGMENTATION
-    try:
-        audio_file_paths = audio_segmenter.segment(
-            album_file,
-            segmentation_info,
-            sleep_seconds=0,
-        )
-    except TrackTimestampsSequenceError as e:
+    # or, if staged, in a hidden directory of the music library
+    audio_segmenter = AudioSegmenter(cache=SegmentationCache() if cache else None)
+    try:  # fail early, before downloading, if ffmpeg is missing (cached after the first run)
+        logger.info("ffmpeg version: %s", audio_segmenter.capabilities.version)
+    except UnusableFFmpegError as e:
         print(e)
         sys.exit(1)
-        # TODO capture ctrl-D to signal possible change of type from timestamp to durations and vice-versa...
-        # in order to put the above statement outside of while loop
-
-    # TODO re-implement the below using the ffmpeg proxy
-    durations = [
-        time.strftime(
-            '%H:%M:%S',
-            time.gmtime(int(float(ffprobe_client.get_stream_info(f)['format']['duration']))),
-        )
-        for f in audio_file_paths
-    ]
+    staging = StagedAlbum(music_dir) if staged else None
+    with staging or contextlib.nullcontext():
+        if staging is not None:
+            audio_segmenter.target_directory = staging.directory
+
+        ## DOWNLOAD
+        while 1:
+            try:
+                album_file = music_master.url2mp3(
+                    video_url, suppress_certificate_validation=False, force_download=False
+                )
+                break
+            except TokenParameterNotInVideoInfoError as e:
+                print(e, '\n')
+                if inout.update_and_retry_dialog()['update-youtube-dl']:
+                    music_master.update_youtube()
+                else:
+                    print("Exiting ..")
+                    sys.exit(1)
+            except (InvalidUrlError, UnavailableVideoError) as e:
+                print(e, '\n')
+                video_url = inout.input_youtube_url_dialog()
+                print('\n')
+        print('\n')
+
+        print("Album file: {}".format(album_file))
+
+        ### RECEIVE TRACKS INFORMATION
+        # chapters embedded in the album file (if any) make the tracks information dialogs redundant
+        chapters = [] if tracks_info else ffprobe_client.get_chapters(album_file)
+        if chapters:
+            print("Segmenting along the {} chapters of the album file".format(len(chapters)))
+            segmentation_info = SegmentationInformation.from_chapters(chapters)
+        else:
+            if tracks_info:
+                tracks_info = TracksInformation.from_multiline(tracks_info.read().strip())
+            else:  # Interactive track type input
+                sleep(0.5)
+                tracks_info = TracksInformation.from_multiline(
+                    inout.interactive_track_info_input_dialog().strip()
+                )
+                print()
 
-    # durations = [StringParser.hhmmss_format(getattr(mutagen.File(t).info, 'length', 0)) for t in audio_file_paths]
-    max_row_length = max(len(_[0]) + len(_[1]) for _ in zip(audio_file_paths, durations))
-    print("\n\nThese are the tracks created.\n")
-    print(
-        '\n'.join(
-            sorted(
-                [
-                    ' {}{}  {}'.format(t, (max_row_length - len(t) - len(d)) * ' ', d)
-                    for t, d in zip(audio_file_paths, durations)
-                ]
+            # Ask user if the input represents song timestamps (withing the whole playtime) OR
+            # if the input represents song durations (that sum up to the total playtime)
+            answer = inout.track_information_type_dialog()
+
+            segmentation_info = SegmentationInformation.from_tracks_information(
+                tracks_info, hhmmss_type=answer.lower()
             )
-        ),
-        '\n',
-    )
-    # TODO
-
-    ### STORE TRACKS IN DIR in MUSIC LIBRARY ROOT
-    while 1:
-        print(type(music_dir), type(music_master.guessed_info))
-        print(music_dir)
-        print(music_master.guessed_info)
-        album_dir = inout.album_directory_path_dialog(music_dir, **music_master.guessed_info)
-        try:
-            os.makedirs(album_dir)
-        except FileExistsError:
-            if not inout.confirm_copy_tracks_dialog(album_dir):
-                continue
-        except FileNotFoundError:
-            print("The selected destination directory '{}' is not valid.".format(album_dir))
-            continue
-        except PermissionError:
-            print(
-                "You don't have permision to create a directory in path '{}'".format(album_dir)
+        if snap_to_silence:
+            from .audio_segmentation import silence
+
+            segmentation_info, adjustments = silence.snap_to_silence(
+                album_file, segmentation_info, tolerance=snap_to_silence
             )
-            continue
-        try:
-            for track in audio_file_paths:
-                destination_file_path = os.path.join(album_dir, os.path.basename(track))
-                if os.path.isfile(destination_file_path):
+            for adjustment in adjustments:
+                if adjustment.offset:
                     print(
-                        " File '{}' already exists. in '{}'. Skipping".format(
-                            os.path.basename(track), album_dir
+                        " Moved start of '{}' by {:+.2f} seconds".format(
+                            adjustment.track, adjustment.offset
                         )
                     )
-                else:
-                    shutil.copyfile(track, destination_file_path)
-            print("Album tracks reside in '{}'".format(album_dir))
-            break
-        except PermissionError:
-            print(
-                "Can't copy tracks to '{}' folder. You don't have write permissions in this directory".format(
-                    album_dir
+
+        if dry_run:
+            plan = audio_segmenter.dry_run(
+                album_file, segmentation_info, loudness=replaygain, progress=True
+            )
+            print(plan.report())
+            sys.exit(0 if plan.valid else 1)
+
+        # SEGMENTATION
+        loudness_meter = LoudnessMeter() if replaygain else None
+        progress_renderer = None
+        if progress:
+            progress_renderer = TqdmProgressRenderer(
+                float(ffprobe_client.get_stream_info(album_file)['format']['duration'])
+            )
+        try:
+            tracks = audio_segmenter.segment(
+                album_file,
+                segmentation_info,
+                sleep_seconds=0,
+                progress=progress_renderer,
+                loudness=loudness_meter,
+            )
+        except TrackTimestampsSequenceError as e:
+            print(e)
+            sys.exit(1)
+        finally:
+            if progress_renderer is not None:
+                progress_renderer.close()
+            # TODO capture ctrl-D to signal possible change of type from timestamp to durations and vice-versa...
+            # in order to put the above statement outside of while loop
+
+        audio_file_paths = [track.path for track in tracks]
+        # durations are known from segmenting, without probing the created tracks
+        durations = [
+            time.strftime('%H:%M:%S', time.gmtime(int(track.duration))) for track in tracks
+        ]
+
+        # durations = [StringParser.hhmmss_format(getattr(mutagen.File(t).info, 'length', 0)) for t in audio_file_paths]
+        max_row_length = max(len(_[0]) + len(_[1]) for _ in zip(audio_file_paths, durations))
+        print("\n\nThese are the tracks created.\n")
+        print(
+            '\n'.join(
+                sorted(
+                    [
+                        ' {}{}  {}'.format(t, (max_row_length - len(t) - len(d)) * ' ', d)
+                        for t, d in zip(audio_file_paths, durations)
+                    ]
                 )
+            ),
+            '\n',
+        )
+        # TODO
+
+        ### STORE TRACKS IN DIR in MUSIC LIBRARY ROOT
+        md = MetadataDealer()
+        tags = None
+        while 1:
+            print(type(music_dir), type(music_master.guessed_info))
+            print(music_dir)
+            print(music_master.guessed_info)
+            album_dir = inout.album_directory_path_dialog(
+                music_dir, **music_master.guessed_info
             )
+            try:
+                os.makedirs(album_dir)
+            except FileExistsError:
+                if not inout.confirm_copy_tracks_dialog(album_dir):
+                    continue
+            except FileNotFoundError:
+                print(
+                    "The selected destination directory '{}' is not valid.".format(album_dir)
+                )
+                continue
+            except PermissionError:
+                print(
+                    "You don't have permision to create a directory in path '{}'".format(
+                        album_dir
+                    )
+                )
+                continue
+
+            ### WRITE METADATA
+            # the created tracks are tagged right before storing them, so that the checksums
+            # recorded while storing them are those of the final files
+            if tags is None:
+                answers = inout.interactive_metadata_dialogs(**music_master.guessed_info)
+                tags = dict(
+                    track_number=track_number,
+                    track_name=track_name,
+                    artist=answers['artist'],
+                    album_artist=answers['album-artist'],
+                    album=answers['album'],
+                    year=answers['year'],
+                )
+                for track in audio_file_paths:
+                    _detach(track)
+                md.set_tracks_metadata(audio_file_paths, **tags)
+                if loudness_meter is not None:
+                    album_loudness = loudness_meter.album()
+                    for track, track_loudness in loudness_meter.tracks.items():
+                        md.write_replaygain(track, track_loudness, album_loudness)
+            try:
+                if staging is not None:
+                    published = _publish(staging, audio_file_paths, album_dir)
+                    print("Album tracks reside in '{}'".format(album_dir))
+                    break
+                checksums = {}
+                for track in audio_file_paths:
+                    destination_file_path = os.path.join(album_dir, os.path.basename(track))
+                    if os.path.isfile(destination_file_path):
+                        print(
+                            " File '{}' already exists. in '{}'. Skipping".format(
+                                os.path.basename(track), album_dir
+                            )
+                        )
+                    else:
+                        checksums[os.path.basename(track)] = copy_and_hash(
+                            track, destination_file_path
+                        )
+                write_checksums(album_dir, checksums)
+                published = list(checksums)
+                print("Album tracks reside in '{}'".format(album_dir))
+                break
+            except PermissionError:
+                print(
+                    "Can't copy tracks to '{}' folder. You don't have write permissions in this directory".format(
+                        album_dir
+                    )
+                )
+        # the rest of the album directory (ie tracks stored by an earlier run) is tagged too
+        _tag_album(md, album_dir, published, tags)
+    if cost_report:
+        json.dump(
+            {'ffmpeg': FFMPEG.usage.as_dict(), 'ffprobe': FFProbe.usage.as_dict()},
+            cost_report,
+            indent=4,
+        )
+
+
+def _publish(staging, track_files, album_dir):
+    """Publish the staged tracks in the album directory, recording checksums of those published.
+
+    :return: the names of the published tracks
+    :rtype: list
+    """
+    skipped = staging.publish(album_dir, record_checksums=True)
+    for name in skipped:
+        print(" File '{}' already exists. in '{}'. Skipping".format(name, album_dir))
+    return [os.path.basename(x) for x in track_files if os.path.basename(x) not in skipped]
+
+
+def _tag_album(metadata_dealer, album_dir, published, tags):
+    """Tag the album's tracks, other than the ones just published, the same way.
+
+    The recorded checksums of the tracks tagged (if any) are updated accordingly.
+    """
+    tracks = [
+        x
+        for x in glob.glob('{}/*.mp3'.format(album_dir))
+        if os.path.basename(x) not in published
+    ]
+    metadata_dealer.set_tracks_metadata(tracks, **tags)
+    recorded = read_checksums(album_dir)
+    retagged = {os.path.basename(x): x for x in tracks if os.path.basename(x) in recorded}
+    if retagged:
+        write_checksums(album_dir, {name: hash_file(x) for name, x in retagged.items()})
+
+
+def _detach(track_file):
+    """Turn a hardlinked track file (ie materialised from the cache) into a file of its own.
+
+    This way, writing tags to the track file leaves the other links (the cached track) intact.
+    """
+    if os.stat(track_file).st_nlink > 1:
+        copy_file = '{}.copy'.format(track_file)
+        shutil.copyfile(track_file, copy_file)
+        os.replace(copy_file, track_file)
+
+
+class TqdmProgressRenderer:
+    """Render the progress of segmenting an album as a single tqdm progress bar.
+
+    The bar counts the seconds of audio processed, over all tracks. Instances are called with
+    the ProgressEvents of the segmentation, possibly from several threads at a time.
+    """
+
+    def __init__(self, album_duration):
+        self._bar = tqdm(total=round(album_duration, 1), unit='s', desc='Segmenting')
+        self._processed = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, event):
+        with self._lock:
+            previous = self._processed.get(event.track_index, 0.0)
+            self._processed[event.track_index] = event.processed
+            self._bar.update(round(event.processed - previous, 1))
+            if event.speed:
+                self._bar.set_postfix(
+                    track=event.track_index + 1,
+                    speed='{:.1f}x'.format(event.speed),
+                    eta='{:.0f}s'.format(event.eta) if event.eta is not None else '?',
+                )
 
-    ### WRITE METADATA
-    md = MetadataDealer()
-    answers = inout.interactive_metadata_dialogs(**music_master.guessed_info)
-    md.set_album_metadata(
-        album_dir,
-        track_number=track_number,
-        track_name=track_name,
-        artist=answers['artist'],
-        album_artist=answers['album-artist'],
-        album=answers['album'],
-        year=answers['year'],
-    )
+    def close(self):
+        self._bar.close()
 
 
 class TabCompleter:
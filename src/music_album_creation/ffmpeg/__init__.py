@@ -1,4 +1,5 @@
 from .ffmpeg import FFMPEG
 from .ffprobe import FFProbe
+from .scheduler import ProcessScheduler
 
-__all__ = ['FFMPEG', 'FFProbe']
+__all__ = ['FFMPEG', 'FFProbe', 'ProcessScheduler']
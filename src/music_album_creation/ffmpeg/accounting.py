@@ -0,0 +1,81 @@
+"""Aggregate the resources used by ffmpeg/ffprobe calls, per stage of processing an album."""
+
+import threading
+from typing import Any, Dict, Optional
+
+import attr
+
+from .run_cli import ResourceUsage
+
+__all__ = ['StageCost', 'UsageLedger']
+
+
+@attr.s
+class StageCost(object):
+    """Total resources used by the calls of a stage; CPU times in seconds, peak RSS in bytes.
+
+    CPU times only count the calls that measured them (see run_cli.ResourceUsage), while the
+    peak RSS is the highest of any call.
+    """
+
+    calls: int = attr.ib(default=0)
+    wall_time: float = attr.ib(default=0.0)
+    user_time: float = attr.ib(default=0.0)
+    system_time: float = attr.ib(default=0.0)
+    max_rss: int = attr.ib(default=0)
+
+    def add(self, usage: ResourceUsage):
+        self.calls += 1
+        self.wall_time += usage.wall_time
+        self.user_time += usage.user_time or 0.0
+        self.system_time += usage.system_time or 0.0
+        self.max_rss = max(self.max_rss, usage.max_rss or 0)
+
+    @property
+    def cpu_time(self) -> float:
+        return self.user_time + self.system_time
+
+
+class UsageLedger(object):
+    """Record the resources used by each call, under the name of its stage (ie 'segment').
+
+    Calls may be recorded from several threads at a time.
+    """
+
+    def __init__(self):
+        self._stages: Dict[str, StageCost] = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, usage: Optional[ResourceUsage]):
+        """Add the resources a call used to its stage; calls not measured are ignored."""
+        if usage is None:
+            return
+        with self._lock:
+            self._stages.setdefault(stage, StageCost()).add(usage)
+
+    def breakdown(self) -> Dict[str, StageCost]:
+        """Get (a copy of) the cost of each stage, in the order stages were first recorded."""
+        with self._lock:
+            return {name: attr.evolve(cost) for name, cost in self._stages.items()}
+
+    def as_dict(self) -> Dict[str, Dict[str, Any]]:
+        """Get the cost of each stage as plain data; ie to export it as JSON."""
+        return {name: attr.asdict(cost) for name, cost in self.breakdown().items()}
+
+    def report(self) -> str:
+        """Describe the cost of each stage, one line per stage."""
+        return '\n'.join(
+            "{}: {} calls, {:.2f}s wall, {:.2f}s user, {:.2f}s system, {:.1f} MB RSS".format(
+                name,
+                cost.calls,
+                cost.wall_time,
+                cost.user_time,
+                cost.system_time,
+                cost.max_rss / 1e6,
+            )
+            for name, cost in self.breakdown().items()
+        )
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
@@ -0,0 +1,150 @@
+"""What an ffmpeg binary can do (its version, encoders and muxers), probed once and cached."""
+
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from typing import Dict, FrozenSet, Optional
+
+import attr
+
+from music_album_creation.caching import cache_directory, file_fingerprint
+
+from .scheduler import IO
+
+__all__ = ['Capabilities', 'UnusableFFmpegError', 'get_capabilities']
+
+
+logger = logging.getLogger(__name__)
+
+
+# media type of the encoders, as the first flag of 'ffmpeg -encoders' tells it
+AUDIO = 'A'
+
+# capabilities parsed in this process, per binary fingerprint
+_loaded: Dict[str, 'Capabilities'] = {}
+_lock = threading.Lock()
+
+
+@attr.s(frozen=True)
+class Capabilities(object):
+    """The version of an ffmpeg binary, its encoders (and their media type) and its muxers."""
+
+    version: str = attr.ib()
+    encoders: Dict[str, str] = attr.ib(factory=dict)
+    muxers: FrozenSet[str] = attr.ib(converter=frozenset, factory=frozenset)
+
+    def has_encoder(self, name: str, media_type: str = AUDIO) -> bool:
+        return self.encoders.get(name) == media_type
+
+    def has_muxer(self, name: str) -> bool:
+        return name in self.muxers
+
+    def first_encoder(self, *names: str) -> Optional[str]:
+        """Get the first of the (audio) encoders available, in order of preference."""
+        return next((x for x in names if self.has_encoder(x)), None)
+
+    @classmethod
+    def parse(cls, version_output: str, encoders_output: str, muxers_output: str):
+        """Read the output of 'ffmpeg -version', 'ffmpeg -encoders' and 'ffmpeg -muxers'."""
+        words = version_output.split()
+        version = words[2] if words[:2] == ['ffmpeg', 'version'] else 'unknown'
+        encoders = {}
+        for flags, name in _table(encoders_output):
+            encoders[name] = flags[0]
+        muxers = {name for _, names in _table(muxers_output) for name in names.split(',')}
+        return cls(version, encoders, muxers)
+
+    def to_json(self) -> str:
+        return json.dumps(
+            {'version': self.version, 'encoders': self.encoders, 'muxers': sorted(self.muxers)}
+        )
+
+    @classmethod
+    def from_json(cls, string: str) -> 'Capabilities':
+        data = json.loads(string)
+        return cls(data['version'], data['encoders'], data['muxers'])
+
+
+def get_capabilities(ffmpeg) -> Capabilities:
+    """Get the capabilities of the ffmpeg binary the proxy runs, probing it only once.
+
+    Capabilities are cached on disk, keyed by the binary's path, size and modification time
+    (so that a replaced or upgraded ffmpeg is probed again), and in memory, so that after
+    the first call getting them costs a stat of the binary.
+
+    :param ffmpeg: the ffmpeg proxy (see music_album_creation.ffmpeg.FFMPEG)
+    :raises UnusableFFmpegError: if the binary is missing or fails to run
+    """
+    binary_path = shutil.which(ffmpeg.ffmpeg_binary)
+    if binary_path is None:
+        raise UnusableFFmpegError(
+            "ffmpeg binary '{}' not found; set MUSIC_FFMPEG to the path of ffmpeg".format(
+                ffmpeg.ffmpeg_binary
+            )
+        )
+    key = file_fingerprint(binary_path)
+    with _lock:
+        if key in _loaded:
+            return _loaded[key]
+    capabilities_file = os.path.join(cache_directory('ffmpeg'), '{}.json'.format(key))
+    try:
+        with open(capabilities_file, 'r') as f:
+            capabilities = Capabilities.from_json(f.read())
+    except (OSError, ValueError, KeyError):
+        capabilities = _probe(ffmpeg)
+        _save(capabilities, capabilities_file)
+    with _lock:
+        _loaded[key] = capabilities
+    return capabilities
+
+
+def _probe(ffmpeg) -> Capabilities:
+    outputs = []
+    for option in ('-version', '-encoders', '-muxers'):
+        try:
+            result = ffmpeg('-hide_banner', option, stage='capabilities', kind=IO)
+        except OSError as error:  # ie not executable
+            raise UnusableFFmpegError(
+                "Cannot run ffmpeg binary '{}': {}".format(ffmpeg.ffmpeg_binary, error)
+            ) from error
+        if result.exit_code != 0:
+            raise UnusableFFmpegError(
+                "ffmpeg binary '{}' failed to list its capabilities:\n{}".format(
+                    ffmpeg.ffmpeg_binary, result.stderr
+                )
+            )
+        outputs.append(result.stdout)
+    capabilities = Capabilities.parse(*outputs)
+    logger.info("Probed capabilities of ffmpeg %s", capabilities.version)
+    return capabilities
+
+
+def _save(capabilities: Capabilities, capabilities_file: str):
+    """Write the capabilities to a file, atomically replacing any previous one."""
+    file_descriptor, temp_file = tempfile.mkstemp(dir=os.path.dirname(capabilities_file))
+    try:
+        with open(file_descriptor, 'w') as f:
+            f.write(capabilities.to_json())
+        os.replace(temp_file, capabilities_file)
+    except BaseException:
+        os.remove(temp_file)
+        raise
+
+
+def _table(output: str):
+    """Get the flags and name of each entry listed after the legend of an ffmpeg listing."""
+    lines = iter(output.splitlines())
+    for line in lines:  # skip the legend, which ends with a line of dashes
+        if line.strip() and not line.strip().strip('-'):
+            break
+    for line in lines:
+        fields = line.split(None, 2)
+        if len(fields) >= 2:
+            yield fields[0], fields[1]
+
+
+class UnusableFFmpegError(Exception):
+    pass
@@ -1,4 +1,4 @@
-"""FFMpeg as a Proxy to a Singleton instance using subprocess and ffmpeg CLI.
+"""FFMpeg as a Proxy to a Subject running the ffmpeg CLI in scheduled subprocesses.
 
 Audio options:
 -aframes number     set the number of audio frames to output
@@ -10,11 +10,14 @@ Audio options:
 -vol volume         change audio volume (256=normal)
 -af filter_graph    set audio filters
 """
+from typing import Optional
+
+from ..scheduler import ProcessScheduler
 from .ffmpeg_proxy import FFMPEGProxy
 from .ffmpeg_subject import FFMPEGSubject
 
 
-# Singleton ffmpeg binary
+# ffmpeg binary, sharing the (default) scheduler with every other ffmpeg and ffprobe
 class FFMPEG(FFMPEGProxy):
-    def __init__(self, ffmpeg_binary: str):
-        super().__init__(FFMPEGSubject(ffmpeg_binary))
+    def __init__(self, ffmpeg_binary: str, scheduler: Optional[ProcessScheduler] = None):
+        super().__init__(FFMPEGSubject(ffmpeg_binary, scheduler))
@@ -1,19 +1,26 @@
 import json
 import logging
-from typing import Any, Protocol
+from typing import Any, Iterable, Optional, Protocol
 
 from software_patterns import Proxy
 
+from ..accounting import UsageLedger
+from ..run_cli import ResourceUsage
+
 __all__ = ['FFProbeProxy']
 
 
 logger = logging.getLogger(__name__)
 
+# stage of the calls not given one
+DEFAULT_STAGE = 'ffmpeg'
+
 
 class CLIResult(Protocol):
     exit_code: int
     stdout: str
     stderr: str
+    usage: Optional[ResourceUsage]
 
 
 class FFMpegSubjectType(Protocol):
@@ -23,14 +30,86 @@ class FFMpegSubjectType(Protocol):
     def __call__(self, *ffmpeg_cli_args, **subprocess_settings) -> CLIResult:
         ...
 
+    async def call_async(self, *ffmpeg_cli_args, **subprocess_settings) -> CLIResult:
+        ...
+
+    def stream(self, *ffmpeg_cli_args, **streaming_settings) -> CLIResult:
+        ...
+
+    def iter_stdout(self, *ffmpeg_cli_args, **streaming_settings) -> 'StreamingCommand':
+        ...
+
+
+class StreamingCommand(Iterable[bytes], Protocol):
+    result: Optional[CLIResult]
+
+    def lines(self) -> Iterable[str]:
+        ...
+
 
 class FFMPEGProxy(Proxy[FFMpegSubjectType]):
-    """Proxy class for the ffmpeg CLI."""
+    """Proxy class for the ffmpeg CLI.
+
+    The resources used by each call are recorded in the 'usage' ledger (shared by all ffmpeg
+    proxies), under the stage given as the 'stage' keyword argument ('ffmpeg' by default).
+    """
+
+    usage = UsageLedger()
 
     def __call__(self, *ffmpeg_cli_args: str, **subprocess_settings: Any) -> CLIResult:
+        stage = subprocess_settings.pop('stage', DEFAULT_STAGE)
         logger.error(
             "Running ffmpeg: %s", json.dumps(list(ffmpeg_cli_args), indent=4, sort_keys=True)
         )
         res = self._proxy_subject(*ffmpeg_cli_args, **subprocess_settings)
         # logger.info("FFMPEG:\n%s", res.stderr)
+        self.usage.record(stage, res.usage)
         return res
+
+    async def call_async(self, *ffmpeg_cli_args: str, **subprocess_settings: Any) -> CLIResult:
+        """Run ffmpeg without blocking the event loop; cancelling terminates the process."""
+        stage = subprocess_settings.pop('stage', DEFAULT_STAGE)
+        logger.info(
+            "Running ffmpeg: %s", json.dumps(list(ffmpeg_cli_args), indent=4, sort_keys=True)
+        )
+        res = await self._proxy_subject.call_async(*ffmpeg_cli_args, **subprocess_settings)
+        self.usage.record(stage, res.usage)
+        return res
+
+    def stream(self, *ffmpeg_cli_args: str, **streaming_settings: Any) -> CLIResult:
+        """Run ffmpeg, handing what it writes on stdout to a callback, as it comes.
+
+        Pass 'on_stdout_line' to receive stdout line by line, or 'on_stdout_chunk' (and
+        optionally 'chunk_size') to receive it in binary chunks; ie raw PCM audio.
+        """
+        stage = streaming_settings.pop('stage', DEFAULT_STAGE)
+        logger.info(
+            "Running ffmpeg: %s", json.dumps(list(ffmpeg_cli_args), indent=4, sort_keys=True)
+        )
+        res = self._proxy_subject.stream(*ffmpeg_cli_args, **streaming_settings)
+        self.usage.record(stage, res.usage)
+        return res
+
+    def iter_stdout(
+        self, *ffmpeg_cli_args: str, **streaming_settings: Any
+    ) -> StreamingCommand:
+        """Run ffmpeg (once iterated), iterating over what it writes on stdout, in chunks.
+
+        Iterate over the returned command to get stdout in binary chunks (pass 'chunk_size'
+        to size them), or over its 'lines()' for text; its 'result' is set once stdout ends.
+
+        Pass 'input' (bytes, a binary file object or an iterable of byte chunks) to feed
+        ffmpeg's stdin, so that audio flows between stages without temporary files; ie
+        ffmpeg.iter_stdout('-i', 'pipe:0', '-f', 'mp3', 'pipe:1', input=pcm_chunks).
+        The input may be another iter_stdout command; the chain then takes a single slot of
+        the scheduler, that of its last command.
+        """
+        stage = streaming_settings.pop('stage', DEFAULT_STAGE)
+        logger.info(
+            "Running ffmpeg: %s", json.dumps(list(ffmpeg_cli_args), indent=4, sort_keys=True)
+        )
+        return self._proxy_subject.iter_stdout(
+            *ffmpeg_cli_args,
+            on_finish=lambda res: self.usage.record(stage, res.usage),
+            **streaming_settings,
+        )
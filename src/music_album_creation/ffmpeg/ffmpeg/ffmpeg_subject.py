@@ -1,17 +1,46 @@
 """FFMpeg Subject that runs ffmpeg in python subprocess."""
-from software_patterns import Singleton
+from typing import Optional
 
-from ..run_cli import execute_command_in_subprocess
+from ..run_cli import (
+    StreamingCommand,
+    execute_command_in_subprocess,
+    execute_command_in_subprocess_async,
+    execute_command_streaming_stdout,
+)
+from ..scheduler import CPU, ProcessScheduler
+from ..scheduler import scheduler as default_scheduler
 
 __all__ = ['FFMpegSubject']
 
 
 # Our implementation of the Subject class (see the Proxy pattern)
-class FFMPEGSubject(metaclass=Singleton):
-    """The standard FFMPEGSubject class proxies the ffmpeg CLI."""
+class FFMPEGSubject:
+    """The standard FFMPEGSubject class proxies the ffmpeg CLI.
 
-    def __init__(self, ffmpeg_binary: str):
+    Each ffmpeg process waits for a slot of the scheduler before starting. Calls are
+    CPU-bound work by default; pass 'kind' (ie scheduler.IO, when stream copying) and
+    'priority' to schedule them otherwise.
+    """
+
+    def __init__(self, ffmpeg_binary: str, scheduler: Optional[ProcessScheduler] = None):
         self.ffmpeg_binary = ffmpeg_binary
+        self.scheduler = scheduler or default_scheduler
+
+    def __call__(self, *args, kind=CPU, priority=0, **kwargs):
+        with self.scheduler.slot(kind, priority):
+            return execute_command_in_subprocess(self.ffmpeg_binary, *args, **kwargs)
+
+    async def call_async(self, *args, kind=CPU, priority=0, **kwargs):
+        async with self.scheduler.slot_async(kind, priority):
+            return await execute_command_in_subprocess_async(
+                self.ffmpeg_binary, *args, **kwargs
+            )
+
+    def stream(self, *args, kind=CPU, priority=0, **kwargs):
+        with self.scheduler.slot(kind, priority):
+            return execute_command_streaming_stdout(self.ffmpeg_binary, *args, **kwargs)
 
-    def __call__(self, *args, **kwargs):
-        return execute_command_in_subprocess(self.ffmpeg_binary, *args, **kwargs)
+    def iter_stdout(self, *args, kind=CPU, priority=0, **kwargs):
+        return StreamingCommand(
+            self.ffmpeg_binary, *args, slot=self.scheduler.slot(kind, priority), **kwargs
+        )
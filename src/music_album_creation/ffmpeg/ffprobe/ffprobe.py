@@ -1,10 +1,13 @@
+from typing import Optional
+
+from ..scheduler import ProcessScheduler
 from .ffprobe_proxy import FFProbeProxy
 from .ffprobe_subject import FFProbeSubject
 
 __all__ = ['FFProbeProxy']
 
 
-# Proxy that proxies a Singleton ffprobe instance
+# Proxy that proxies an ffprobe instance, sharing the (default) scheduler with every other
 class FFProbe(FFProbeProxy):
-    def __init__(self, ffprobe_binary: str):
-        super().__init__(FFProbeSubject(ffprobe_binary))
+    def __init__(self, ffprobe_binary: str, scheduler: Optional[ProcessScheduler] = None):
+        super().__init__(FFProbeSubject(ffprobe_binary, scheduler))
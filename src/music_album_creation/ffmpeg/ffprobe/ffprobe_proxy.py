@@ -1,19 +1,26 @@
 import json
 import logging
-from typing import Any, Protocol
+from typing import Any, Optional, Protocol
 
 from software_patterns import Proxy
 
+from ..accounting import UsageLedger
+from ..run_cli import ResourceUsage
+
 __all__ = ['FFProbeProxy']
 
 
 logger = logging.getLogger(__name__)
 
+# stage of the calls not given one
+DEFAULT_STAGE = 'ffprobe'
+
 
 class CLIResult(Protocol):
     exit_code: int
     stdout: str
     stderr: str
+    usage: Optional[ResourceUsage]
 
 
 class FFProbeSubjectType(Protocol):
@@ -23,12 +30,36 @@ class FFProbeSubjectType(Protocol):
     def __call__(self, *ffprobe_cli_args, **subprocess_settings) -> CLIResult:
         ...
 
+    async def call_async(self, *ffprobe_cli_args, **subprocess_settings) -> CLIResult:
+        ...
+
 
 class FFProbeProxy(Proxy[FFProbeSubjectType]):
-    """Proxy class for the ffprobe CLI."""
+    """Proxy class for the ffprobe CLI.
+
+    The resources used by each call are recorded in the 'usage' ledger (shared by all ffprobe
+    proxies), under the stage given as the 'stage' keyword argument ('ffprobe' by default).
+    """
+
+    usage = UsageLedger()
 
     def __call__(self, *ffprobe_cli_args: str, **subprocess_settings: Any) -> CLIResult:
+        stage = subprocess_settings.pop('stage', DEFAULT_STAGE)
+        logger.info(
+            "Running ffmpeg: %s", json.dumps(list(ffprobe_cli_args), indent=4, sort_keys=True)
+        )
+        res = self._proxy_subject(*ffprobe_cli_args, **subprocess_settings)
+        self.usage.record(stage, res.usage)
+        return res
+
+    async def call_async(
+        self, *ffprobe_cli_args: str, **subprocess_settings: Any
+    ) -> CLIResult:
+        """Run ffprobe without blocking the event loop; cancelling terminates the process."""
+        stage = subprocess_settings.pop('stage', DEFAULT_STAGE)
         logger.info(
             "Running ffmpeg: %s", json.dumps(list(ffprobe_cli_args), indent=4, sort_keys=True)
         )
-        return self._proxy_subject(*ffprobe_cli_args, **subprocess_settings)
+        res = await self._proxy_subject.call_async(*ffprobe_cli_args, **subprocess_settings)
+        self.usage.record(stage, res.usage)
+        return res
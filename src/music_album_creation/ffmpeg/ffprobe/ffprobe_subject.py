@@ -1,17 +1,34 @@
 """FFProbe Subject that runs ffprobe in python subprocess."""
-from software_patterns import Singleton
+from typing import Optional
 
-from ..run_cli import execute_command_in_subprocess
+from ..run_cli import (
+    execute_command_in_subprocess,
+    execute_command_in_subprocess_async,
+)
+from ..scheduler import IO, ProcessScheduler
+from ..scheduler import scheduler as default_scheduler
 
 __all__ = ['FFProbeSubject']
 
 
 # Our implementation of the Subject class (see the Proxy pattern)
-class FFProbeSubject(metaclass=Singleton):
-    """The standard FFProbe Subject class proxies the ffprobe CLI."""
+class FFProbeSubject:
+    """The standard FFProbe Subject class proxies the ffprobe CLI.
 
-    def __init__(self, ffprobe_binary: str):
+    Each ffprobe process waits for a slot of the scheduler before starting, as I/O-bound
+    work; pass 'priority' to schedule calls ahead of (or behind) others.
+    """
+
+    def __init__(self, ffprobe_binary: str, scheduler: Optional[ProcessScheduler] = None):
         self.ffprobe_binary = ffprobe_binary
+        self.scheduler = scheduler or default_scheduler
+
+    def __call__(self, *args, priority=0, **kwargs):
+        with self.scheduler.slot(IO, priority):
+            return execute_command_in_subprocess(self.ffprobe_binary, *args, **kwargs)
 
-    def __call__(self, *args, **kwargs):
-        return execute_command_in_subprocess(self.ffprobe_binary, *args, **kwargs)
+    async def call_async(self, *args, priority=0, **kwargs):
+        async with self.scheduler.slot_async(IO, priority):
+            return await execute_command_in_subprocess_async(
+                self.ffprobe_binary, *args, **kwargs
+            )
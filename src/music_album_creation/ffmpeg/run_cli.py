@@ -1,14 +1,132 @@
+import asyncio
+import contextlib
+import os
+import re
 import subprocess
 import sys
+import threading
+import time
+from collections import deque
+from typing import (
+    BinaryIO,
+    Callable,
+    ContextManager,
+    Iterable,
+    Iterator,
+    NamedTuple,
+    Optional,
+    Union,
+)
+
+# number of (trailing) stderr lines kept, when streaming the stdout of a subprocess
+STDERR_TAIL_LINES = 200
+# ... and the most stderr bytes kept, whatever the length of the lines
+STDERR_TAIL_BYTES = 64 * 1024
+
+# bytes that continue (never start) a UTF-8 encoded character
+_UTF8_CONTINUATION = bytes(range(0x80, 0xC0))
+
+# bytes read at a time, when streaming the stdout of a subprocess in chunks
+STDOUT_CHUNK_SIZE = 64 * 1024
+
+
+# unit of the peak RSS reported by getrusage/wait4, in bytes
+_MAX_RSS_UNIT = 1 if sys.platform == 'darwin' else 1024
+
+
+class ResourceUsage(NamedTuple):
+    """Resources a subprocess used: wall and CPU time (in seconds) and peak RSS (in bytes).
+
+    CPU times and peak RSS are None where unknown; ie on Windows, or for asyncio subprocesses
+    (reaped by the event loop's child watcher).
+    """
+
+    wall_time: float
+    user_time: Optional[float] = None
+    system_time: Optional[float] = None
+    max_rss: Optional[int] = None
+
+    @classmethod
+    def from_rusage(cls, wall_time: float, rusage=None) -> 'ResourceUsage':
+        if rusage is None:
+            return cls(wall_time)
+        return cls(
+            wall_time, rusage.ru_utime, rusage.ru_stime, rusage.ru_maxrss * _MAX_RSS_UNIT
+        )
+
+
+def _reap(process: subprocess.Popen):
+    """Wait for the process to exit and reap it; return its resource usage, if measurable.
+
+    Where available (POSIX), the process is reaped with os.wait4, which reports the resources
+    it used; its return code is then set, so that Popen does not wait for it again.
+    """
+    if not hasattr(os, 'wait4'):  # ie on Windows
+        process.wait()
+        return None
+    _, status, rusage = os.wait4(process.pid, 0)
+    if os.WIFSIGNALED(status):
+        process.returncode = -os.WTERMSIG(status)
+    else:
+        process.returncode = os.WEXITSTATUS(status)
+    return rusage
+
+
+def _communicate(process: subprocess.Popen, input=None, timeout=None):
+    """Write the input to the process and read its output, like Popen.communicate.
+
+    Unlike Popen.communicate, the process is not waited for, so that it is reaped by '_reap'.
+
+    :raises subprocess.TimeoutExpired: if the output is not all read within 'timeout' seconds
+    """
+    outputs = {}
+
+    def read(name, pipe):
+        with pipe:
+            outputs[name] = pipe.read()
+
+    def write(pipe):
+        try:
+            with pipe:
+                if input:
+                    pipe.write(input)
+        except BrokenPipeError:  # the process exited without reading all of its input
+            pass
+
+    threads = [
+        threading.Thread(target=read, args=(name, pipe), daemon=True)
+        for name, pipe in (('stdout', process.stdout), ('stderr', process.stderr))
+        if pipe is not None
+    ]
+    if process.stdin is not None:
+        threads.append(threading.Thread(target=write, args=(process.stdin,), daemon=True))
+    for thread in threads:
+        thread.start()
+    deadline = None if timeout is None else time.monotonic() + timeout
+    for thread in threads:
+        thread.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+        if thread.is_alive():
+            raise subprocess.TimeoutExpired(process.args, timeout)
+    return outputs.get('stdout'), outputs.get('stderr')
 
 
 class CLIResult:
     """Wrap the subprocess.CompletedProcess class to make it easier to use."""
 
-    def __init__(self, completed_process: subprocess.CompletedProcess):
+    def __init__(
+        self,
+        completed_process: subprocess.CompletedProcess,
+        usage: Optional[ResourceUsage] = None,
+    ):
         self._exit_code = int(completed_process.returncode)
         self._stdout = str(completed_process.stdout, encoding='utf-8')
         self._stderr = str(completed_process.stderr, encoding='utf-8')
+        self._usage = usage
+
+    @property
+    def usage(self) -> Optional[ResourceUsage]:
+        """Resources used by the subprocess; None if not measured"""
+        return self._usage
 
     @property
     def exit_code(self) -> int:
@@ -45,6 +163,8 @@ def execute_command_in_subprocess(
     with a non-zero exit code.
     It is left to the client to check the 'exit_code' property and decide how to handle it.
 
+    The result records the resources the subprocess used (see ResourceUsage).
+
     Args:
         executable (str): path to executable program/binary (ie a CLI)
         *cli_args (str): arguments to pass to the executable
@@ -56,10 +176,278 @@ def execute_command_in_subprocess(
 
     def subprocess_run() -> CLIResult:
         kwargs_dict = SUBPROCESS_RUN_MAP[sys.version_info < (3, 7)]
-        completed_process = subprocess.run(  # pylint: disable=W1510
+        return _run_accounted(
             [executable] + list(cli_args),
-            **dict(dict(kwargs_dict, **subprocess_settings), check=False)
+            **dict(dict(kwargs_dict, **subprocess_settings), check=False),
         )
-        return CLIResult(completed_process)
 
     return subprocess_run()
+
+
+def _run_accounted(
+    args, input=None, timeout=None, capture_output=False, check=False, **popen_settings
+) -> CLIResult:
+    """Run a command like subprocess.run (without 'check'), measuring the resources it uses."""
+    if capture_output:
+        popen_settings.update(stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if input is not None:
+        popen_settings['stdin'] = subprocess.PIPE
+    start = time.perf_counter()
+    with subprocess.Popen(args, **popen_settings) as process:
+        try:
+            stdout, stderr = _communicate(process, input, timeout=timeout)
+            rusage = _reap(process)
+        except BaseException:
+            process.kill()
+            raise
+    return CLIResult(
+        subprocess.CompletedProcess(args, process.returncode, stdout, stderr),
+        ResourceUsage.from_rusage(time.perf_counter() - start, rusage),
+    )
+
+
+class TailBuffer:
+    """Ring buffer keeping the last bytes (and lines) written to it; ie of a process's stderr.
+
+    At most 'max_bytes' are held, regardless of how much is written or of how long the lines
+    are (ie ffmpeg rewrites its stats line with carriage returns, never ending it).
+    """
+
+    def __init__(self, max_bytes: int = STDERR_TAIL_BYTES, max_lines: int = STDERR_TAIL_LINES):
+        self._chunks: deque = deque()
+        self._size = 0
+        self._truncated = False
+        self.max_bytes = max_bytes
+        self.max_lines = max_lines
+
+    def write(self, data: bytes):
+        self._chunks.append(bytes(data))
+        self._size += len(data)
+        while self.max_bytes < self._size:
+            excess = self._size - self.max_bytes
+            if len(self._chunks[0]) <= excess:
+                self._size -= len(self._chunks.popleft())
+            else:
+                self._chunks[0] = self._chunks[0][excess:]
+                self._size -= excess
+            self._truncated = True
+
+    def consume(self, stream, chunk_size: int = STDOUT_CHUNK_SIZE):
+        """Write everything read from the (binary) stream, until it ends."""
+        read = getattr(stream, 'read1', stream.read)
+        for chunk in iter(lambda: read(chunk_size), b''):
+            self.write(chunk)
+
+    def getvalue(self) -> bytes:
+        """Get the kept bytes: whole lines only (if any was dropped), at most 'max_lines'."""
+        data = b''.join(self._chunks)
+        if self._truncated:  # the first line is partial; so may be its first character
+            data = re.split(rb'[\r\n]', data, maxsplit=1)[-1].lstrip(_UTF8_CONTINUATION)
+        lines = data.splitlines(keepends=True)
+        return b''.join(lines[-self.max_lines :])
+
+
+class StreamingCommand:
+    """A command executed in a subprocess, whose stdout is consumed as it is written.
+
+    Iterate over the instance to get stdout in binary chunks of 'chunk_size' bytes (only the
+    last chunk may be shorter), or over 'lines()' to get it as text lines. Stderr is read
+    concurrently into a TailBuffer, so memory stays bounded no matter how much the subprocess
+    writes. Once stdout is exhausted, the subprocess is reaped and 'result' is set; if
+    iteration stops early (ie break, or an exception), the subprocess is killed.
+
+    If 'input' is given, it is written to the subprocess's stdin (ie ffmpeg's 'pipe:0') by a
+    separate thread, while stdout is consumed: bytes (or any buffer), a binary file object
+    (read in chunks) or an iterable of byte chunks (ie a download in progress). Writes block
+    while the subprocess is not reading, so neither the input nor the output piles up in
+    memory when a stage is slower than the others. If reading the input fails, the
+    subprocess is killed and the error is raised once stdout ends.
+
+    As with 'execute_command_in_subprocess', a non-zero exit code does not raise an exception.
+    The result records the resources the subprocess used; it is also handed to 'on_finish'.
+    If given, the 'slot' context manager (ie of a ProcessScheduler) is entered before the
+    subprocess starts and exited once it is reaped. Commands chained by passing one as the
+    'input' of another run in the slot of the last one (their producers' slots are dropped),
+    so that a chain takes a single slot and cannot deadlock waiting for slots it holds.
+    """
+
+    def __init__(
+        self,
+        executable: str,
+        *cli_args,
+        chunk_size: int = STDOUT_CHUNK_SIZE,
+        input: Optional[Union[bytes, BinaryIO, Iterable[bytes]]] = None,
+        on_finish: Optional[Callable[[CLIResult], None]] = None,
+        slot: Optional[ContextManager] = None,
+    ):
+        self.args = [executable] + list(cli_args)
+        self.chunk_size = chunk_size
+        self.input = input
+        self.on_finish = on_finish
+        self.slot = slot or contextlib.nullcontext()
+        self.result: Optional[CLIResult] = None
+
+    def __iter__(self) -> Iterator[bytes]:
+        return self._run(lambda stdout: iter(lambda: stdout.read(self.chunk_size), b''))
+
+    def lines(self) -> Iterator[str]:
+        """Iterate over the stdout lines (without line endings)."""
+        for line in self._run(iter):
+            yield str(line, encoding='utf-8', errors='replace').rstrip('\r\n')
+
+    def _run(self, reader):
+        stderr_tail = TailBuffer()
+        if isinstance(self.input, StreamingCommand):  # the producer shares this slot
+            self.input.slot = contextlib.nullcontext()
+        with self.slot:
+            start = time.perf_counter()
+            with subprocess.Popen(
+                self.args,
+                stdin=None if self.input is None else subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+            ) as process:
+                stderr_reader = threading.Thread(
+                    target=stderr_tail.consume, args=(process.stderr,), daemon=True
+                )
+                stderr_reader.start()
+                input_errors: list = []
+                if self.input is not None:
+                    input_writer = threading.Thread(
+                        target=self._write_input, args=(process, input_errors), daemon=True
+                    )
+                    input_writer.start()
+                try:
+                    yield from reader(process.stdout)
+                except BaseException:  # including GeneratorExit, when iteration stops early
+                    process.kill()
+                    raise
+                finally:
+                    rusage = _reap(process)
+                    stderr_reader.join()
+                if self.input is not None:
+                    input_writer.join()
+                if input_errors:
+                    raise input_errors[0]
+            wall_time = time.perf_counter() - start
+        self.result = CLIResult(
+            subprocess.CompletedProcess(
+                process.args, process.returncode, b'', stderr_tail.getvalue()
+            ),
+            ResourceUsage.from_rusage(wall_time, rusage),
+        )
+        if self.on_finish is not None:
+            self.on_finish(self.result)
+
+    def _write_input(self, process, errors: list):
+        """Write the input to the stdin of the subprocess, then close it (signalling EOF)."""
+        try:
+            for chunk in _chunks(self.input, self.chunk_size):
+                try:
+                    process.stdin.write(chunk)
+                    process.stdin.flush()
+                except (BrokenPipeError, ValueError):  # stdin closed; ie the subprocess exited
+                    return
+        except BaseException as error:  # reading the input failed
+            errors.append(error)
+            process.kill()
+        finally:
+            try:
+                process.stdin.close()
+            except (BrokenPipeError, ValueError):
+                pass
+
+
+def _chunks(source, chunk_size: int) -> Iterator[bytes]:
+    """Iterate over the bytes of a buffer, a binary file object or an iterable of chunks."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        view = memoryview(source)
+        for i in range(0, len(view), chunk_size):
+            yield view[i : i + chunk_size]
+    elif hasattr(source, 'read'):
+        yield from iter(lambda: source.read(chunk_size), b'')
+    else:
+        yield from source
+
+
+def execute_command_streaming_stdout(
+    executable: str,
+    *cli_args,
+    on_stdout_line: Optional[Callable[[str], None]] = None,
+    on_stdout_chunk: Optional[Callable[[bytes], None]] = None,
+    chunk_size: int = STDOUT_CHUNK_SIZE,
+    input: Optional[Union[bytes, BinaryIO, Iterable[bytes]]] = None,
+) -> CLIResult:
+    """Execute a command in a subprocess, handing its stdout to a callback as it is written.
+
+    Stdout is consumed either line by line (text) or in fixed-size chunks (binary; only the
+    last chunk may be shorter), as soon as the subprocess writes it, so the result's 'stdout'
+    is empty. Only the tail of stderr is kept (see StreamingCommand).
+
+    As with 'execute_command_in_subprocess', a non-zero exit code does not raise an exception.
+    If the callback raises an exception, the subprocess is killed and the exception propagates.
+
+    Args:
+        executable (str): path to executable program/binary (ie a CLI)
+        *cli_args (str): arguments to pass to the executable
+        on_stdout_line (Callable[[str], None]): called with each stdout line (without newline)
+        on_stdout_chunk (Callable[[bytes], None]): called with each stdout chunk, instead
+        chunk_size (int): number of bytes in each stdout chunk
+        input: written to the stdin of the subprocess, if given (see StreamingCommand)
+
+    Returns:
+        CLIResult: a wrapper around the subprocess.CompletedProcess class
+    """
+    command = StreamingCommand(executable, *cli_args, chunk_size=chunk_size, input=input)
+    if on_stdout_chunk is not None:
+        for chunk in command:
+            on_stdout_chunk(chunk)
+    else:
+        for line in command.lines():
+            on_stdout_line(line)
+    return command.result
+
+
+async def execute_command_in_subprocess_async(
+    executable: str, *cli_args, **subprocess_settings
+) -> CLIResult:
+    """Execute a command in an asyncio subprocess and return the result.
+
+    Asynchronous counterpart of 'execute_command_in_subprocess': the event loop is free to
+    run other tasks while the subprocess runs. As with the synchronous version, a non-zero
+    exit code does not raise an exception.
+
+    If the awaiting task is cancelled, the subprocess is terminated (and reaped) before the
+    cancellation propagates, so that no orphan processes are left behind. Only the wall time
+    of the subprocess is measured, as the event loop reaps it.
+
+    Args:
+        executable (str): path to executable program/binary (ie a CLI)
+        *cli_args (str): arguments to pass to the executable
+        **subprocess_settings: keyword arguments to pass to asyncio.create_subprocess_exec
+
+    Returns:
+        CLIResult: a wrapper around the subprocess.CompletedProcess class
+    """
+    start = time.perf_counter()
+    process = await asyncio.create_subprocess_exec(
+        executable,
+        *cli_args,
+        **dict(
+            dict(stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE),
+            **subprocess_settings,
+        ),
+    )
+    try:
+        stdout, stderr = await process.communicate()
+    except asyncio.CancelledError:
+        if process.returncode is None:
+            process.terminate()
+            await process.wait()
+        raise
+    return CLIResult(
+        subprocess.CompletedProcess(
+            [executable] + list(cli_args), process.returncode, stdout or b'', stderr or b''
+        ),
+        ResourceUsage(time.perf_counter() - start),
+    )
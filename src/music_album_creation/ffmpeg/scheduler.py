@@ -0,0 +1,160 @@
+"""Schedule the subprocesses (ffmpeg, ffprobe) of all jobs, so they share the machine.
+
+Work is either CPU-bound (ie encoding) or I/O-bound (ie probing, copying) and each kind has
+a limit on how much of it runs at once, across threads and event loops. Work waiting for a
+slot is started by priority (highest first), then in order of arrival.
+"""
+
+import asyncio
+import heapq
+import itertools
+import os
+import threading
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict, Optional
+
+__all__ = ['CPU', 'IO', 'ProcessScheduler', 'scheduler']
+
+
+CPU = 'cpu'
+IO = 'io'
+
+
+class _Waiter:
+    """Work waiting for a slot; woken (from any thread) once granted one."""
+
+    def __init__(self, wake):
+        self.wake = wake
+        self.granted = False
+
+
+class ProcessScheduler(object):
+    """Limit how many subprocesses (or any work) of each kind run at once.
+
+    :param int cpu_limit: max CPU-bound work at once; defaults to the CPU count
+    :param int io_limit: max I/O-bound work at once; defaults to twice the CPU limit
+    """
+
+    def __init__(self, cpu_limit: Optional[int] = None, io_limit: Optional[int] = None):
+        cpu_limit = cpu_limit or os.cpu_count() or 1
+        self._limits = {CPU: cpu_limit, IO: io_limit or 2 * cpu_limit}
+        self._running = {kind: 0 for kind in self._limits}
+        self._queues: Dict[str, list] = {kind: [] for kind in self._limits}
+        self._max_queued = {kind: 0 for kind in self._limits}
+        self._order = itertools.count()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_environment(cls) -> 'ProcessScheduler':
+        """Create a scheduler with the limits set in the environment (if any).
+
+        The limits are read from the MUSIC_CPU_JOBS and MUSIC_IO_JOBS environment variables.
+        """
+        return cls(
+            int(os.environ.get('MUSIC_CPU_JOBS') or 0) or None,
+            int(os.environ.get('MUSIC_IO_JOBS') or 0) or None,
+        )
+
+    def limit(self, kind: str) -> int:
+        return self._limits[kind]
+
+    def set_limit(self, kind: str, limit: int):
+        """Change how much work of the kind runs at once; running work is never interrupted."""
+        if limit < 1:
+            raise ValueError(
+                "The limit of '{}' work should be positive, not {}".format(kind, limit)
+            )
+        with self._lock:
+            self._limits[kind] = limit
+            self._grant(kind)
+
+    def running(self, kind: str) -> int:
+        """Get the amount of work of the kind currently running."""
+        with self._lock:
+            return self._running[kind]
+
+    def queue_depth(self, kind: Optional[str] = None) -> int:
+        """Get the amount of work waiting for a slot, of the kind (or of any kind)."""
+        with self._lock:
+            return sum(len(self._queues[x]) for x in ([kind] if kind else self._queues))
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Get per kind of work: its limit, the work running and queued, the deepest queue."""
+        with self._lock:
+            return {
+                kind: {
+                    'limit': self._limits[kind],
+                    'running': self._running[kind],
+                    'queued': len(self._queues[kind]),
+                    'max_queued': self._max_queued[kind],
+                }
+                for kind in self._limits
+            }
+
+    @contextmanager
+    def slot(self, kind: str = CPU, priority: int = 0):
+        """Hold a slot of the kind, blocking until one is free, while in the context."""
+        event = threading.Event()
+        waiter = self._enqueue(kind, priority, event.set)
+        if waiter is not None:
+            event.wait()
+        try:
+            yield
+        finally:
+            self._release(kind)
+
+    @asynccontextmanager
+    async def slot_async(self, kind: str = CPU, priority: int = 0):
+        """Hold a slot of the kind while in the context, waiting without blocking the loop."""
+        loop = asyncio.get_running_loop()
+        granted = loop.create_future()
+
+        def wake():
+            loop.call_soon_threadsafe(lambda: granted.done() or granted.set_result(None))
+
+        waiter = self._enqueue(kind, priority, wake)
+        if waiter is not None:
+            try:
+                await granted
+            except asyncio.CancelledError:
+                with self._lock:
+                    if not waiter.granted:  # give up the place in the queue
+                        queue = self._queues[kind]
+                        queue[:] = [x for x in queue if x[2] is not waiter]
+                        heapq.heapify(queue)
+                        raise
+                self._release(kind)  # granted, but cancelled before using the slot
+                raise
+        try:
+            yield
+        finally:
+            self._release(kind)
+
+    def _enqueue(self, kind, priority, wake) -> Optional[_Waiter]:
+        """Take a slot if one is free and nobody waits; otherwise queue up, as a _Waiter."""
+        with self._lock:
+            if self._running[kind] < self._limits[kind] and not self._queues[kind]:
+                self._running[kind] += 1
+                return None
+            waiter = _Waiter(wake)
+            heapq.heappush(self._queues[kind], (-priority, next(self._order), waiter))
+            self._max_queued[kind] = max(self._max_queued[kind], len(self._queues[kind]))
+            return waiter
+
+    def _release(self, kind):
+        with self._lock:
+            self._running[kind] -= 1
+            self._grant(kind)
+
+    def _grant(self, kind):
+        """Hand the free slots of the kind to the first waiters; the lock must be held."""
+        queue = self._queues[kind]
+        while queue and self._running[kind] < self._limits[kind]:
+            waiter = heapq.heappop(queue)[2]
+            self._running[kind] += 1
+            waiter.granted = True
+            waiter.wake()
+
+
+# scheduler of the subprocesses of the ffmpeg and ffprobe proxies, unless given another one
+scheduler = ProcessScheduler.from_environment()
@@ -1,5 +1,5 @@
 import json
-from typing import Any, Dict, Protocol
+from typing import Any, Dict, List, Optional, Protocol, Tuple
 
 from attr import define
 
@@ -11,7 +11,7 @@ class CLIResult(Protocol):
 
 
 class FFProbeCallable(Protocol):
-    def __call__(self, *args: str) -> CLIResult:
+    def __call__(self, *args: str, **kwargs: Any) -> CLIResult:
         ...
 
 
@@ -31,6 +31,7 @@ class FFProbeClient:
             '-print_format',
             'json',
             str(file_path),
+            stage='stream-info',
         )
         if cli_result.exit_code != 0:
             raise RuntimeError(f"ffprobe failed with exit code {cli_result.exit_code}")
@@ -38,3 +39,56 @@ class FFProbeClient:
         assert cli_result.stderr == ''
         res = cli_result.stdout
         return json.loads(res)
+
+    def get_packets(self, file_path: str) -> List[Tuple[float, int]]:
+        """Get the timestamp (in seconds) and byte position of the key packets of the file.
+
+        Only the first audio stream is inspected; packets lacking a timestamp or a byte
+        position are skipped.
+        """
+        cli_result = self.ffprobe(
+            '-v',
+            'error',
+            '-select_streams',
+            'a:0',
+            '-show_entries',
+            'packet=pts_time,pos,flags',
+            '-of',
+            'csv=print_section=0',
+            str(file_path),
+            stage='packets',
+        )
+        if cli_result.exit_code != 0:
+            raise RuntimeError(f"ffprobe failed with exit code {cli_result.exit_code}")
+        packets = []
+        for line in cli_result.stdout.splitlines():
+            pts_time, pos, flags = line.split(',')[:3]
+            if 'K' in flags and pts_time != 'N/A' and pos != 'N/A':
+                packets.append((float(pts_time), int(pos)))
+        return packets
+
+    def get_chapters(self, file_path: str) -> List[Tuple[Optional[str], float, float]]:
+        """Get the title, start and end (in seconds) of the chapters embedded in the file.
+
+        Chapters are sorted by start time; the title is None for untitled chapters. An empty
+        list means the file has no chapters.
+        """
+        cli_result = self.ffprobe(
+            '-v',
+            'error',
+            '-show_chapters',
+            '-print_format',
+            'json',
+            str(file_path),
+            stage='chapters',
+        )
+        if cli_result.exit_code != 0:
+            raise RuntimeError(f"ffprobe failed with exit code {cli_result.exit_code}")
+        chapters = json.loads(cli_result.stdout).get('chapters', [])
+        return sorted(
+            (
+                (x.get('tags', {}).get('title'), float(x['start_time']), float(x['end_time']))
+                for x in chapters
+            ),
+            key=lambda x: x[1],
+        )
@@ -0,0 +1,173 @@
+"""Store tracks in the music library, recording content hashes of the stored files."""
+
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+from typing import Dict, List
+
+__all__ = [
+    'StagedAlbum',
+    'copy_and_hash',
+    'hash_file',
+    'read_checksums',
+    'write_checksums',
+    'checksums_file',
+]
+
+
+logger = logging.getLogger(__name__)
+
+
+# bytes copied (and hashed) at a time
+CHUNK_SIZE = 1024**2
+
+# hash algorithm of the checksums recorded in each album directory (any of hashlib's)
+HASH_ALGORITHM = 'sha256'
+
+
+def copy_and_hash(source, destination, algorithm=HASH_ALGORITHM) -> str:
+    """Copy a file, hashing its content on the way; return the hex digest of the content.
+
+    A single buffer is reused for every chunk (through a memoryview), so the data is read
+    once, hashed and written without intermediate copies.
+    """
+    hasher = hashlib.new(algorithm)
+    buffer = bytearray(CHUNK_SIZE)
+    with memoryview(buffer) as view, open(source, 'rb') as src, open(destination, 'wb') as dst:
+        for size in iter(lambda: src.readinto(buffer), 0):
+            hasher.update(view[:size])
+            dst.write(view[:size])
+    return hasher.hexdigest()
+
+
+def hash_file(file_path, algorithm=HASH_ALGORITHM) -> str:
+    """Hash the content of a file, reading it in chunks into a single (reused) buffer."""
+    hasher = hashlib.new(algorithm)
+    buffer = bytearray(CHUNK_SIZE)
+    with memoryview(buffer) as view, open(file_path, 'rb') as f:
+        for size in iter(lambda: f.readinto(buffer), 0):
+            hasher.update(view[:size])
+    return hasher.hexdigest()
+
+
+def checksums_file(album_directory, algorithm=HASH_ALGORITHM) -> str:
+    """Get the path of the checksums (manifest) file of an album directory."""
+    return os.path.join(str(album_directory), 'checksums.{}'.format(algorithm))
+
+
+def read_checksums(album_directory, algorithm=HASH_ALGORITHM) -> Dict[str, str]:
+    """Read the recorded checksums of an album's files; empty if none are recorded.
+
+    :return: the hex digest per file name
+    :rtype: dict
+    """
+    try:
+        with open(checksums_file(album_directory, algorithm), 'r', encoding='utf-8') as f:
+            lines = f.read().splitlines()
+    except FileNotFoundError:
+        return {}
+    return dict(reversed(line.split('  ', 1)) for line in lines if line.strip())
+
+
+def write_checksums(album_directory, checksums: Dict[str, str], algorithm=HASH_ALGORITHM):
+    """Record the checksums of (some of) an album's files, keeping those of other files.
+
+    The manifest uses the format of the coreutils checksum tools (ie 'sha256sum -c' verifies
+    it, from within the album directory) and is replaced atomically.
+
+    :param dict checksums: the hex digest per file name (relative to the album directory)
+    """
+    recorded = dict(read_checksums(album_directory, algorithm), **checksums)
+    file_descriptor, temp_file = tempfile.mkstemp(dir=str(album_directory), prefix='.')
+    try:
+        with open(file_descriptor, 'w', encoding='utf-8') as f:
+            f.writelines(
+                '{}  {}\n'.format(digest, name) for name, digest in sorted(recorded.items())
+            )
+        os.replace(temp_file, checksums_file(album_directory, algorithm))
+    except BaseException:
+        os.remove(temp_file)
+        raise
+
+
+class StagedAlbum(object):
+    """A hidden staging directory in the music library, to write an album's tracks into.
+
+    Tracks are written (ie by AudioSegmenter) straight into the staging directory, which lives
+    on the library's file system, so publishing the album moves no data: a new album directory
+    is published with a single (atomic) rename, so readers of the library never see a partly
+    written album. When the album directory already exists, the tracks are hardlinked into it
+    one by one (copied, if hardlinks fail; ie across file systems), never overwriting files.
+
+    Used as a context manager, the staging directory is discarded if the context exits with an
+    exception (including KeyboardInterrupt and SystemExit), unless published already.
+    """
+
+    def __init__(self, library_directory):
+        self.directory = tempfile.mkdtemp(prefix='.staging-', dir=str(library_directory))
+        # mkdtemp makes the directory private; give it the permissions of any new directory
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(self.directory, 0o777 & ~umask)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # an album not published (ie on errors, interrupts or exits) is not left in the library
+        if exc_type is not None:
+            self.discard()
+
+    def publish(self, album_directory, record_checksums=False) -> List[str]:
+        """Move the staged files into the album directory and remove the staging directory.
+
+        :param bool record_checksums: whether to record the checksums of the published files
+            in the album directory (see write_checksums); files not published are not hashed
+        :return: the names of the staged files not published, because the album directory
+            already had files with the same names
+        :rtype: list
+        """
+        album_directory = str(album_directory)
+        os.makedirs(os.path.dirname(os.path.abspath(album_directory)), exist_ok=True)
+        try:
+            # replaces the album directory only if it does not exist, or is empty
+            os.rename(self.directory, album_directory)
+        except OSError as error:  # ie existing album, or a different file system
+            logger.info("Merging staged tracks into '%s': %s", album_directory, error)
+        else:
+            if record_checksums:
+                write_checksums(
+                    album_directory,
+                    {
+                        name: hash_file(os.path.join(album_directory, name))
+                        for name in os.listdir(album_directory)
+                    },
+                )
+            return []
+        os.makedirs(album_directory, exist_ok=True)
+        skipped = []
+        checksums = {}
+        for name in sorted(os.listdir(self.directory)):
+            staged_file = os.path.join(self.directory, name)
+            album_file = os.path.join(album_directory, name)
+            if os.path.lexists(album_file):
+                skipped.append(name)
+                continue
+            try:
+                os.link(staged_file, album_file)
+            except OSError:
+                # ie across file systems; hashing on the way saves reading the file again
+                checksums[name] = copy_and_hash(staged_file, album_file)
+            else:
+                if record_checksums:
+                    checksums[name] = hash_file(album_file)
+        if record_checksums:
+            write_checksums(album_directory, checksums)
+        self.discard()
+        return skipped
+
+    def discard(self):
+        """Remove the staging directory, along with anything staged in it."""
+        shutil.rmtree(self.directory, ignore_errors=True)
@@ -5,7 +5,7 @@ import re
 from collections import defaultdict
 
 import click
-from mutagen.id3 import ID3, TALB, TDRC, TIT2, TPE1, TPE2, TRCK
+from mutagen.id3 import ID3, TALB, TDRC, TIT2, TPE1, TPE2, TRCK, TXXX
 
 from music_album_creation.tracks_parsing import StringParser
 
@@ -72,10 +72,35 @@ class MetadataDealer(MetadataDealerType):
             year=str(year),
         )
 
+    @classmethod
+    def set_tracks_metadata(
+        cls,
+        track_files,
+        track_number=True,
+        track_name=True,
+        artist='',
+        album_artist='',
+        album='',
+        year='',
+    ):
+        """Same as set_album_metadata, but for the given (mp3) track files, wherever they are."""
+        cls._write_tracks_metadata(
+            [x for x in track_files if x.endswith('.mp3')],
+            track_number=track_number,
+            track_name=track_name,
+            artist=artist,
+            album_artist=album_artist,
+            album=album,
+            year=str(year),
+        )
+
     @classmethod
     def _write_metadata(cls, album_directory, **kwargs):
-        files = glob.glob('{}/*.mp3'.format(album_directory))
         logger.info("Album directory: {}".format(album_directory))
+        cls._write_tracks_metadata(glob.glob('{}/*.mp3'.format(album_directory)), **kwargs)
+
+    @classmethod
+    def _write_tracks_metadata(cls, files, **kwargs):
         for file in files:
             logger.info("File: {}".format(os.path.basename(file)))
             cls.write_metadata(
@@ -120,6 +145,26 @@ class MetadataDealer(MetadataDealerType):
                 )
         audio.save()
 
+    @classmethod
+    def write_replaygain(cls, file, track_loudness, album_loudness=None):
+        """Write the track's (and album's) ReplayGain gain and peak, as TXXX frames.
+
+        :param str file: path to the (mp3) track file
+        :param Loudness track_loudness: the loudness of the track
+        :param Loudness album_loudness: the loudness of the whole album, if known
+        """
+        audio = ID3(file)
+        for scope, loudness in (('TRACK', track_loudness), ('ALBUM', album_loudness)):
+            if loudness is None:
+                continue
+            for desc, value in (
+                ('REPLAYGAIN_{}_GAIN'.format(scope), '{:.2f} dB'.format(loudness.gain)),
+                ('REPLAYGAIN_{}_PEAK'.format(scope), '{:.6f}'.format(loudness.peak)),
+            ):
+                audio.add(TXXX(encoding=3, desc=desc, text=value))
+                logger.info(" {}: TXXX={}".format(desc, value))
+        audio.save()
+
     @classmethod
     def _filter_auto_inferred(cls, d, **kwargs):
         """Given a dictionary (like the one outputted by _infer_track_number_n_name), deletes entries unless it finds them declared in kwargs as key_name=True"""
@@ -0,0 +1,127 @@
+import asyncio
+import threading
+
+import pytest
+
+from music_album_creation.audio_segmentation import album_segmentation
+from music_album_creation.ffmpeg.run_cli import ResourceUsage
+
+
+class FakeResult:
+    def __init__(self, exit_code=0, stderr='', usage=None):
+        self.exit_code = exit_code
+        self.stdout = ''
+        self.stderr = stderr
+        self.usage = usage or ResourceUsage(0.0, 0.0, 0.0, 0)
+
+
+class FakeFFMPEG:
+    """Record the arguments of each ffmpeg call and write its output file, if any.
+
+    Each output file gets the rest of the call's arguments as content, so that tracks cut
+    differently differ; except for the PCM scratch file of decoding the album once, which gets
+    'pcm_seconds' of silent 16-bit stereo audio, sampled at 44100 Hz. Calls writing to a file
+    matching 'fail_on' fail. The stderr of the calls may be given per output file, as a callable.
+    """
+
+    def __init__(self, fail_on=None, stderr='', usage=None, pcm_seconds=60):
+        self.fail_on = fail_on
+        self.stderr = stderr
+        self.usage = usage
+        self.pcm_seconds = pcm_seconds
+        self.calls = []
+        self.inputs = {}
+        self._lock = threading.Lock()
+
+    @property
+    def tracks(self):
+        """The output track file of each call (except decoding the album), in call order"""
+        with self._lock:
+            return [args[-1] for args in self.calls if not args[-1].endswith('.pcm')]
+
+    def __call__(self, *args, **kwargs):
+        output = args[-1]
+        with self._lock:
+            self.calls.append(args)
+            if 'input' in kwargs:
+                self.inputs[output] = bytes(kwargs['input'])
+        if output.endswith('.pcm'):
+            with open(output, 'wb') as pcm_file:
+                pcm_file.write(bytes(44100 * 2 * 2 * self.pcm_seconds))
+        elif output not in ('-', 'pipe:1'):
+            with open(output, 'w') as track_file:
+                track_file.write(' '.join(args[:-1]))
+        if self.fail_on and self.fail_on in output:
+            return FakeResult(exit_code=1, stderr='Invalid data found when processing input')
+        stderr = self.stderr(output) if callable(self.stderr) else self.stderr
+        return FakeResult(stderr=stderr, usage=self.usage)
+
+    async def call_async(self, *args, **kwargs):
+        await asyncio.sleep(0)
+        return self(*args, **kwargs)
+
+
+class FakeFFProbeClient:
+    """Describe any file as an album with a single audio stream, of the given properties."""
+
+    def __init__(
+        self,
+        duration='60.0',
+        format_name='matroska,webm',
+        codec_name='opus',
+        bit_rate=None,
+        sample_rate=44100,
+        channels=2,
+        packets=(),
+    ):
+        self.duration = duration
+        self.format_name = format_name
+        self.codec_name = codec_name
+        self.bit_rate = bit_rate
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.packets = list(packets)
+        self.probed_packets = 0
+
+    def get_stream_info(self, file_path):
+        format_info = {'format_name': self.format_name, 'duration': self.duration}
+        if self.bit_rate is not None:
+            format_info['bit_rate'] = self.bit_rate
+        return {
+            'streams': [
+                {
+                    'codec_name': self.codec_name,
+                    'sample_rate': str(self.sample_rate),
+                    'channels': self.channels,
+                }
+            ],
+            'format': format_info,
+        }
+
+    def get_packets(self, file_path):
+        self.probed_packets += 1
+        return self.packets
+
+
+@pytest.fixture
+def fake_ffmpeg(monkeypatch):
+    """Replace the ffmpeg of album_segmentation with a FakeFFMPEG, given its settings."""
+
+    def install(**settings):
+        fake = FakeFFMPEG(**settings)
+        monkeypatch.setattr(album_segmentation, 'ffmpeg', fake)
+        return fake
+
+    return install
+
+
+@pytest.fixture
+def fake_ffprobe(monkeypatch):
+    """Replace the ffprobe client of album_segmentation with a FakeFFProbeClient."""
+
+    def install(**settings):
+        fake = FakeFFProbeClient(**settings)
+        monkeypatch.setattr(album_segmentation, 'ffprobe_client', fake)
+        return fake
+
+    return install
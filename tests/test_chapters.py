@@ -0,0 +1,65 @@
+import json
+
+import pytest
+
+from music_album_creation.audio_segmentation import SegmentationInformation
+from music_album_creation.ffprobe_client import FFProbeClient
+
+FFPROBE_CHAPTERS_OUTPUT = {
+    'chapters': [
+        {
+            'id': 1,
+            'start_time': '245.120000',
+            'end_time': '512.004000',
+            'tags': {'title': 'Wake up / Live'},
+        },
+        {
+            'id': 0,
+            'start_time': '0.000000',
+            'end_time': '245.120000',
+            'tags': {'title': 'Intro'},
+        },
+        {'id': 2, 'start_time': '512.004000', 'end_time': '760.500000'},
+    ]
+}
+
+
+class FakeFFProbe:
+    def __init__(self, output):
+        self.output = output
+        self.calls = []
+
+    def __call__(self, *args, **kwargs):
+        self.calls.append(args)
+        return type('CLIResult', (), {'exit_code': 0, 'stdout': self.output, 'stderr': ''})
+
+
+def test_chapters_are_probed_in_a_single_call_sorted_by_start():
+    ffprobe = FakeFFProbe(json.dumps(FFPROBE_CHAPTERS_OUTPUT))
+
+    chapters = FFProbeClient(ffprobe).get_chapters('album.webm')
+
+    assert len(ffprobe.calls) == 1 and '-show_chapters' in ffprobe.calls[0]
+    assert chapters == [
+        ('Intro', 0.0, 245.12),
+        ('Wake up / Live', 245.12, 512.004),
+        (None, 512.004, 760.5),
+    ]
+
+
+def test_file_without_chapters_has_no_chapters():
+    assert FFProbeClient(FakeFFProbe('{}')).get_chapters('album.webm') == []
+
+
+def test_chapters_become_tracks_with_millisecond_boundaries():
+    segmentation = SegmentationInformation.from_chapters(
+        [('Intro', 0.0, 245.12), ('Wake up / Live', 245.12, 512.004), (None, 512.004, 760.5)]
+    )
+
+    assert segmentation.tracks_info == [
+        ['01 - Intro', '0.000', '245.120'],
+        ['02 - Wake up - Live', '245.120', '512.004'],
+        ['03 - Track 3', '512.004'],
+    ]
+    with pytest.raises(ValueError):
+        SegmentationInformation.from_chapters([])
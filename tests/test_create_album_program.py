@@ -125,6 +125,7 @@ def test_integration(
     expected_tracks = {
         '01 - Gasoline.mp3',
         '02 - Man vs. God.mp3',
+        'checksums.sha256',
     }
     assert set(os.listdir(expected_album_dir)) == expected_tracks
 
@@ -0,0 +1,94 @@
+import os
+
+import pytest
+
+from music_album_creation.audio_segmentation import (
+    AudioSegmenter,
+    album_segmentation,
+    planning,
+)
+from music_album_creation.ffmpeg.run_cli import ResourceUsage
+
+SEGMENTATION = (
+    ('01 - first', '0', '100'),
+    ('02 - second', '100', '300'),
+    ('03 - last', '300'),
+)
+
+
+@pytest.fixture
+def fake_ffmpeg(fake_ffmpeg, fake_ffprobe, monkeypatch, tmp_path):
+    """Fake ffmpeg, whose calls (for a dry run) should only measure the encoding cost."""
+    monkeypatch.setenv('MUSIC_CACHE_DIR', str(tmp_path / 'cache'))
+    fake_ffprobe(duration='400.000000', bit_rate='160000')
+    return fake_ffmpeg(usage=ResourceUsage(wall_time=2.0, user_time=0.3, system_time=0.1))
+
+
+def test_dry_run_plans_commands_and_costs_without_creating_tracks(tmp_path, fake_ffmpeg):
+    segmenter = AudioSegmenter(str(tmp_path / 'tracks'), seek='input')
+    plan = segmenter.dry_run('album.webm', SEGMENTATION, factor=0.01)
+
+    assert plan.valid
+    assert fake_ffmpeg.calls == []
+    assert not os.path.exists(tmp_path / 'tracks')
+    assert [(x.start, x.end, x.duration) for x in plan.tracks] == [
+        (0.0, 100.0, 100.0),
+        (100.0, 300.0, 200.0),
+        (300.0, 400.0, 100.0),
+    ]
+    # the exact commands 'segment' runs
+    assert plan.tracks[1].command == (
+        album_segmentation.FFMPEG_BINARY,
+        *segmenter._segment_args(
+            'album.webm',
+            str(tmp_path / 'tracks' / '02 - second.mp3'),
+            '100',
+            '300',
+            seek='input',
+        ),
+    )
+    # re-encoded at 128 kbps
+    assert [x.output_bytes for x in plan.tracks] == [1600000, 3200000, 1600000]
+    assert [x.cpu_seconds for x in plan.tracks] == pytest.approx([1.0, 2.0, 1.0])
+    assert plan.output_bytes == 6400000
+    assert "02 - second.mp3" in plan.report()
+
+
+def test_dry_run_counts_audio_decoded_before_the_track_start(tmp_path, fake_ffmpeg):
+    plan = AudioSegmenter(str(tmp_path), seek='output').dry_run(
+        'album.webm', SEGMENTATION, factor=0.01
+    )
+    assert [x.cpu_seconds for x in plan.tracks] == pytest.approx([1.0, 3.0, 4.0])
+
+
+def test_dry_run_of_stream_copy_takes_the_source_bitrate(tmp_path, fake_ffmpeg):
+    plan = AudioSegmenter(str(tmp_path), stream_copy=True).dry_run('album.webm', SEGMENTATION)
+    assert [os.path.basename(x.path) for x in plan.tracks][0] == '01 - first.opus'
+    assert [x.output_bytes for x in plan.tracks] == [2000000, 4000000, 2000000]
+    assert fake_ffmpeg.calls == []  # no calibration needed
+
+
+def test_dry_run_reports_tracks_past_the_album_end(tmp_path, fake_ffmpeg, fake_ffprobe):
+    fake_ffprobe(duration='250.000000', bit_rate='160000')
+    plan = AudioSegmenter(str(tmp_path)).dry_run('album.webm', SEGMENTATION, factor=0.01)
+    assert not plan.valid
+    assert len(plan.problems) == 2
+    assert "'02 - second.mp3' ends at 300.000" in plan.problems[0]
+    assert "'03 - last.mp3' starts at 300.000" in plan.problems[1]
+    assert plan.tracks[-1].duration == 0
+
+
+def test_dry_run_plans_the_commands_reporting_progress(tmp_path, fake_ffmpeg):
+    plan = AudioSegmenter(str(tmp_path), seek='input').dry_run(
+        'album.webm', SEGMENTATION, progress=True, factor=0.01
+    )
+    assert plan.tracks[0].command[1:4] == ('-progress', 'pipe:1', '-nostats')
+
+
+def test_calibration_factor_is_measured_once(tmp_path, fake_ffmpeg):
+    factor = planning.calibration_factor(fake_ffmpeg, 'ffmpeg')
+    # the CPU time of the calibration process alone, per second of audio
+    assert factor == pytest.approx(0.4 / planning.CALIBRATION_SECONDS)
+    assert planning.calibration_factor(fake_ffmpeg, 'ffmpeg') == factor
+    assert len(fake_ffmpeg.calls) == 1
+    assert fake_ffmpeg.calls[0][-2:] == ('null', '-')
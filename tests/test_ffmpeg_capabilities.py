@@ -0,0 +1,97 @@
+import os
+
+import pytest
+
+from music_album_creation.ffmpeg import capabilities
+from music_album_creation.ffmpeg.capabilities import (
+    Capabilities,
+    UnusableFFmpegError,
+    get_capabilities,
+)
+
+VERSION = 'ffmpeg version 7.0.2-static https://johnvansickle.com/ffmpeg/  Copyright (c)\n'
+
+ENCODERS = """Encoders:
+ V..... = Video
+ A..... = Audio
+ S..... = Subtitle
+ ------
+ V....D a64multi             Multicolor charset for Commodore 64 (codec a64_multi)
+ A....D libmp3lame           libmp3lame MP3 (MPEG audio layer 3) (codec mp3)
+ A..X.D opus                 Opus
+ A....D libopus              libopus Opus (codec opus)
+ S..... ass                  ASS (Advanced SubStation Alpha) subtitle
+"""
+
+MUXERS = """Formats:
+ D.. = Demuxing supported
+ .E. = Muxing supported
+ ..d = Is a device
+ ---
+  E  ipod            iPod H.264 MP4 (MPEG-4 Part 14)
+  E  matroska        Matroska
+  E  mp3             MP3 (MPEG audio layer 3)
+  E  webm            WebM
+  Ed alsa            ALSA audio output
+"""
+
+
+class FakeResult:
+    def __init__(self, stdout):
+        self.exit_code = 0
+        self.stdout = stdout
+        self.stderr = ''
+
+
+class FakeFFMPEG:
+    def __init__(self, ffmpeg_binary):
+        self.ffmpeg_binary = ffmpeg_binary
+        self.calls = []
+
+    def __call__(self, *args, **kwargs):
+        self.calls.append(args)
+        return FakeResult(
+            {'-version': VERSION, '-encoders': ENCODERS, '-muxers': MUXERS}[args[-1]]
+        )
+
+
+@pytest.fixture
+def ffmpeg_binary(tmp_path, monkeypatch):
+    monkeypatch.setenv('MUSIC_CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.setattr(capabilities, '_loaded', {})
+    binary = tmp_path / 'ffmpeg'
+    binary.write_text('#!/bin/sh\n')
+    binary.chmod(0o755)
+    return str(binary)
+
+
+def test_listings_are_parsed():
+    parsed = Capabilities.parse(VERSION, ENCODERS, MUXERS)
+    assert parsed.version == '7.0.2-static'
+    assert parsed.has_encoder('libopus')
+    assert not parsed.has_encoder('a64multi')  # a video encoder
+    assert not parsed.has_encoder('libshine')
+    assert parsed.first_encoder('libshine', 'libmp3lame') == 'libmp3lame'
+    assert parsed.muxers == {'ipod', 'matroska', 'mp3', 'webm', 'alsa'}
+
+
+def test_capabilities_are_probed_once_and_cached_on_disk(ffmpeg_binary, monkeypatch):
+    ffmpeg = FakeFFMPEG(ffmpeg_binary)
+    probed = get_capabilities(ffmpeg)
+    assert get_capabilities(ffmpeg) is probed
+    assert [x[-1] for x in ffmpeg.calls] == ['-version', '-encoders', '-muxers']
+
+    # a new process reads them from the disk cache
+    monkeypatch.setattr(capabilities, '_loaded', {})
+    assert get_capabilities(ffmpeg) == probed
+    assert len(ffmpeg.calls) == 3
+
+    # a modified binary is probed again
+    os.utime(ffmpeg_binary, (0, 0))
+    assert get_capabilities(ffmpeg) == probed
+    assert len(ffmpeg.calls) == 6
+
+
+def test_missing_binary_is_reported(tmp_path):
+    with pytest.raises(UnusableFFmpegError, match='MUSIC_FFMPEG'):
+        get_capabilities(FakeFFMPEG(str(tmp_path / 'no-ffmpeg')))
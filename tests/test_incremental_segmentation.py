@@ -0,0 +1,105 @@
+import os
+
+import pytest
+
+from music_album_creation.audio_segmentation import (
+    AudioSegmenter,
+    SegmentationInformation,
+)
+
+
+@pytest.fixture
+def album_file(tmp_path):
+    album = tmp_path / 'album.webm'
+    album.write_bytes(b'album audio stream')
+    return str(album)
+
+
+def segmentation(*tracks):
+    return SegmentationInformation.from_tracks_information(list(tracks), 'timestamps')
+
+
+def outputs(ffmpeg):
+    """Get the file name of the track each ffmpeg call created."""
+    return sorted(os.path.basename(x) for x in ffmpeg.tracks)
+
+
+def test_only_edited_tracks_are_cut_again(tmp_path, album_file, fake_ffmpeg, fake_ffprobe):
+    ffmpeg = fake_ffmpeg()
+    fake_ffprobe(duration='300.0')
+    segmenter = AudioSegmenter(str(tmp_path / 'album'), seek='output')
+    os.mkdir(segmenter.target_directory)
+
+    first = segmenter.segment_incremental(
+        album_file, segmentation(['a', '0:00'], ['b', '1:00'], ['c', '2:00']), workers=1
+    )
+    assert sorted(first.regenerated) == ['01 - a.mp3', '02 - b.mp3', '03 - c.mp3']
+    assert first.reused == []
+
+    # fix a typo in the timestamp of the 3rd track: 'b' and 'c' change, 'a' stays the same
+    ffmpeg.calls.clear()
+    second = segmenter.segment_incremental(
+        album_file, segmentation(['a', '0:00'], ['b', '1:00'], ['c', '2:05']), workers=1
+    )
+
+    assert second.reused == ['01 - a.mp3']
+    assert sorted(second.regenerated) == ['02 - b.mp3', '03 - c.mp3']
+    assert outputs(ffmpeg) == ['02 - b.mp3', '03 - c.mp3']
+    assert [x.path for x in second.tracks] == [
+        os.path.join(segmenter.target_directory, x)
+        for x in ('01 - a.mp3', '02 - b.mp3', '03 - c.mp3')
+    ]
+    assert [(x.start, x.end) for x in second.tracks] == [(0, 60), (60, 125), (125, 300)]
+
+
+def test_renumbered_tracks_are_renamed(tmp_path, album_file, fake_ffmpeg, fake_ffprobe):
+    ffmpeg = fake_ffmpeg()
+    fake_ffprobe(duration='300.0')
+    segmenter = AudioSegmenter(str(tmp_path / 'album'), seek='output')
+    os.mkdir(segmenter.target_directory)
+    segmenter.segment_incremental(
+        album_file, segmentation(['a', '0:00'], ['c', '2:00'], ['d', '3:00']), workers=1
+    )
+    with open(os.path.join(segmenter.target_directory, '02 - c.mp3')) as f:
+        track_c = f.read()
+
+    # insert a forgotten track: every following track shifts by one number
+    ffmpeg.calls.clear()
+    result = segmenter.segment_incremental(
+        album_file,
+        segmentation(['a', '0:00'], ['b', '1:00'], ['c', '2:00'], ['d', '3:00']),
+        workers=1,
+    )
+
+    assert result.reused == []
+    assert result.renamed == [('02 - c.mp3', '03 - c.mp3'), ('03 - d.mp3', '04 - d.mp3')]
+    # 'a' ends earlier now, so it is cut again
+    assert sorted(result.regenerated) == ['01 - a.mp3', '02 - b.mp3']
+    assert outputs(ffmpeg) == ['01 - a.mp3', '02 - b.mp3']
+    with open(os.path.join(segmenter.target_directory, '03 - c.mp3')) as f:
+        assert f.read() == track_c
+    assert sorted(x for x in os.listdir(segmenter.target_directory) if x.endswith('.mp3')) == [
+        '01 - a.mp3',
+        '02 - b.mp3',
+        '03 - c.mp3',
+        '04 - d.mp3',
+    ]
+
+
+def test_obsolete_tracks_are_removed(tmp_path, album_file, fake_ffmpeg, fake_ffprobe):
+    ffmpeg = fake_ffmpeg()
+    fake_ffprobe(duration='300.0')
+    segmenter = AudioSegmenter(str(tmp_path / 'album'), seek='output')
+    os.mkdir(segmenter.target_directory)
+    segmenter.segment_incremental(
+        album_file, segmentation(['a', '0:00'], ['b', '1:00'], ['c', '2:00']), workers=1
+    )
+
+    result = segmenter.segment_incremental(
+        album_file, segmentation(['a', '0:00'], ['b', '1:00']), workers=1
+    )
+
+    assert result.reused == ['01 - a.mp3']
+    assert result.regenerated == ['02 - b.mp3']
+    assert result.removed == ['03 - c.mp3']
+    assert not os.path.exists(os.path.join(segmenter.target_directory, '03 - c.mp3'))
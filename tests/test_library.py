@@ -0,0 +1,124 @@
+import hashlib
+import os
+
+import pytest
+
+from music_album_creation import library
+from music_album_creation.library import (
+    StagedAlbum,
+    checksums_file,
+    copy_and_hash,
+    read_checksums,
+    write_checksums,
+)
+
+
+@pytest.mark.parametrize('algorithm', ['sha256', 'blake2b'])
+def test_copy_returns_the_hash_of_the_copied_content(tmp_path, monkeypatch, algorithm):
+    monkeypatch.setattr(library, 'CHUNK_SIZE', 1000)
+    content = os.urandom(4500)
+    (tmp_path / 'track.mp3').write_bytes(content)
+
+    digest = copy_and_hash(
+        str(tmp_path / 'track.mp3'), str(tmp_path / 'copy.mp3'), algorithm=algorithm
+    )
+
+    assert (tmp_path / 'copy.mp3').read_bytes() == content
+    assert digest == hashlib.new(algorithm, content).hexdigest()
+
+
+def test_checksums_are_recorded_in_coreutils_format(tmp_path):
+    write_checksums(str(tmp_path), {'02 - b.mp3': 'bb' * 32, '01 - a.mp3': 'aa' * 32})
+    write_checksums(str(tmp_path), {'02 - b.mp3': 'cc' * 32, '03 - c.mp3': 'dd' * 32})
+
+    with open(checksums_file(str(tmp_path))) as f:
+        assert f.read() == (
+            '{}  01 - a.mp3\n{}  02 - b.mp3\n{}  03 - c.mp3\n'.format(
+                'aa' * 32, 'cc' * 32, 'dd' * 32
+            )
+        )
+    assert read_checksums(str(tmp_path)) == {
+        '01 - a.mp3': 'aa' * 32,
+        '02 - b.mp3': 'cc' * 32,
+        '03 - c.mp3': 'dd' * 32,
+    }
+    assert read_checksums(str(tmp_path), algorithm='blake2b') == {}
+
+
+def test_staged_album_is_published_with_a_rename(tmp_path):
+    staging = StagedAlbum(str(tmp_path))
+    (tmp_path / os.path.basename(staging.directory) / '01 - a.mp3').write_bytes(b'a')
+    staged_inode = os.stat(os.path.join(staging.directory, '01 - a.mp3')).st_ino
+    album_dir = tmp_path / 'artist' / 'album'
+
+    assert os.path.basename(staging.directory).startswith('.')
+    assert staging.publish(str(album_dir)) == []
+
+    assert os.listdir(str(album_dir)) == ['01 - a.mp3']
+    assert os.stat(str(album_dir / '01 - a.mp3')).st_ino == staged_inode
+    assert not os.path.exists(staging.directory)
+
+
+def test_staged_album_is_merged_into_an_existing_album(tmp_path):
+    album_dir = tmp_path / 'album'
+    album_dir.mkdir()
+    (album_dir / '01 - a.mp3').write_bytes(b'old')
+    staging = StagedAlbum(str(tmp_path))
+    for name in ('01 - a.mp3', '02 - b.mp3'):
+        with open(os.path.join(staging.directory, name), 'wb') as f:
+            f.write(b'new')
+
+    assert staging.publish(str(album_dir)) == ['01 - a.mp3']
+
+    assert (album_dir / '01 - a.mp3').read_bytes() == b'old'
+    assert (album_dir / '02 - b.mp3').read_bytes() == b'new'
+    assert not os.path.exists(staging.directory)
+
+
+@pytest.mark.parametrize('error', [RuntimeError, KeyboardInterrupt, SystemExit])
+def test_staged_album_is_discarded_when_not_published(tmp_path, error):
+    with pytest.raises(error):
+        with StagedAlbum(str(tmp_path)) as staging:
+            (tmp_path / os.path.basename(staging.directory) / '01 - a.mp3').write_bytes(b'a')
+            raise error()
+
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_published_staged_album_is_kept_on_exit(tmp_path):
+    album_dir = tmp_path / 'album'
+    with StagedAlbum(str(tmp_path)) as staging:
+        (tmp_path / os.path.basename(staging.directory) / '01 - a.mp3').write_bytes(b'a')
+        staging.publish(str(album_dir))
+
+    assert os.listdir(str(tmp_path)) == ['album']
+    assert os.listdir(str(album_dir)) == ['01 - a.mp3']
+
+
+def test_only_published_files_are_recorded_when_merging(tmp_path):
+    album_dir = tmp_path / 'album'
+    album_dir.mkdir()
+    (album_dir / '01 - a.mp3').write_bytes(b'old')
+    staging = StagedAlbum(str(tmp_path))
+    for name in ('01 - a.mp3', '02 - b.mp3'):
+        with open(os.path.join(staging.directory, name), 'wb') as f:
+            f.write(b'new')
+
+    assert staging.publish(str(album_dir), record_checksums=True) == ['01 - a.mp3']
+
+    assert read_checksums(str(album_dir)) == {'02 - b.mp3': hashlib.sha256(b'new').hexdigest()}
+    assert sorted(os.listdir(str(album_dir))) == [
+        '01 - a.mp3',
+        '02 - b.mp3',
+        os.path.basename(checksums_file(str(album_dir))),
+    ]
+
+
+def test_checksums_are_recorded_when_publishing_with_a_rename(tmp_path):
+    staging = StagedAlbum(str(tmp_path))
+    (tmp_path / os.path.basename(staging.directory) / '01 - a.mp3').write_bytes(b'a')
+    album_dir = tmp_path / 'album'
+
+    staging.publish(str(album_dir), record_checksums=True)
+
+    assert read_checksums(str(album_dir)) == {'01 - a.mp3': hashlib.sha256(b'a').hexdigest()}
@@ -0,0 +1,99 @@
+import os
+import shutil
+
+import pytest
+from mutagen.id3 import ID3
+
+from music_album_creation.audio_segmentation import AudioSegmenter
+from music_album_creation.audio_segmentation.loudness import Loudness, LoudnessMeter
+from music_album_creation.metadata import MetadataDealer
+
+EBUR128_SUMMARY = """size=     157KiB time=00:00:09.98 bitrate= 128.5kbits/s speed=31.4x
+[Parsed_ebur128_0 @ 0x7f2f2c001ac0] Summary:
+
+  Integrated loudness:
+    I:         -12.4 LUFS
+    Threshold: -22.6 LUFS
+
+  Loudness range:
+    LRA:         6.1 LU
+    Threshold: -32.7 LUFS
+    LRA low:   -16.2 LUFS
+    LRA high:  -10.1 LUFS
+
+  True peak:
+    Peak:       -0.5 dBFS
+[out#0/mp3 @ 0x1d93f740] video:0KiB audio:157KiB subtitle:0KiB other streams:0KiB
+"""
+
+
+def test_loudness_is_read_from_the_ebur128_summary():
+    loudness = Loudness.from_ebur128(EBUR128_SUMMARY)
+
+    assert loudness.integrated == -12.4
+    assert loudness.peak == pytest.approx(0.944061)
+    assert loudness.gain == pytest.approx(-5.6)
+    with pytest.raises(ValueError):
+        Loudness.from_ebur128('size=     157KiB time=00:00:09.98')
+
+
+def ebur128_log(*blocks):
+    """Get the stderr of ffmpeg measuring audio of the given (momentary) block loudness."""
+    frames = ''.join(
+        '[Parsed_ebur128_0 @ 0x7f2f2c001ac0] t: {:.1f}  TARGET:-23 LUFS    M:{:6.1f} '
+        'S:{:6.1f}     I: -12.4 LUFS       LRA:   6.1 LU  FTPK: -0.5 dBFS  TPK: -0.5 dBFS\n'.format(
+            0.1 * (i + 1), x, x
+        )
+        for i, x in enumerate(blocks)
+    )
+    return frames + EBUR128_SUMMARY
+
+
+def test_album_loudness_is_gated_over_the_blocks_of_all_tracks():
+    meter = LoudnessMeter()
+    meter.add('01 - a.mp3', ebur128_log(-120.7, -10.0, -10.0, -10.0))
+    meter.add('02 - b.mp3', ebur128_log(-30.0, -30.0, -30.0).replace('-0.5 dBFS', '-3.0 dBFS'))
+
+    album = meter.album()
+
+    # the blocks of the quiet track are gated out; the mean of the tracks' loudness would be
+    # 10 * log10((10^-1 + 10^-3) / 2) = -12.97
+    assert album.integrated == -10.0
+    assert album.peak == pytest.approx(0.944061)
+    assert LoudnessMeter().album() is None
+
+
+def test_album_loudness_gates_the_tracks_segmented(tmp_path, fake_ffmpeg):
+    fake_ffmpeg(
+        stderr=lambda output: ebur128_log(*[-10.0 if 'loud' in output else -30.0] * 20)
+    )
+    meter = LoudnessMeter()
+
+    AudioSegmenter(str(tmp_path), seek='output').segment(
+        'album.webm', (('01 - loud', '0', '10'), ('02 - quiet', '10', '20')), loudness=meter
+    )
+
+    assert sorted(os.path.basename(x) for x in meter.tracks) == [
+        '01 - loud.mp3',
+        '02 - quiet.mp3',
+    ]
+    assert meter.album().integrated == -10.0
+
+
+def test_replaygain_is_written_as_txxx_frames(tmp_path):
+    track_file = str(tmp_path / '01 - track.mp3')
+    shutil.copyfile(
+        os.path.join(os.path.dirname(__file__), 'data', 'album_0', '14 Yeah.mp3'), track_file
+    )
+
+    MetadataDealer.write_replaygain(
+        track_file, Loudness(-12.4, 0.944061), album_loudness=Loudness(-15.0, 0.98)
+    )
+
+    frames = {x.desc: x.text[0] for x in ID3(track_file).getall('TXXX')}
+    assert {k: v for k, v in frames.items() if k.startswith('REPLAYGAIN_')} == {
+        'REPLAYGAIN_TRACK_GAIN': '-5.60 dB',
+        'REPLAYGAIN_TRACK_PEAK': '0.944061',
+        'REPLAYGAIN_ALBUM_GAIN': '-3.00 dB',
+        'REPLAYGAIN_ALBUM_PEAK': '0.980000',
+    }
@@ -1,10 +1,13 @@
 """This module tests writting metadata to audio files . It tests both valid and invalid values for the 'year' (TDRC) field"""
 import os
+import shutil
 from glob import glob
 
 import pytest
 from mutagen.id3 import ID3
 
+from music_album_creation.create_album import _tag_album
+from music_album_creation.library import hash_file, read_checksums, write_checksums
 from music_album_creation.metadata import MetadataDealer as MD
 from music_album_creation.tracks_parsing import StringParser
 
@@ -77,3 +80,22 @@ def test_writting_album_metadata(year, test_album_dir, album_info, tags_from_fil
 
 def test_metadata_dealer_object(metadata):
     assert hasattr(metadata, '_filters')
+
+
+def test_retagging_an_album_updates_its_recorded_checksums(test_album_dir, tmp_path):
+    for file_path in glob(test_album_dir + '/*.mp3'):
+        shutil.copyfile(file_path, str(tmp_path / os.path.basename(file_path)))
+    untagged_digest = hash_file(str(tmp_path / '01 (Intro).mp3'))
+    write_checksums(str(tmp_path), {'01 (Intro).mp3': untagged_digest})
+
+    _tag_album(MD(), str(tmp_path), ['14 Yeah.mp3'], {'album': 'retagged'})
+
+    assert str(ID3(str(tmp_path / '01 (Intro).mp3')).get('TALB')) == 'retagged'
+    assert str(ID3(str(tmp_path / '03 - Monuments Burn Into Moments.mp3')).get('TALB')) == (
+        'retagged'
+    )
+    assert str(ID3(str(tmp_path / '14 Yeah.mp3')).get('TALB')) != 'retagged'
+    assert read_checksums(str(tmp_path)) != {'01 (Intro).mp3': untagged_digest}
+    assert read_checksums(str(tmp_path)) == {
+        '01 (Intro).mp3': hash_file(str(tmp_path / '01 (Intro).mp3'))
+    }
@@ -0,0 +1,81 @@
+import math
+import os
+import wave
+from array import array
+
+import mutagen
+import pytest
+
+from music_album_creation.audio_segmentation import (
+    AudioSegmenter,
+    OutputProfile,
+    SegmentationInformation,
+)
+
+RATE = 44100
+
+
+@pytest.fixture
+def album_file(tmp_path):
+    album = str(tmp_path / 'album.wav')
+    samples = array(
+        'h', (int(8000 * math.sin(2 * math.pi * 440 * i / RATE)) for i in range(12 * RATE))
+    )
+    with wave.open(album, 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(RATE)
+        f.writeframes(samples.tobytes())
+    return album
+
+
+def test_every_track_is_created_in_every_profile(tmp_path, album_file, fake_ffprobe):
+    fake_ffprobe(duration='12.0', format_name='wav', codec_name='pcm_s16le', channels=1)
+    profiles = [
+        OutputProfile('libmp3lame', '192k', 'mp3'),
+        OutputProfile('libopus', '96k', 'opus'),
+    ]
+    segmenter = AudioSegmenter(target_directory=str(tmp_path / 'tracks'))
+    data = SegmentationInformation([['01 - a', '0', '4.5'], ['02 - b', '4.5']])
+
+    tracks = segmenter.segment_profiles(album_file, data, profiles)
+
+    assert {x: [track.path for track in y] for x, y in tracks.items()} == {
+        profiles[0]: [
+            os.path.join(str(tmp_path / 'tracks'), 'mp3', '01 - a.mp3'),
+            os.path.join(str(tmp_path / 'tracks'), 'mp3', '02 - b.mp3'),
+        ],
+        profiles[1]: [
+            os.path.join(str(tmp_path / 'tracks'), 'opus', '01 - a.opus'),
+            os.path.join(str(tmp_path / 'tracks'), 'opus', '02 - b.opus'),
+        ],
+    }
+    for profile, profile_tracks in tracks.items():
+        assert [x.duration for x in profile_tracks] == [4.5, 7.5]
+        durations = [mutagen.File(x.path).info.length for x in profile_tracks]
+        assert durations == [pytest.approx(4.5, abs=0.1), pytest.approx(7.5, abs=0.1)]
+
+
+def test_profiles_must_have_unique_names(tmp_path, album_file):
+    segmenter = AudioSegmenter(target_directory=str(tmp_path))
+    data = SegmentationInformation([['01 - a', '0']])
+
+    with pytest.raises(ValueError):
+        segmenter.segment_profiles(
+            album_file,
+            data,
+            [OutputProfile('libmp3lame', '320k'), OutputProfile('libmp3lame', '128k')],
+        )
+
+
+def test_profiles_must_use_encoders_of_the_ffmpeg_binary(tmp_path, album_file):
+    segmenter = AudioSegmenter(target_directory=str(tmp_path))
+    data = SegmentationInformation([['01 - a', '0']])
+
+    with pytest.raises(ValueError, match="no 'libnonexistent' audio encoder"):
+        segmenter.segment_profiles(
+            album_file,
+            data,
+            [OutputProfile('libmp3lame', '320k'), OutputProfile('libnonexistent', name='x')],
+        )
+    assert not os.path.exists(tmp_path / 'mp3')
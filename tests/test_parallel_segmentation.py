@@ -0,0 +1,185 @@
+import asyncio
+import os
+import threading
+import time
+
+import pytest
+
+from music_album_creation.audio_segmentation import AudioSegmenter, album_segmentation
+from music_album_creation.audio_segmentation.album_segmentation import (
+    FfmpegCommandError,
+)
+
+SEGMENTATION = (
+    ('01 - short', '0', '10'),
+    ('02 - long', '10', '300'),
+    ('03 - medium', '300', '360'),
+    ('04 - last', '360'),
+)
+
+# 1 second of 16-bit stereo audio, sampled at 44100 Hz
+PCM_BYTES_PER_SECOND = 44100 * 2 * 2
+
+
+# stats line ffmpeg writes on stderr, on finishing a track
+FFMPEG_STATS = 'size=     940KiB time=00:01:00.00 bitrate= 128.3kbits/s speed=45.1x'
+
+
+def test_parallel_segmentation_returns_tracks_in_order(tmp_path, fake_ffmpeg):
+    fake = fake_ffmpeg(stderr=FFMPEG_STATS)
+    tracks = AudioSegmenter(str(tmp_path), seek='output').segment(
+        'album.webm', SEGMENTATION, workers=4
+    )
+    track_files = [x.path for x in tracks]
+    assert track_files == [str(tmp_path / '{}.mp3'.format(x[0])) for x in SEGMENTATION]
+    assert sorted(fake.tracks) == sorted(track_files)
+
+
+def test_tracks_are_described_without_probing_them(tmp_path, fake_ffmpeg):
+    fake_ffmpeg(stderr=FFMPEG_STATS)
+    tracks = AudioSegmenter(str(tmp_path), seek='output').segment(
+        'album.webm', SEGMENTATION, workers=2
+    )
+    # durations come from the plan, except for the last track: from the ffmpeg stats line
+    assert [(x.start, x.end, x.duration) for x in tracks] == [
+        (0, 10, 10),
+        (10, 300, 290),
+        (300, 360, 60),
+        (360, 420, 60),
+    ]
+    assert [x.size for x in tracks] == [os.path.getsize(x) for x in tracks]
+    assert os.path.basename(tracks[0]) == '01 - short.mp3'
+
+
+def test_longest_tracks_are_scheduled_first(tmp_path, fake_ffmpeg):
+    fake = fake_ffmpeg(stderr=FFMPEG_STATS)
+    AudioSegmenter(str(tmp_path), seek='output').segment('album.webm', SEGMENTATION, workers=2)
+    # the last track (of unknown duration) and the longest one are the first to start
+    assert set(fake.tracks[:2]) == {
+        str(tmp_path / '04 - last.mp3'),
+        str(tmp_path / '02 - long.mp3'),
+    }
+
+
+def test_failed_track_raises_with_ffmpeg_stderr(tmp_path, fake_ffmpeg):
+    fake_ffmpeg(fail_on='03 - medium')
+    with pytest.raises(FfmpegCommandError, match='Invalid data found when processing input'):
+        AudioSegmenter(str(tmp_path), seek='output').segment(
+            'album.webm', SEGMENTATION, workers=2
+        )
+
+
+def test_pool_raises_the_exception_of_the_job_that_failed_first(monkeypatch):
+    from concurrent.futures import wait
+
+    def late_wait(futures, **kwargs):  # ie the pool is checked after both jobs failed
+        wait(futures)
+        return wait(futures, **kwargs)
+
+    monkeypatch.setattr(album_segmentation, 'wait', late_wait)
+    second_failed = threading.Event()
+
+    def job(name):
+        if name == 'first':
+            second_failed.wait(5)
+            time.sleep(0.05)
+            raise RuntimeError('first')
+        try:
+            raise RuntimeError('second')
+        finally:
+            second_failed.set()
+
+    with pytest.raises(RuntimeError, match='second'):
+        album_segmentation._run_in_pool(job, ['first', 'second'], 2)
+
+
+def test_pool_raises_even_if_done_callbacks_run_late(monkeypatch):
+    from concurrent.futures import Future
+
+    invoke_callbacks = Future._invoke_callbacks
+
+    def late_invoke_callbacks(future):  # waiters are woken up before callbacks run
+        time.sleep(0.1)
+        invoke_callbacks(future)
+
+    monkeypatch.setattr(Future, '_invoke_callbacks', late_invoke_callbacks)
+
+    def job(name):
+        time.sleep(0.05)  # fail once the pool waits for the jobs
+        raise RuntimeError(name)
+
+    with pytest.raises(RuntimeError, match='only'):
+        album_segmentation._run_in_pool(job, ['only'], 2)
+
+
+def test_async_segmentation_returns_tracks_in_order(tmp_path, fake_ffmpeg):
+    fake = fake_ffmpeg(stderr=FFMPEG_STATS)
+    segmenter = AudioSegmenter(str(tmp_path), seek='output')
+    tracks = asyncio.run(segmenter.segment_async('album.webm', SEGMENTATION, concurrency=2))
+
+    # the same results as segmenting synchronously
+    assert tracks == segmenter.segment('album.webm', SEGMENTATION, workers=2)
+    track_files = [x.path for x in tracks]
+    assert track_files == [str(tmp_path / '{}.mp3'.format(x[0])) for x in SEGMENTATION]
+    assert sorted(fake.tracks[:4]) == sorted(track_files)
+    assert tracks[-1].duration == 60
+
+
+def test_async_failed_track_raises_with_ffmpeg_stderr(tmp_path, fake_ffmpeg):
+    fake_ffmpeg(fail_on='01 - short')
+    with pytest.raises(FfmpegCommandError, match='Invalid data found when processing input'):
+        asyncio.run(
+            AudioSegmenter(str(tmp_path), seek='output').segment_async(
+                'album.webm', SEGMENTATION
+            )
+        )
+
+
+def test_decode_once_feeds_encoders_with_track_sample_ranges(
+    tmp_path, fake_ffmpeg, fake_ffprobe
+):
+    fake = fake_ffmpeg()
+    fake_ffprobe(codec_name='aac', sample_rate=44100, channels=2)
+    segmentation = (
+        ('01 - first', '0', '10'),
+        ('02 - second', '10', '45'),
+        ('03 - last', '45'),
+    )
+
+    tracks = AudioSegmenter(str(tmp_path)).segment_decode_once(
+        'album.webm', segmentation, workers=2
+    )
+    track_files = [x.path for x in tracks]
+
+    assert track_files == [str(tmp_path / '{}.mp3'.format(x[0])) for x in segmentation]
+    assert [len(fake.inputs[x]) for x in track_files] == [
+        PCM_BYTES_PER_SECOND * 10,
+        PCM_BYTES_PER_SECOND * 35,
+        PCM_BYTES_PER_SECOND * 15,
+    ]
+    # the duration of the last track is that of its samples, without probing the album
+    assert [x.duration for x in tracks] == [10, 35, 15]
+    # the scratch PCM file is removed
+    assert sorted(tmp_path.iterdir()) == [
+        tmp_path / '{}.mp3'.format(x[0]) for x in segmentation
+    ]
+
+
+def test_decode_once_raises_the_error_of_a_failing_encoder(
+    tmp_path, fake_ffmpeg, fake_ffprobe, monkeypatch
+):
+    fake = fake_ffmpeg()
+    fake_ffprobe(codec_name='aac', sample_rate=44100, channels=2)
+
+    def ffmpeg(*args, **kwargs):
+        if 'input' in kwargs:  # the traceback keeps the track's PCM (a slice of the mmap)
+            raise OSError("Cannot run ffmpeg")
+        return fake(*args, **kwargs)
+
+    monkeypatch.setattr(album_segmentation, 'ffmpeg', ffmpeg)
+
+    with pytest.raises(OSError, match="Cannot run ffmpeg"):
+        AudioSegmenter(str(tmp_path)).segment_decode_once(
+            'album.webm', (('01 - first', '0', '10'), ('02 - last', '10')), workers=2
+        )
+    assert list(tmp_path.iterdir()) == []  # the scratch PCM file is removed
@@ -0,0 +1,165 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from music_album_creation.ffmpeg import FFMPEG, FFProbe, ProcessScheduler
+from music_album_creation.ffmpeg.scheduler import CPU, IO
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def test_work_of_each_kind_is_limited_independently():
+    scheduler = ProcessScheduler(cpu_limit=2, io_limit=3)
+    running = {CPU: 0, IO: 0}
+    most = {CPU: 0, IO: 0}
+    lock = threading.Lock()
+
+    def work(kind):
+        with scheduler.slot(kind):
+            with lock:
+                running[kind] += 1
+                most[kind] = max(most[kind], running[kind])
+            time.sleep(0.02)
+            with lock:
+                running[kind] -= 1
+
+    threads = [threading.Thread(target=work, args=(x,)) for x in [CPU, IO] * 8]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert most == {CPU: 2, IO: 3}
+    stats = scheduler.stats()
+    assert stats[CPU]['running'] == stats[IO]['running'] == 0
+    assert stats[CPU]['queued'] == 0
+    assert 0 < stats[CPU]['max_queued'] <= 6
+
+
+def test_queued_work_starts_by_priority_then_arrival():
+    scheduler = ProcessScheduler(cpu_limit=1)
+    started = []
+    blocker = scheduler.slot(CPU)
+    blocker.__enter__()
+
+    def work(name, priority):
+        with scheduler.slot(CPU, priority):
+            started.append(name)
+
+    threads = []
+    for name, priority in [('low', -1), ('first', 0), ('urgent', 5), ('second', 0)]:
+        threads.append(threading.Thread(target=work, args=(name, priority)))
+        threads[-1].start()
+        wait_for(lambda: scheduler.queue_depth(CPU) == len(threads))
+    assert scheduler.queue_depth() == 4
+
+    blocker.__exit__(None, None, None)
+    for thread in threads:
+        thread.join()
+
+    assert started == ['urgent', 'first', 'second', 'low']
+
+
+def test_cancelled_async_work_gives_up_its_place_in_the_queue():
+    scheduler = ProcessScheduler(cpu_limit=1)
+
+    async def main():
+        async with scheduler.slot_async(CPU):
+            task = asyncio.ensure_future(scheduler.slot_async(CPU).__aenter__())
+            await asyncio.sleep(0.01)
+            assert scheduler.queue_depth(CPU) == 1
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            assert scheduler.queue_depth(CPU) == 0
+        async with scheduler.slot_async(CPU):
+            assert scheduler.running(CPU) == 1
+
+    asyncio.run(main())
+    assert scheduler.running(CPU) == 0
+
+
+def test_raising_the_limit_starts_queued_work():
+    scheduler = ProcessScheduler(cpu_limit=1)
+    blocker = scheduler.slot(CPU)
+    blocker.__enter__()
+    done = threading.Event()
+
+    def work():
+        with scheduler.slot(CPU):
+            done.set()
+
+    thread = threading.Thread(target=work)
+    thread.start()
+    wait_for(lambda: scheduler.queue_depth(CPU) == 1)
+    scheduler.set_limit(CPU, 2)
+    assert done.wait(5)
+    thread.join()
+    blocker.__exit__(None, None, None)
+
+
+def test_binaries_are_no_longer_fixed_by_the_first_instance():
+    scheduler = ProcessScheduler()
+    assert FFMPEG('ffmpeg-a').ffmpeg_binary == 'ffmpeg-a'
+    assert FFMPEG('ffmpeg-b', scheduler).ffmpeg_binary == 'ffmpeg-b'
+    assert FFMPEG('ffmpeg-b', scheduler).scheduler is scheduler
+    assert FFProbe('ffprobe-a').ffprobe_binary == 'ffprobe-a'
+    assert FFProbe('ffprobe-b').ffprobe_binary == 'ffprobe-b'
+
+
+def test_chained_streaming_commands_share_a_single_slot():
+    import sys
+
+    from music_album_creation.ffmpeg.run_cli import StreamingCommand
+
+    scheduler = ProcessScheduler(cpu_limit=1)
+    producer = StreamingCommand(
+        sys.executable,
+        '-c',
+        'import sys; sys.stdout.buffer.write(bytes(100000))',
+        slot=scheduler.slot(CPU),
+    )
+    consumer = StreamingCommand(
+        sys.executable,
+        '-c',
+        'import sys; sys.stdout.buffer.write(sys.stdin.buffer.read())',
+        input=producer,
+        slot=scheduler.slot(CPU),
+    )
+    output = []
+    thread = threading.Thread(target=lambda: output.append(b''.join(consumer)), daemon=True)
+    thread.start()
+    thread.join(10)
+
+    assert not thread.is_alive(), "chained commands deadlocked"
+    assert output == [bytes(100000)]
+    assert scheduler.running(CPU) == 0
+
+
+def test_chained_ffmpeg_stages_run_with_a_single_cpu_slot():
+    import shutil
+
+    if shutil.which('ffmpeg') is None:
+        pytest.skip("ffmpeg is not installed")
+    ffmpeg = FFMPEG('ffmpeg', ProcessScheduler(cpu_limit=1))
+    decoded = ffmpeg.iter_stdout(
+        '-f', 'lavfi', '-i', 'sine=duration=1', '-f', 's16le', '-ac', '1', 'pipe:1'
+    )  # fmt: skip
+    encoded = ffmpeg.iter_stdout(
+        '-f', 's16le', '-ar', '44100', '-ac', '1', '-i', 'pipe:0', '-f', 'wav', 'pipe:1',
+        input=decoded,
+    )  # fmt: skip
+    output = []
+    thread = threading.Thread(target=lambda: output.append(b''.join(encoded)), daemon=True)
+    thread.start()
+    thread.join(20)
+
+    assert not thread.is_alive(), "chained ffmpeg stages deadlocked"
+    assert output[0][:4] == b'RIFF'
@@ -0,0 +1,61 @@
+import io
+import sys
+
+import pytest
+
+from music_album_creation.audio_segmentation.progress import (
+    ProgressEvent,
+    ProgressParser,
+)
+from music_album_creation.create_album import main
+
+FFMPEG_PROGRESS_OUTPUT = """bitrate=N/A
+total_size=0
+out_time_us=N/A
+out_time_ms=N/A
+speed=N/A
+progress=continue
+bitrate= 128.0kbits/s
+total_size=262188
+out_time_us=16368980
+out_time_ms=16368980
+out_time=00:00:16.368980
+speed=8.18x
+progress=continue
+total_size=640301
+out_time_us=40007000
+out_time_ms=40007000
+speed=9.96x
+progress=end
+"""
+
+
+def test_progress_lines_are_parsed_into_events():
+    events = []
+    parser = ProgressParser(2, '03 - track.mp3', 40.0, events.append)
+
+    for line in FFMPEG_PROGRESS_OUTPUT.splitlines():
+        parser(line)
+
+    assert events == [
+        ProgressEvent(2, '03 - track.mp3', 0.0, duration=40.0, speed=None, done=False),
+        ProgressEvent(2, '03 - track.mp3', 16.36898, duration=40.0, speed=8.18, done=False),
+        ProgressEvent(2, '03 - track.mp3', 40.007, duration=40.0, speed=9.96, done=True),
+    ]
+    assert events[0].eta is None
+    assert events[1].eta == pytest.approx((40.0 - 16.36898) / 8.18)
+    assert events[2].eta == 0
+
+
+def test_eta_is_unknown_without_track_duration():
+    assert ProgressEvent(0, '01 - track.mp3', 10.0, duration=None, speed=2.0).eta is None
+
+
+@pytest.mark.parametrize('terminal', [True, False])
+def test_progress_bar_is_rendered_by_default_only_on_a_terminal(monkeypatch, terminal):
+    monkeypatch.setattr(sys, 'stderr', io.StringIO())
+    monkeypatch.setattr(sys.stderr, 'isatty', lambda: terminal)
+
+    assert main.make_context('create-album', []).params['progress'] is terminal
+    assert main.make_context('create-album', ['--progress']).params['progress'] is True
+    assert main.make_context('create-album', ['--no-progress']).params['progress'] is False
@@ -0,0 +1,90 @@
+import json
+import sys
+
+import pytest
+
+from music_album_creation.ffmpeg.accounting import UsageLedger
+from music_album_creation.ffmpeg.ffmpeg.ffmpeg_proxy import FFMPEGProxy
+from music_album_creation.ffmpeg.run_cli import (
+    ResourceUsage,
+    execute_command_in_subprocess,
+    execute_command_streaming_stdout,
+)
+
+BUSY_CHILD = 'x = bytearray(64 * 1024 * 1024); sum(range(2000000))'
+
+
+@pytest.mark.skipif(sys.platform == 'win32', reason="no os.wait4 on Windows")
+@pytest.mark.parametrize(
+    'execute',
+    [
+        execute_command_in_subprocess,
+        lambda *args: execute_command_streaming_stdout(*args, on_stdout_line=print),
+    ],
+)
+def test_resources_used_by_the_subprocess_are_recorded(execute):
+    result = execute(sys.executable, '-c', BUSY_CHILD)
+
+    assert result.exit_code == 0
+    assert 0 < result.usage.user_time + result.usage.system_time
+    assert result.usage.user_time + result.usage.system_time <= 2 * result.usage.wall_time
+    assert 64 * 1024 * 1024 < result.usage.max_rss
+
+
+@pytest.mark.skipif(sys.platform == 'win32', reason="no signals on Windows")
+def test_exit_status_of_a_killed_subprocess_is_recorded():
+    result = execute_command_in_subprocess(
+        sys.executable, '-c', 'import os, signal; os.kill(os.getpid(), signal.SIGKILL)'
+    )
+
+    assert result.exit_code == -9
+    assert result.usage.user_time is not None
+
+
+def test_subprocess_exceeding_its_timeout_is_killed():
+    import subprocess
+
+    with pytest.raises(subprocess.TimeoutExpired):
+        execute_command_in_subprocess(
+            sys.executable, '-c', 'import time; time.sleep(60)', timeout=0.2
+        )
+
+
+class FakeSubject:
+    def __init__(self, usage):
+        self.usage = usage
+        self.calls = []
+
+    def __call__(self, *args, **kwargs):
+        self.calls.append((args, kwargs))
+        return type('CLIResult', (), {'exit_code': 0, 'usage': self.usage})
+
+
+def test_ffmpeg_proxy_aggregates_usage_per_stage(monkeypatch):
+    monkeypatch.setattr(FFMPEGProxy, 'usage', UsageLedger())
+    subject = FakeSubject(ResourceUsage(2.0, 1.5, 0.25, 1000))
+    ffmpeg = FFMPEGProxy(subject)
+
+    ffmpeg('-i', 'album.webm', 'track1.mp3', stage='segment')
+    ffmpeg('-i', 'album.webm', 'track2.mp3', stage='segment')
+    subject.usage = ResourceUsage(1.0, None, None, None)  # ie an asyncio subprocess
+    ffmpeg('-i', 'album.webm', 'track3.mp3', stage='segment')
+    subject.usage = ResourceUsage(0.5, 0.5, 0.0, 3000)
+    ffmpeg('-version')
+
+    # the stage is not passed on to the subprocess
+    assert all(kwargs == {} for _, kwargs in subject.calls)
+    costs = ffmpeg.usage.breakdown()
+    assert list(costs) == ['segment', 'ffmpeg']
+    assert costs['segment'].calls == 3
+    assert costs['segment'].wall_time == 5.0
+    assert costs['segment'].cpu_time == 3.5
+    assert costs['segment'].max_rss == 1000
+    assert json.loads(json.dumps(ffmpeg.usage.as_dict()))['ffmpeg'] == {
+        'calls': 1,
+        'wall_time': 0.5,
+        'user_time': 0.5,
+        'system_time': 0.0,
+        'max_rss': 3000,
+    }
+    assert ffmpeg.usage.report().splitlines()[0].startswith('segment: 3 calls, 5.00s wall')
@@ -0,0 +1,213 @@
+import asyncio
+import sys
+
+from music_album_creation.ffmpeg.run_cli import (
+    execute_command_in_subprocess,
+    execute_command_in_subprocess_async,
+)
+
+
+def test_async_execution_matches_sync_execution():
+    cli_args = ('-c', 'import sys; print("out"); print("err", file=sys.stderr); sys.exit(3)')
+
+    sync_result = execute_command_in_subprocess(sys.executable, *cli_args)
+    async_result = asyncio.run(execute_command_in_subprocess_async(sys.executable, *cli_args))
+
+    assert async_result.exit_code == sync_result.exit_code == 3
+    assert async_result.stdout == sync_result.stdout
+    assert async_result.stderr == sync_result.stderr
+
+
+def test_cancelling_async_execution_terminates_the_subprocess(monkeypatch):
+    processes = []
+    create_subprocess_exec = asyncio.create_subprocess_exec
+
+    async def recording_create_subprocess_exec(*args, **kwargs):
+        processes.append(await create_subprocess_exec(*args, **kwargs))
+        return processes[-1]
+
+    monkeypatch.setattr(asyncio, 'create_subprocess_exec', recording_create_subprocess_exec)
+
+    async def run_and_cancel():
+        task = asyncio.ensure_future(
+            execute_command_in_subprocess_async(
+                sys.executable, '-c', 'import time; time.sleep(60)'
+            )
+        )
+        while not processes:
+            await asyncio.sleep(0.01)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    asyncio.run(run_and_cancel())
+
+    assert processes[0].returncode is not None
+
+
+def test_streaming_execution_hands_stdout_lines_and_bounds_stderr():
+    from music_album_creation.ffmpeg.run_cli import (
+        STDERR_TAIL_LINES,
+        execute_command_streaming_stdout,
+    )
+
+    lines = []
+    result = execute_command_streaming_stdout(
+        sys.executable,
+        '-c',
+        'import sys\n'
+        'for i in range(3): print("progress=%d" % i, flush=True)\n'
+        'for i in range(5000): print("noise %d" % i, file=sys.stderr)\n'
+        'sys.exit(1)',
+        on_stdout_line=lines.append,
+    )
+
+    assert lines == ['progress=0', 'progress=1', 'progress=2']
+    assert result.exit_code == 1
+    assert result.stdout == ''
+    stderr_lines = result.stderr.splitlines()
+    assert len(stderr_lines) == STDERR_TAIL_LINES
+    assert stderr_lines[-1] == 'noise 4999'
+
+
+def test_streaming_command_iterates_over_stdout_chunks():
+    from music_album_creation.ffmpeg.run_cli import StreamingCommand
+
+    command = StreamingCommand(
+        sys.executable,
+        '-c',
+        'import sys; sys.stdout.buffer.write(bytes(range(256)) * 40)',
+        chunk_size=4096,
+    )
+    chunks = list(command)
+
+    assert [len(x) for x in chunks] == [4096, 4096, 2048]
+    assert b''.join(chunks) == bytes(range(256)) * 40
+    assert command.result.exit_code == 0
+
+
+def test_stopping_iteration_kills_the_streaming_subprocess():
+    from music_album_creation.ffmpeg.run_cli import StreamingCommand
+
+    command = StreamingCommand(
+        sys.executable,
+        '-c',
+        'import sys, time\n'
+        'sys.stdout.write("first\\n"); sys.stdout.flush()\n'
+        'time.sleep(60)',
+    )
+    lines = command.lines()
+    assert next(lines) == 'first'
+    lines.close()
+
+    assert command.result is None  # killed, not finished
+
+
+def test_streaming_keeps_a_bounded_tail_of_unterminated_stderr():
+    from music_album_creation.ffmpeg.run_cli import STDERR_TAIL_BYTES, StreamingCommand
+
+    # like ffmpeg's stats line, rewritten with carriage returns and never ended
+    command = StreamingCommand(
+        sys.executable,
+        '-c',
+        'import sys\n'
+        'for i in range(20000): sys.stderr.write("size=%06d \\u00e9 speed=1.0x\\r" % i)\n'
+        'sys.stderr.write("\\nError: done\\n")',
+    )
+    assert list(command) == []
+
+    stderr = command.result.stderr
+    assert len(stderr.encode('utf-8')) <= STDERR_TAIL_BYTES
+    assert stderr.startswith('size=')
+    assert stderr.endswith('size=019999 é speed=1.0x\r\nError: done\n')
+
+
+# echoes stdin to stdout, in chunks, as it is read
+ECHO_STDIN = (
+    'import sys\n'
+    'for chunk in iter(lambda: sys.stdin.buffer.read1(4096), b""):\n'
+    '    sys.stdout.buffer.write(chunk); sys.stdout.buffer.flush()'
+)
+
+
+def test_streaming_command_pipes_input_through_the_subprocess():
+    import io
+
+    from music_album_creation.ffmpeg.run_cli import StreamingCommand
+
+    data = bytes(range(256)) * 1000
+    for source in (
+        data,
+        io.BytesIO(data),
+        (data[i : i + 1000] for i in range(0, len(data), 1000)),
+    ):
+        command = StreamingCommand(sys.executable, '-c', ECHO_STDIN, input=source)
+        assert b''.join(command) == data
+        assert command.result.exit_code == 0
+
+
+def test_input_is_written_only_as_fast_as_the_subprocess_reads_it():
+    import time
+
+    from music_album_creation.ffmpeg.run_cli import StreamingCommand
+
+    produced = []
+
+    def source():  # 64 MB, far more than the pipes can hold
+        for i in range(1024):
+            produced.append(i)
+            yield bytes(65536)
+
+    command = StreamingCommand(sys.executable, '-c', ECHO_STDIN, input=source())
+    chunks = iter(command)
+    size = len(next(chunks))
+    time.sleep(0.2)
+    assert len(produced) < 64  # the writer blocks, while stdout is not consumed
+
+    size += sum(len(x) for x in chunks)
+    assert size == 1024 * 65536
+    assert command.result.exit_code == 0
+
+
+def test_failing_input_kills_the_subprocess_and_raises():
+    import pytest
+
+    from music_album_creation.ffmpeg.run_cli import StreamingCommand
+
+    def source():
+        yield b'some audio'
+        raise ConnectionError("download interrupted")
+
+    command = StreamingCommand(
+        sys.executable,
+        '-c',
+        'import sys, time; sys.stdin.read(); time.sleep(60)',
+        input=source(),
+    )
+    with pytest.raises(ConnectionError, match="download interrupted"):
+        list(command)
+    assert command.result is None
+
+
+def test_ffmpeg_encodes_audio_piped_from_memory():
+    import shutil
+
+    import pytest
+
+    from music_album_creation.ffmpeg import FFMPEG
+
+    if shutil.which('ffmpeg') is None:
+        pytest.skip("ffmpeg is not installed")
+    pcm = bytes(44100 * 2 * 2)  # a second of silence; 16-bit stereo at 44.1 kHz
+    command = FFMPEG('ffmpeg').iter_stdout(
+        '-f', 's16le', '-ar', '44100', '-ac', '2', '-i', 'pipe:0',
+        '-f', 'wav', 'pipe:1',
+        input=(pcm[i : i + 8192] for i in range(0, len(pcm), 8192)),
+    )  # fmt: skip
+    wav = b''.join(command)
+
+    assert command.result.exit_code == 0
+    assert wav[:4] == b'RIFF' and wav[8:12] == b'WAVE'
+    assert len(wav) >= len(pcm)
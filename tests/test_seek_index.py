@@ -0,0 +1,71 @@
+import os
+
+import pytest
+
+from music_album_creation.audio_segmentation import AudioSegmenter
+from music_album_creation.audio_segmentation.seek_index import SeekIndex
+
+# (timestamp, byte position) of the key packets of a fake mp3 file; 1 packet per 0.5 seconds
+PACKETS = [(i * 0.5, 1000 + i * 800) for i in range(120)]
+
+
+@pytest.fixture
+def album_file(tmp_path, monkeypatch):
+    monkeypatch.setenv('MUSIC_CACHE_DIR', str(tmp_path / 'cache'))
+    album = tmp_path / 'album.mp3'
+    album.write_bytes(b'\0' * 96000)
+    return album
+
+
+@pytest.mark.parametrize(
+    'seconds, expected_timestamp, expected_position',
+    [
+        (0, 0.0, 1000),
+        (10.2, 10.0, 1000 + 20 * 800),
+        (10.3, 10.5, 1000 + 21 * 800),
+        (1000, 59.5, 1000 + 119 * 800),
+    ],
+)
+def test_seek_index_snaps_to_nearest_packet(seconds, expected_timestamp, expected_position):
+    index = SeekIndex.from_packets(reversed(PACKETS))
+    assert index.snap(seconds) == expected_timestamp
+    assert index.position(seconds) == expected_position
+
+
+def test_seek_index_is_probed_once_and_cached_on_disk(album_file, fake_ffprobe):
+    ffprobe_client = fake_ffprobe(packets=PACKETS)
+
+    index = SeekIndex.build(album_file, ffprobe_client)
+    cached_index = SeekIndex.build(album_file, ffprobe_client)
+
+    assert ffprobe_client.probed_packets == 1
+    assert len(cached_index) == len(index) == len(PACKETS)
+    assert cached_index.position(30) == index.position(30)
+
+    # a modified album file gets re-indexed
+    os.utime(album_file, ns=(0, 0))
+    SeekIndex.build(album_file, ffprobe_client)
+    assert ffprobe_client.probed_packets == 2
+
+
+def test_segmenting_with_seek_index_seeks_by_byte_offset(
+    album_file, fake_ffmpeg, fake_ffprobe
+):
+    ffmpeg_calls = fake_ffmpeg().calls
+    fake_ffprobe(format_name='mp3', codec_name='mp3', packets=PACKETS)
+
+    segmenter = AudioSegmenter(str(album_file.parent), seek='input', seek_index=True)
+    segmenter.segment(
+        str(album_file), (('01 - a', '0', '10.2'), ('02 - b', '10.2')), workers=1
+    )
+
+    assert ffmpeg_calls[0][:6] == (
+        '-y',
+        '-skip_initial_bytes',
+        '1000',
+        '-i',
+        str(album_file),
+        '-t',
+    )
+    assert ffmpeg_calls[0][6] == '10.000'
+    assert ffmpeg_calls[1][:3] == ('-y', '-skip_initial_bytes', str(1000 + 20 * 800))
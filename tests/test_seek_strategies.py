@@ -0,0 +1,94 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from music_album_creation.audio_segmentation import AudioSegmenter
+from music_album_creation.ffmpeg import FFMPEG, FFProbe
+from music_album_creation.ffprobe_client import FFProbeClient
+
+WEBM_FILE = Path(__file__).parent / 'data' / 'Burning.webm'
+
+SEGMENTATION = (
+    ('1 - track1', '0', '10'),
+    ('2 - track2', '10', '15'),
+    ('3 - track3', '15', '40'),
+    ('4 - track4', '40'),
+)
+
+
+@pytest.fixture(scope='module')
+def ffprobe_client():
+    return FFProbeClient(FFProbe(os.environ.get('MUSIC_FFPROBE', 'ffprobe')))
+
+
+# sample rate (Hz) the start of each track is decoded at, to compare the tracks' starts
+RATE = 8000
+
+
+@pytest.fixture(scope='module')
+def output_seek_tracks(tmp_path_factory):
+    segmenter = AudioSegmenter(str(tmp_path_factory.mktemp('output_seek')), seek='output')
+    return segmenter.segment(str(WEBM_FILE), SEGMENTATION)
+
+
+def _first_samples(np, track_file, seconds=1):
+    """Decode the start of a track to mono PCM, at RATE."""
+    ffmpeg = FFMPEG(os.environ.get('MUSIC_FFMPEG', 'ffmpeg'))
+    pcm = b''.join(
+        ffmpeg.iter_stdout(
+            '-i', str(track_file), '-t', str(seconds),
+            '-ac', '1', '-ar', str(RATE), '-f', 's16le', 'pipe:1',
+        )
+    )  # fmt: skip
+    return np.frombuffer(pcm, dtype='<i2').astype(np.float64)
+
+
+def _lag(np, samples, reference) -> float:
+    """Get the seconds by which the samples lag behind the reference samples."""
+    correlation = np.correlate(samples, reference, mode='full')
+    return (int(np.argmax(correlation)) - (len(reference) - 1)) / RATE
+
+
+def test_unknown_seek_strategy_is_rejected():
+    with pytest.raises(ValueError, match="Seek strategy 'backwards' is not one of"):
+        AudioSegmenter(seek='backwards')
+
+
+@pytest.mark.parametrize(
+    'last_track_start, expected_strategy',
+    [
+        ('40', 'output'),
+        ('3600', 'input'),
+    ],
+)
+def test_auto_seek_strategy_is_fast_for_long_albums(last_track_start, expected_strategy):
+    data = (('1 - track1', '0', last_track_start), ('2 - track2', last_track_start))
+    assert AudioSegmenter(seek='auto')._seek_strategy(data) == expected_strategy
+
+
+@pytest.mark.parametrize('seek', ['input', 'hybrid'])
+def test_fast_seeking_preserves_track_boundaries(
+    seek, tmp_path_factory, ffprobe_client, output_seek_tracks
+):
+    np = pytest.importorskip('numpy')
+    segmenter = AudioSegmenter(str(tmp_path_factory.mktemp(seek)), seek=seek)
+
+    track_files = segmenter.segment(str(WEBM_FILE), SEGMENTATION)
+
+    assert [os.path.basename(x) for x in track_files] == [
+        '{}.mp3'.format(x[0]) for x in SEGMENTATION
+    ]
+    durations, output_seek_durations = (
+        [float(ffprobe_client.get_stream_info(x)['format']['duration']) for x in tracks]
+        for tracks in (track_files, output_seek_tracks)
+    )
+    # boundaries found by seeking on the input are within one mp3 frame (~26ms) of the
+    # boundaries found by decoding from the start of the album (previous behaviour)
+    assert all(abs(x - y) < 0.03 for x, y in zip(durations, output_seek_durations))
+    # and so are the tracks' starts: the same audio, shifted by less than a frame
+    for track_file, reference_file in zip(track_files, output_seek_tracks):
+        samples = _first_samples(np, track_file)
+        reference = _first_samples(np, reference_file)
+        assert len(samples) == len(reference) == RATE
+        assert abs(_lag(np, samples, reference)) < 0.03
@@ -0,0 +1,107 @@
+import os
+
+import pytest
+
+from music_album_creation.audio_segmentation import AudioSegmenter, SegmentationCache
+
+SEGMENTATION = (('01 - first', '0', '10'), ('02 - second', '10', '25'), ('03 - last', '25'))
+
+
+@pytest.fixture
+def ffmpeg_calls(fake_ffmpeg, fake_ffprobe):
+    """Fake ffmpeg, writing the ffmpeg arguments as the content of each output track."""
+    fake_ffprobe(duration='40.0')
+    return fake_ffmpeg().calls
+
+
+@pytest.fixture
+def album_file(tmp_path):
+    album = tmp_path / 'album.webm'
+    album.write_bytes(b'album audio stream')
+    return str(album)
+
+
+def test_repeated_segmentation_materialises_tracks_from_cache(
+    tmp_path, album_file, ffmpeg_calls
+):
+    cache = SegmentationCache(str(tmp_path / 'cache'))
+    first_run = AudioSegmenter(str(tmp_path / 'run1'), seek='output', cache=cache)
+    second_run = AudioSegmenter(str(tmp_path / 'run2'), seek='output', cache=cache)
+    os.mkdir(first_run.target_directory)
+    os.mkdir(second_run.target_directory)
+
+    first_tracks = first_run.segment(album_file, SEGMENTATION, workers=1)
+    assert len(ffmpeg_calls) == 3
+
+    second_tracks = second_run.segment(album_file, SEGMENTATION, workers=1)
+    assert len(ffmpeg_calls) == 3
+    for first_track, second_track in zip(first_tracks, second_tracks):
+        with open(first_track) as f1, open(second_track) as f2:
+            assert f1.read() == f2.read()
+
+
+def test_changed_span_or_settings_miss_the_cache(tmp_path, album_file, ffmpeg_calls):
+    cache = SegmentationCache(str(tmp_path / 'cache'))
+    AudioSegmenter(str(tmp_path), seek='output', cache=cache).segment(
+        album_file, SEGMENTATION, workers=1
+    )
+    AudioSegmenter(str(tmp_path), seek='output', cache=cache).segment(
+        album_file,
+        (('01 - first', '0', '10'), ('02 - second', '10', '26'), ('03 - last', '26')),
+        workers=1,
+    )
+    assert len(ffmpeg_calls) == 5
+
+    AudioSegmenter(str(tmp_path), seek='input', cache=cache).segment(
+        album_file, SEGMENTATION, workers=1
+    )
+    assert len(ffmpeg_calls) == 8
+
+
+def test_cache_evicts_least_recently_used_tracks(tmp_path):
+    cache = SegmentationCache(str(tmp_path / 'cache'), max_bytes=250)
+    for i, key in enumerate(('a', 'b', 'c')):
+        track = tmp_path / '{}.mp3'.format(key)
+        track.write_bytes(b'\0' * 100)
+        cache.put(key, str(track))
+        os.utime(os.path.join(cache.directory, key), (i, i))
+    assert cache.get('a', str(tmp_path / 'materialised.mp3'))  # 'a' becomes the most recent
+
+    cache.evict()
+
+    assert sorted(x for x in os.listdir(cache.directory) if not x.startswith('album')) == [
+        'a',
+        'c',
+    ]
+
+
+def test_tracks_are_stored_in_the_cache_as_hardlinks(tmp_path):
+    cache = SegmentationCache(str(tmp_path / 'cache'))
+    track = tmp_path / 'track.mp3'
+    track.write_bytes(b'track audio')
+
+    cache.put('a', str(track))
+
+    assert os.stat(os.path.join(cache.directory, 'a')).st_ino == os.stat(str(track)).st_ino
+    assert [x for x in os.listdir(cache.directory) if x.startswith('.')] == []
+
+
+def test_tracks_materialised_from_cache_report_their_progress(
+    tmp_path, album_file, ffmpeg_calls
+):
+    cache = SegmentationCache(str(tmp_path / 'cache'))
+    AudioSegmenter(str(tmp_path), seek='output', cache=cache).segment(
+        album_file, SEGMENTATION, workers=1
+    )
+    events = []
+
+    AudioSegmenter(str(tmp_path), seek='output', cache=cache).segment(
+        album_file, SEGMENTATION, workers=1, progress=events.append
+    )
+
+    assert len(ffmpeg_calls) == 3
+    assert [(x.track_index, x.processed, x.done) for x in events] == [
+        (0, 10.0, True),
+        (1, 15.0, True),
+        (2, 15.0, True),
+    ]
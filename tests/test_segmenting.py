@@ -119,3 +119,29 @@ class TestSegmenting:
             < 1
             for x in zip(file_names, durations)
         ]
+
+    def test_single_pass_segmentation_matches_per_track_segmentation(
+        self, tmpdir, test_audio_file_path
+    ):
+        segmentation_info = SegmentationInformation.from_multiline(
+            "1. tr1 - 0:00\n2. tr2 - 1:12\n3. tr3 - 2:00", 'timestamps'
+        )
+        per_track_segmenter = AudioSegmenter(str(tmpdir.mkdir('per_track')))
+        single_pass_segmenter = AudioSegmenter(str(tmpdir.mkdir('single_pass')))
+
+        per_track_files = per_track_segmenter.segment(test_audio_file_path, segmentation_info)
+        single_pass_files = single_pass_segmenter.segment_single_pass(
+            test_audio_file_path, segmentation_info
+        )
+
+        assert [os.path.basename(x) for x in single_pass_files] == [
+            os.path.basename(x) for x in per_track_files
+        ]
+        for per_track_file, single_pass_file in zip(per_track_files, single_pass_files):
+            assert (
+                abs(
+                    mutagen.File(per_track_file).info.length
+                    - mutagen.File(single_pass_file).info.length
+                )
+                < 0.1
+            )
@@ -1,3 +1,6 @@
+import pytest
+
+
 def test_segmenting_webm_preserves_stream_qualities(tmp_path_factory):
     import os
     from pathlib import Path
@@ -118,3 +121,65 @@ def test_segmenting_webm_preserves_stream_qualities(tmp_path_factory):
             abs(int(data['format']['size']) - estimated_track_byte_size)
             < 0.05 * estimated_track_byte_size
         )
+
+
+def test_stream_copy_segmenting_keeps_source_codec(tmp_path_factory):
+    import os
+    from pathlib import Path
+
+    from music_album_creation.audio_segmentation import AudioSegmenter
+    from music_album_creation.ffmpeg import FFProbe
+    from music_album_creation.ffprobe_client import FFProbeClient
+
+    ffprobe_client = FFProbeClient(FFProbe(os.environ.get('MUSIC_FFPROBE', 'ffprobe')))
+
+    # GIVEN a webm file with an opus audio stream
+    webm_file = Path(__file__).parent / 'data' / 'Burning.webm'
+
+    # WHEN segmenting the webm file without re-encoding
+    output_dir = tmp_path_factory.mktemp("stream_copy")
+    segmenter = AudioSegmenter(str(output_dir), stream_copy=True)
+    track_files = segmenter.segment(
+        str(webm_file),
+        (
+            ('1 - track1', '0', '10'),
+            ('2 - track2', '10', '15'),
+        ),
+    )
+
+    # THEN the tracks are stored in a container matching the source codec
+    assert [os.path.basename(x) for x in track_files] == ['1 - track1.opus', '2 - track2.opus']
+
+    expected_durations = (10, 5)
+    for track, expected_duration in zip(track_files, expected_durations):
+        data = ffprobe_client.get_stream_info(track)
+        # AND the audio stream is copied as it is
+        assert len(data['streams']) == 1
+        assert data['streams'][0]['codec_name'] == 'opus'
+        assert data['streams'][0]['sample_rate'] == '48000'
+        assert data['streams'][0]['channels'] == 2
+        assert abs(float(data['format']['duration']) - expected_duration) < 0.1
+
+
+@pytest.mark.parametrize(
+    'codec_name, extension',
+    [('opus', 'opus'), ('vorbis', 'ogg'), ('ac3', 'mka'), ('pcm_s16le', 'mka')],
+)
+def test_stream_copied_matroska_tracks_are_mka_unless_opus_or_vorbis(
+    tmp_path, fake_ffmpeg, fake_ffprobe, codec_name, extension
+):
+    import os
+
+    from music_album_creation.audio_segmentation import AudioSegmenter
+
+    fake_ffmpeg()
+    fake_ffprobe(format_name='matroska,webm', codec_name=codec_name)
+
+    tracks = AudioSegmenter(str(tmp_path), stream_copy=True, seek='output').segment(
+        'album.mkv', (('1 - track1', '0', '10'), ('2 - track2', '10'))
+    )
+
+    assert [os.path.basename(x) for x in tracks] == [
+        '1 - track1.{}'.format(extension),
+        '2 - track2.{}'.format(extension),
+    ]
@@ -0,0 +1,110 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from music_album_creation.audio_segmentation import SegmentationInformation
+from music_album_creation.audio_segmentation.silence import SilenceDetector
+
+RATE = 8000
+
+
+def _tone(seconds, amplitude=8000):
+    t = np.arange(int(seconds * RATE)) / RATE
+    return (amplitude * np.sin(2 * np.pi * 440 * t)).astype('<i2')
+
+
+def _silence(seconds):
+    return np.zeros(int(seconds * RATE), dtype='<i2')
+
+
+@pytest.fixture
+def album_pcm():
+    # leading silence, 3 tracks separated by 3s and 2.5s silences, a short pause, trailing silence
+    return np.concatenate(
+        [
+            _silence(1),
+            _tone(10),
+            _silence(3),
+            _tone(5),
+            _silence(0.5),
+            _tone(5),
+            _silence(2.5),
+            _tone(8),
+            _silence(4),
+        ]
+    ).tobytes()
+
+
+@pytest.mark.parametrize('block_size', [1001, 4096, 1024**2])
+def test_boundaries_are_proposed_in_the_middle_of_long_silences(album_pcm, block_size):
+    detector = SilenceDetector(min_silence=2.0, sample_rate=RATE)
+    for i in range(0, len(album_pcm), block_size):
+        detector.feed(album_pcm[i : i + block_size])
+
+    assert detector.finish() == [12.5, 25.75]
+
+
+def test_boundaries_feed_segmentation_information():
+    segmentation = SegmentationInformation.from_boundaries([25.75, 12.5])
+
+    assert segmentation.tracks_info == [
+        ['01 - Track 1', '0.000', '12.500'],
+        ['02 - Track 2', '12.500', '25.750'],
+        ['03 - Track 3', '25.750'],
+    ]
+    with pytest.raises(ValueError):
+        SegmentationInformation.from_boundaries([12.5], track_names=['Only one'])
+
+
+def test_boundaries_snap_to_the_quietest_point_within_tolerance(tmp_path):
+    import wave
+
+    from music_album_creation.audio_segmentation.silence import snap_to_silence
+
+    album_file = str(tmp_path / 'album.wav')
+    with wave.open(album_file, 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(RATE)
+        f.writeframes(
+            np.concatenate([_tone(6), _silence(1), _tone(6), _silence(1), _tone(4)]).tobytes()
+        )
+    segmentation = SegmentationInformation(
+        [['01 - A', '0', '5'], ['02 - B', '5', '14'], ['03 - C', '14']]
+    )
+
+    refined, adjustments = snap_to_silence(album_file, segmentation, tolerance=2, workers=2)
+
+    # each boundary moves just inside the silence nearest to it
+    assert [float(x[1]) for x in refined[1:]] == [
+        pytest.approx(6, abs=0.03),
+        pytest.approx(14, abs=0.03),
+    ]
+    assert refined[0][2] == refined[1][1] and refined[1][2] == refined[2][1]
+    assert [x.track for x in adjustments] == ['02 - B', '03 - C']
+    assert adjustments[0].offset == pytest.approx(1, abs=0.03)
+    assert adjustments[1].offset == pytest.approx(0, abs=0.03)
+
+
+def test_boundaries_within_continuous_audio_stay_put(tmp_path):
+    import wave
+
+    from music_album_creation.audio_segmentation.silence import snap_to_silence
+
+    album_file = str(tmp_path / 'album.wav')
+    with wave.open(album_file, 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(RATE)
+        f.writeframes(
+            np.concatenate([_tone(35), _tone(3, amplitude=6000), _tone(22)]).tobytes()
+        )
+    segmentation = SegmentationInformation(
+        [['01 - A', '0', '30'], ['02 - B', '30', '36'], ['03 - C', '36']]
+    )
+
+    refined, adjustments = snap_to_silence(album_file, segmentation, tolerance=3)
+
+    # a slightly quieter passage (-2.5 dB) is neither silent nor clearly quieter
+    assert [float(x[1]) for x in refined[1:]] == [30, 36]
+    assert [x.offset for x in adjustments] == [0, 0]
@@ -0,0 +1,79 @@
+import os
+import shutil
+import subprocess
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from music_album_creation.audio_segmentation import AudioSegmenter, waveform
+from music_album_creation.audio_segmentation.waveform import (
+    peaks_file,
+    read_peaks,
+    write_peaks,
+)
+
+
+@pytest.mark.parametrize('block_buckets', [1, 3, 4096])
+def test_peaks_are_min_max_per_bucket(tmp_path, monkeypatch, block_buckets):
+    monkeypatch.setattr(waveform, 'BLOCK_BUCKETS', block_buckets)
+    rng = np.random.default_rng(0)
+    # 10 whole buckets of 4 stereo frames, plus a partial one of 3 frames
+    samples = rng.integers(-32768, 32767, size=2 * (4 * 10 + 3), dtype='<i2')
+    file_path = peaks_file(str(tmp_path / '01 - track.mp3'))
+
+    write_peaks(memoryview(samples.tobytes()), file_path, 44100, channels=2, bucket=4)
+
+    sample_rate, bucket, peaks = read_peaks(file_path)
+    buckets = [samples[i : i + 8] for i in range(0, len(samples), 8)]
+    assert file_path == str(tmp_path / '01 - track.peaks')
+    assert (sample_rate, bucket) == (44100, 4)
+    assert peaks.tolist() == [[x.min(), x.max()] for x in buckets]
+
+
+def test_reading_a_non_peaks_file_fails(tmp_path):
+    (tmp_path / 'x.peaks').write_bytes(b'\0' * 64)
+
+    with pytest.raises(ValueError):
+        read_peaks(str(tmp_path / 'x.peaks'))
+
+
+@pytest.mark.parametrize('seek', ['output', 'input'])
+def test_segmenting_writes_the_peaks_of_each_track_next_to_it(tmp_path, fake_ffprobe, seek):
+    if shutil.which('ffmpeg') is None:
+        pytest.skip("ffmpeg is not installed")
+    album_file = str(tmp_path / 'album.wav')
+    subprocess.run(
+        [
+            'ffmpeg',
+            '-v',
+            'error',
+            '-f',
+            'lavfi',
+            '-i',
+            'sine=duration=3',
+            '-ac',
+            '2',
+            album_file,
+        ],
+        check=True,
+    )
+    fake_ffprobe(duration='3.0', format_name='wav', codec_name='pcm_s16le')
+    target_dir = tmp_path / 'tracks'
+    target_dir.mkdir()
+
+    tracks = AudioSegmenter(str(target_dir), seek=seek).segment(
+        album_file, (('01 - a', '0', '1'), ('02 - b', '1')), peaks=True
+    )
+
+    assert sorted(os.listdir(str(target_dir))) == [
+        '01 - a.mp3',
+        '01 - a.peaks',
+        '02 - b.mp3',
+        '02 - b.peaks',
+    ]
+    for track, seconds in zip(tracks, (1, 2)):
+        sample_rate, bucket, peaks = read_peaks(peaks_file(track))
+        assert (sample_rate, bucket) == (44100, waveform.PEAKS_BUCKET)
+        assert len(peaks) == -(-seconds * 44100 // bucket)
+        assert peaks.max() > 0